@@ -0,0 +1,34 @@
+import argparse
+
+from src.config import get_config_for_model_download, get_config_for_vector_database
+from src.startup.snapshot import CURRENT_SNAPSHOT_LINK, build_snapshot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Downloads the model and embeds the documents into a snapshot the app serves read-only."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="snapshot",
+        help="The folder the versioned snapshot directories are created in.",
+    )
+    parser.add_argument(
+        "--documents",
+        type=str,
+        default=None,
+        help="The folder of the documents to embed, src/document/saved_documents by default.",
+    )
+    args = parser.parse_args()
+
+    vector_db_config = get_config_for_vector_database()
+    snapshot = build_snapshot(
+        args.output,
+        get_config_for_model_download(),
+        documents_path=args.documents,
+        embedding_batch_size=vector_db_config.embedding_batch_size,
+        embedding_workers=vector_db_config.embedding_workers,
+    )
+    info = snapshot.load_info()
+    print(f"Built snapshot {info.version} in {snapshot.path}, corpus version {info.corpus_version}")
+    print(f"Serve it with SNAPSHOT_PATH={args.output}/{CURRENT_SNAPSHOT_LINK}")
@@ -18,6 +18,12 @@ if __name__ == "__main__":
         default=1,
         help="Number of files to download simultaneously.",
     )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Number of concurrent range requests each large file is downloaded with.",
+    )
     parser.add_argument(
         "--text-only", action="store_true", help="Only download text files (txt/json)."
     )
@@ -74,5 +80,5 @@ if __name__ == "__main__":
     else:
         # Download files
         downloader.download_model_files(
-            model, branch, links, sha256, output_folder, threads=args.threads
+            model, branch, links, sha256, output_folder, threads=args.threads, segments=args.segments
         )
@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from src.startup.import_profile import get_import_time_us, profile_imports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports the time spent importing a module and its dependencies.")
+    parser.add_argument("MODULE", type=str, default="src.main", nargs="?")
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=25,
+        help="Number of modules to report.",
+    )
+    parser.add_argument(
+        "--sort",
+        choices=["self", "cumulative"],
+        default="cumulative",
+        help="Report the modules that took longest on their own, or including the modules they imported.",
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=None,
+        help="Exit with an error if importing the module takes longer than this.",
+    )
+    args = parser.parse_args()
+
+    try:
+        timings = profile_imports(args.MODULE)
+    except ImportError as err:
+        print(f"Error: {err}")
+        sys.exit(1)
+
+    key = (lambda timing: timing.self_us) if args.sort == "self" else (lambda timing: timing.cumulative_us)
+    print(f"{'self [ms]':>10} {'cumulative [ms]':>16}  module")
+    for timing in sorted(timings, key=key, reverse=True)[: args.top]:
+        print(f"{timing.self_us / 1000:>10.1f} {timing.cumulative_us / 1000:>16.1f}  {timing.module}")
+
+    total_ms = get_import_time_us(timings, args.MODULE) / 1000
+    print(f"\nImporting {args.MODULE} took {total_ms:.1f}ms across {len(timings)} modules")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"[-] Over the import budget of {args.budget_ms:.1f}ms")
+        sys.exit(1)
@@ -0,0 +1,91 @@
+import hashlib
+import json
+from typing import Dict, Optional
+
+import structlog as logging
+
+from src.cache.response_cache import ResponseCache
+from src.cache.semantic_cache import SemanticCache
+
+logger = logging.get_logger(__name__)
+
+
+class LayeredResponseCache:
+    """Looks answers up in the exact-match cache first and falls back to the semantic cache.
+
+    Both layers are keyed on the generation parameters and model identity, the exact-match
+    layer additionally on the corpus version while the semantic layer is emptied when it changes.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        temperature: float,
+        model_identity: str,
+        corpus_version: str,
+        exact_cache: Optional[ResponseCache] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.model_identity = model_identity
+        self.corpus_version = corpus_version
+        self.exact_cache = exact_cache
+        self.semantic_cache = semantic_cache
+        self.generation_key = hashlib.sha256(
+            json.dumps([max_tokens, temperature, model_identity]).encode("utf-8")
+        ).hexdigest()
+
+    def get_exact(self, query: str) -> Optional[str]:
+        """Return the answer cached for exactly this (normalized) query. Cheap enough for the event loop."""
+        if self.exact_cache is None:
+            return None
+        return self.exact_cache.get(self._get_exact_key(query))
+
+    def get_similar(self, query: str) -> Optional[str]:
+        """Return the answer cached for a paraphrase of the query. Embeds the query, so it blocks."""
+        if self.semantic_cache is None:
+            return None
+        response = self.semantic_cache.lookup(query, self.generation_key)
+        if response is not None and self.exact_cache is not None:
+            self.exact_cache.put(self._get_exact_key(query), response)
+        return response
+
+    def store(self, query: str, response: str, corpus_version: Optional[str] = None):
+        """Cache a generated answer in every layer. Embeds the query, so it blocks.
+
+        `corpus_version` is the version the answer's context was retrieved from. An answer generated
+        while the corpus changed is dropped, it would otherwise outlive the invalidation.
+        """
+        corpus_version = corpus_version if corpus_version is not None else self.corpus_version
+        if corpus_version != self.corpus_version:
+            logger.info("Not caching an answer generated against a previous corpus version")
+            return
+        if self.exact_cache is not None:
+            # keyed on the captured version, a change racing this write leaves an entry that can never hit
+            self.exact_cache.put(self._get_exact_key(query, corpus_version), response)
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(query, response, self.generation_key, corpus_version)
+
+    def set_corpus_version(self, corpus_version: str):
+        """Switch to a new document corpus. Answers generated against the previous one are dropped."""
+        if corpus_version == self.corpus_version:
+            return
+        self.corpus_version = corpus_version
+        if self.exact_cache is not None:
+            # entries are keyed on the corpus version, clearing just frees the space of ones that can never hit
+            self.exact_cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.invalidate(corpus_version)
+
+    def get_stats(self) -> Dict:
+        return {
+            "exact": self.exact_cache.get_stats() if self.exact_cache is not None else None,
+            "semantic": self.semantic_cache.get_stats() if self.semantic_cache is not None else None,
+        }
+
+    def _get_exact_key(self, query: str, corpus_version: Optional[str] = None) -> str:
+        return ResponseCache.make_key(
+            query, self.max_tokens, self.temperature, self.model_identity,
+            corpus_version if corpus_version is not None else self.corpus_version,
+        )
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Sequence
+
+import structlog as logging
+
+logger = logging.get_logger(__name__)
+
+Embedding = List[float]
+
+
+class QueryEmbeddingCache:
+    """LRU cache of query text embeddings in front of an embedding function.
+
+    Embeddings are keyed on the exact query text, since any change to the text changes its embedding.
+    Misses are embedded together in one call to the embedding function.
+    """
+
+    def __init__(self, embedding_function: Callable[[List[str]], List[Embedding]], max_entries: int = 1024):
+        self.embedding_function = embedding_function
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Embedding]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def embed(self, query: str) -> Embedding:
+        """Return the embedding of a single query."""
+        return self.embed_many([query])[0]
+
+    def embed_many(self, queries: Sequence[str]) -> List[Embedding]:
+        """Return the embeddings of the queries in order, embedding the ones not cached yet in one batch."""
+        embeddings: Dict[str, Embedding] = {}
+        with self._lock:
+            for query in queries:
+                embedding = self._entries.get(query)
+                if embedding is None:
+                    self._misses += 1
+                else:
+                    self._entries.move_to_end(query)
+                    embeddings[query] = embedding
+                    self._hits += 1
+
+        missing = list(dict.fromkeys(query for query in queries if query not in embeddings))
+        if missing:
+            computed = [list(embedding) for embedding in self.embedding_function(missing)]
+            embeddings.update(zip(missing, computed))
+            with self._lock:
+                for query, embedding in zip(missing, computed):
+                    self._entries[query] = embedding
+                    self._entries.move_to_end(query)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return [embeddings[query] for query in queries]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import structlog as logging
+
+logger = logging.get_logger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    response: str
+    created_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.response.encode("utf-8"))
+
+
+class SqliteCacheBackend:
+    """Persists cache entries in a sqlite database so they survive restarts.
+
+    A hit only records its access time in memory, the access times are written with the next `put`, which
+    evicts by them. Reads, which run on the request path, so never write to disk.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._accessed_at: Dict[str, float] = {}
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed_at[key] = time.time()
+            return CacheEntry(response=row[0], created_at=row[1])
+
+    def put(self, key: str, entry: CacheEntry):
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, accessed_key) for accessed_key, accessed_at in self._accessed_at.items()],
+            )
+            self._accessed_at.clear()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, entry.response, entry.created_at, time.time()),
+            )
+            # keep only the most recently used entries
+            self._connection.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._connection.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._accessed_at.pop(key, None)
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._accessed_at.clear()
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+
+class ResponseCache:
+    """Exact-match cache of generated responses with LRU eviction and a TTL.
+
+    Entries are evicted least recently used first once either `max_entries` or `max_bytes`
+    is exceeded, and are treated as missing once they are older than `ttl_seconds`.
+    An optional `SqliteCacheBackend` is written through and consulted on in-memory misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 3600,
+        backend: Optional[SqliteCacheBackend] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(
+        query: str, max_tokens: int, temperature: float, model_identity: str, corpus_version: str
+    ) -> str:
+        """Build a cache key from the normalized query and everything else that shapes the response."""
+        normalized_query = " ".join(query.casefold().split())
+        key_fields = [normalized_query, max_tokens, temperature, model_identity, corpus_version]
+        return hashlib.sha256(json.dumps(key_fields).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_expired(entry):
+                    self._remove(key)
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None and self._is_expired(entry):
+                self.backend.delete(key)
+                entry = None
+            elif entry is not None:
+                with self._lock:
+                    self._insert(key, entry)
+
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry.response
+
+    def put(self, key: str, response: str):
+        """Cache a response, evicting the least recently used entries if over budget."""
+        entry = CacheEntry(response=response, created_at=time.time())
+        with self._lock:
+            self._insert(key, entry)
+        if self.backend is not None:
+            self.backend.put(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _is_expired(self, entry: CacheEntry) -> bool:
+        return self.ttl_seconds is not None and time.time() - entry.created_at > self.ttl_seconds
+
+    def _insert(self, key: str, entry: CacheEntry):
+        if entry.size > self.max_bytes:
+            logger.info("Not caching a response larger than the cache byte budget")
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self._size += entry.size
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
@@ -0,0 +1,144 @@
+import hashlib
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+import structlog as logging
+
+from src.cache.query_embedding_cache import QueryEmbeddingCache
+
+if TYPE_CHECKING:
+    import chromadb
+
+logger = logging.get_logger(__name__)
+
+SEMANTIC_CACHE_COLLECTION_NAME = "semantic-response-cache"
+# share of the oldest entries dropped when the cache collection is full
+EVICTION_FRACTION = 0.1
+
+
+class SemanticCache:
+    """Returns stored answers for queries that are paraphrases of previously answered ones.
+
+    Queries are embedded with Chroma's default embedding function, the same one used for the
+    document collection, and stored in a dedicated cosine-space collection. A lookup is a hit when
+    the closest stored query generated with the same parameters is at least `similarity_threshold`
+    similar. The collection is tagged with the corpus version and emptied whenever it changes.
+    Queries are embedded through `query_embedding_cache` when given, which retrieval shares, so a
+    query is embedded once per request rather than for every lookup.
+    """
+
+    def __init__(
+        self,
+        chroma_client: "chromadb.API",
+        corpus_version: str,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 4096,
+        query_embedding_cache: Optional[QueryEmbeddingCache] = None,
+    ):
+        self.chroma_client = chroma_client
+        self.query_embedding_cache = query_embedding_cache
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self.corpus_version = None
+        self.collection = None
+        self.invalidate(corpus_version)
+
+    def invalidate(self, corpus_version: str):
+        """Drop every cached answer unless they were generated against `corpus_version`."""
+        with self._lock:
+            try:
+                collection = self.chroma_client.get_collection(SEMANTIC_CACHE_COLLECTION_NAME)
+            except ValueError:
+                # chroma raises a ValueError for collections that do not exist yet
+                collection = None
+
+            if collection is not None and (collection.metadata or {}).get("corpus_version") != corpus_version:
+                logger.info("Document corpus changed, clearing the semantic response cache")
+                self.chroma_client.delete_collection(SEMANTIC_CACHE_COLLECTION_NAME)
+                collection = None
+
+            if collection is None:
+                collection = self.chroma_client.create_collection(
+                    SEMANTIC_CACHE_COLLECTION_NAME,
+                    metadata={"hnsw:space": "cosine", "corpus_version": corpus_version},
+                )
+            self.collection = collection
+            self.corpus_version = corpus_version
+
+    def lookup(self, query: str, generation_key: str) -> Optional[str]:
+        """Return the answer stored for the most similar query, if it is similar enough."""
+        with self._lock:
+            collection = self.collection
+        if collection.count() == 0:
+            result = None
+        else:
+            results = collection.query(
+                **self._get_query_input(query),
+                n_results=1,
+                where={"generation_key": generation_key},
+                include=["metadatas", "distances"],
+            )
+            result = self._get_answer_if_similar(results)
+
+        with self._lock:
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return result
+
+    def store(self, query: str, response: str, generation_key: str, corpus_version: Optional[str] = None):
+        """Remember the answer generated for `query`, unless it was generated against another `corpus_version`."""
+        with self._lock:
+            collection = self.collection
+            current_version = self.corpus_version
+        if corpus_version is not None and corpus_version != current_version:
+            logger.info("Not caching an answer generated against a previous corpus version")
+            return
+        if collection.count() >= self.max_entries:
+            self._evict_oldest(collection)
+        collection.upsert(
+            ids=[hashlib.sha256(f"{generation_key}:{query}".encode("utf-8")).hexdigest()],
+            documents=[query],
+            **self._get_embedding_input(query),
+            metadatas=[{"response": response, "generation_key": generation_key, "created_at": time.time()}],
+        )
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": self.collection.count(),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _get_query_input(self, query: str) -> Dict:
+        if self.query_embedding_cache is None:
+            return {"query_texts": [query]}
+        return {"query_embeddings": [self.query_embedding_cache.embed(query)]}
+
+    def _get_embedding_input(self, query: str) -> Dict:
+        if self.query_embedding_cache is None:
+            return {}
+        return {"embeddings": [self.query_embedding_cache.embed(query)]}
+
+    def _get_answer_if_similar(self, results: Dict) -> Optional[str]:
+        if not results["ids"] or not results["ids"][0]:
+            return None
+        similarity = 1 - results["distances"][0][0]
+        if similarity < self.similarity_threshold:
+            return None
+        logger.info(f"Semantic cache hit with similarity {similarity:.3f}")
+        return results["metadatas"][0][0]["response"]
+
+    def _evict_oldest(self, collection):
+        entries = collection.get(include=["metadatas"])
+        by_age = sorted(zip(entries["ids"], entries["metadatas"]), key=lambda entry: entry[1]["created_at"])
+        evicted = by_age[: max(1, int(len(by_age) * EVICTION_FRACTION))]
+        collection.delete(ids=[entry_id for entry_id, _ in evicted])
@@ -1,7 +1,10 @@
-from dataclasses import dataclass
-from typing import Dict, Optional
+import json
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-from transformers import PreTrainedTokenizer
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizer
 
 
 @dataclass
@@ -14,6 +17,8 @@ class ModelDownloadConfiguration:
     model_kwargs: Dict -> Additional parameters that are provided to the model
     quantization_model: str -> The name of the quantization model. This will become the filename of the model when installed
     tokenizer: PreTrainedTokenizer -> Tokenizer necessary for GPU models
+    download_segments: int -> The number of concurrent byte range requests a model file is downloaded with
+    revalidate_download: bool -> Whether an installed model is checked against its download link on startup
     """
 
     model_name: str
@@ -23,7 +28,9 @@ class ModelDownloadConfiguration:
     max_tokens: Optional[int] = 1028
     temperature: Optional[float] = 0.1
     quantization_model: Optional[str] = None
-    tokenizer: Optional[PreTrainedTokenizer] = None
+    tokenizer: Optional["PreTrainedTokenizer"] = None
+    download_segments: int = 1
+    revalidate_download: bool = False
 
 
 def get_config_for_model_download():
@@ -34,4 +41,238 @@ def get_config_for_model_download():
         download_link="https://huggingface.co/TheBloke/Wizard-Vicuna-7B-Uncensored-GGML/resolve/main/Wizard-Vicuna-7B-Uncensored.ggmlv3.q4_0.bin",
         quantization_model="Wizard-Vicuna-7B-Uncensored.ggmlv3.q4_0.bin",
         model_kwargs={"use_mlock": True, "n_ctx": 1300},
+        download_segments=int(os.getenv("MODEL_DOWNLOAD_SEGMENTS", "8")),
+        revalidate_download=os.getenv("MODEL_REVALIDATE", "false").lower() == "true",
     )
+
+
+@dataclass
+class InferenceSchedulerConfiguration:
+    """Inference Scheduler Configuration.
+
+    concurrency: int -> The number of worker threads. Each worker owns its own model instance
+    max_queue_size: int -> The maximum number of jobs waiting for a worker
+    max_batch_size: int -> The maximum number of identical queued jobs answered by a single generation
+    queue_timeout_seconds: float -> How long a request may wait in the queue before it is dropped
+    batch_timeout_seconds: float -> How long a batch query may wait for room in the queue and in the queue, counted from when the batch submits it. Used for batches that do not set their own timeout
+    prefix_cache_enabled: bool -> Whether the evaluated state of the static prompt prefix is reused across requests
+    worker_processes: int -> The number of worker processes the model runs in, sharing one memory mapped copy of the weights. Replaces concurrency when set, 0 runs the models in the app process
+    threads_per_process: int -> The number of cores each worker process is pinned to and runs with, defaults to an even split of the cores
+    """
+
+    concurrency: int = 1
+    max_queue_size: int = 64
+    max_batch_size: int = 8
+    queue_timeout_seconds: Optional[float] = 60.0
+    batch_timeout_seconds: float = 600.0
+    prefix_cache_enabled: bool = True
+    worker_processes: int = 0
+    threads_per_process: Optional[int] = None
+
+
+def get_config_for_inference_scheduler():
+    """Get config for the inference scheduler."""
+    threads_per_process = os.getenv("INFERENCE_THREADS_PER_PROCESS")
+    return InferenceSchedulerConfiguration(
+        concurrency=int(os.getenv("INFERENCE_CONCURRENCY", "1")),
+        max_queue_size=int(os.getenv("INFERENCE_MAX_QUEUE_SIZE", "64")),
+        max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8")),
+        queue_timeout_seconds=float(os.getenv("INFERENCE_QUEUE_TIMEOUT_SECONDS", "60")),
+        batch_timeout_seconds=float(os.getenv("INFERENCE_BATCH_TIMEOUT_SECONDS", "600")),
+        prefix_cache_enabled=os.getenv("PROMPT_PREFIX_CACHE_ENABLED", "true").lower() == "true",
+        worker_processes=int(os.getenv("INFERENCE_WORKER_PROCESSES", "0")),
+        threads_per_process=int(threads_per_process) if threads_per_process else None,
+    )
+
+
+@dataclass
+class ResponseCacheConfiguration:
+    """Response Cache Configuration.
+
+    enabled: bool -> Whether generated responses are cached
+    max_entries: int -> The maximum number of cached responses
+    max_bytes: int -> The maximum total size of the cached responses
+    ttl_seconds: float -> How long a cached response stays valid
+    disk_path: str -> Path of a sqlite database that persists the cache across restarts, in-memory only if unset
+    """
+
+    enabled: bool = True
+    max_entries: int = 1024
+    max_bytes: int = 16 * 1024 * 1024
+    ttl_seconds: Optional[float] = 3600
+    disk_path: Optional[str] = None
+
+
+def get_config_for_response_cache():
+    """Get config for the response cache."""
+    return ResponseCacheConfiguration(
+        enabled=os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+        max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+        disk_path=os.getenv("RESPONSE_CACHE_DISK_PATH"),
+    )
+
+
+@dataclass
+class SemanticCacheConfiguration:
+    """Semantic Cache Configuration.
+
+    enabled: bool -> Whether answers are reused for paraphrased queries
+    similarity_threshold: float -> The minimum cosine similarity between two queries to reuse an answer
+    max_entries: int -> The maximum number of queries kept in the cache collection
+    """
+
+    enabled: bool = True
+    similarity_threshold: float = 0.95
+    max_entries: int = 4096
+
+
+def get_config_for_semantic_cache():
+    """Get config for the semantic cache."""
+    return SemanticCacheConfiguration(
+        enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true",
+        similarity_threshold=float(os.getenv("SEMANTIC_CACHE_SIMILARITY_THRESHOLD", "0.95")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "4096")),
+    )
+
+
+@dataclass
+class VectorDatabaseConfiguration:
+    """Vector Database Configuration.
+
+    persist_path: str -> Directory where the vector db and its document manifest are persisted, in-memory if unset
+    embedding_batch_size: int -> The number of document chunks embedded and added to the vector db at once
+    embedding_workers: int -> The number of processes embedding document chunks, defaults to the number of cores
+    """
+
+    persist_path: Optional[str] = None
+    embedding_batch_size: int = 64
+    embedding_workers: Optional[int] = None
+
+
+def get_config_for_vector_database():
+    """Get config for the vector database."""
+    embedding_workers = os.getenv("EMBEDDING_WORKERS")
+    return VectorDatabaseConfiguration(
+        persist_path=os.getenv("VECTOR_DB_PATH"),
+        embedding_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+        embedding_workers=int(embedding_workers) if embedding_workers else None,
+    )
+
+
+@dataclass
+class DocumentIngestionConfiguration:
+    """Document Ingestion Configuration.
+
+    max_pending_jobs: int -> The maximum number of document uploads and deletions waiting to be indexed
+    max_finished_jobs: int -> The number of finished ingestion jobs whose status is kept for polling
+    max_document_bytes: int -> The largest document content an upload may carry, in bytes of UTF-8
+    """
+
+    max_pending_jobs: int = 64
+    max_finished_jobs: int = 1024
+    max_document_bytes: int = 10 * 1024 * 1024
+
+
+def get_config_for_document_ingestion():
+    """Get config for live document ingestion."""
+    return DocumentIngestionConfiguration(
+        max_pending_jobs=int(os.getenv("DOCUMENT_INGESTION_MAX_PENDING_JOBS", "64")),
+        max_finished_jobs=int(os.getenv("DOCUMENT_INGESTION_MAX_FINISHED_JOBS", "1024")),
+        max_document_bytes=int(os.getenv("DOCUMENT_MAX_BYTES", str(10 * 1024 * 1024))),
+    )
+
+
+@dataclass
+class RetrievalConfiguration:
+    """Retrieval Configuration.
+
+    hybrid_enabled: bool -> Whether BM25 keyword matches are fused with the vector db results
+    rrf_k: int -> The reciprocal rank fusion constant, larger values flatten the advantage of top ranks
+    vector_weight: float -> The weight of the vector db ranking in the fusion
+    lexical_weight: float -> The weight of the BM25 ranking in the fusion
+    query_embedding_cache_size: int -> The maximum number of query embeddings kept for repeated queries
+    """
+
+    hybrid_enabled: bool = True
+    rrf_k: int = 60
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+    query_embedding_cache_size: int = 1024
+
+
+def get_config_for_retrieval():
+    """Get config for document retrieval."""
+    return RetrievalConfiguration(
+        hybrid_enabled=os.getenv("RETRIEVAL_HYBRID_ENABLED", "true").lower() == "true",
+        rrf_k=int(os.getenv("RETRIEVAL_RRF_K", "60")),
+        vector_weight=float(os.getenv("RETRIEVAL_VECTOR_WEIGHT", "1.0")),
+        lexical_weight=float(os.getenv("RETRIEVAL_LEXICAL_WEIGHT", "1.0")),
+        query_embedding_cache_size=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024")),
+    )
+
+
+@dataclass
+class SnapshotConfiguration:
+    """Snapshot Configuration.
+
+    path: str -> Directory of a snapshot built by scripts/build_snapshot.py. When set, the model and the vector db are served read-only from it and nothing is downloaded or embedded on startup
+    """
+
+    path: Optional[str] = None
+
+
+def get_config_for_snapshot():
+    """Get config for the prebuilt model and vector db snapshot."""
+    return SnapshotConfiguration(path=os.getenv("SNAPSHOT_PATH"))
+
+
+@dataclass
+class ModelRegistryConfiguration:
+    """Model Registry Configuration.
+
+    models: Dict[str, ModelDownloadConfiguration] -> The models requests can select by name besides the default model, loaded on first use
+    memory_budget_bytes: int -> The memory the loaded models may take together, including the default model. Idle models are unloaded to stay within it, unlimited if unset
+    admin_token: str -> Bearer token required to register models and to change documents at runtime, both are disabled through the API if unset
+    allowed_download_hosts: List[str] -> The hosts models registered at runtime may be downloaded from
+    """
+
+    models: Dict[str, ModelDownloadConfiguration] = field(default_factory=dict)
+    memory_budget_bytes: Optional[int] = None
+    admin_token: Optional[str] = None
+    allowed_download_hosts: List[str] = field(default_factory=lambda: ["huggingface.co"])
+
+
+def get_config_for_model_registry():
+    """Get config for the model registry.
+
+    MODEL_REGISTRY_PATH points to a JSON file mapping model names to the fields of a ModelDownloadConfiguration.
+    """
+    models = {}
+    registry_path = os.getenv("MODEL_REGISTRY_PATH")
+    if registry_path:
+        with open(registry_path, "r") as file:
+            for name, entry in json.load(file).items():
+                models[name] = get_model_download_configuration(entry)
+    memory_budget_mb = os.getenv("MODEL_MEMORY_BUDGET_MB")
+    return ModelRegistryConfiguration(
+        models=models,
+        memory_budget_bytes=int(memory_budget_mb) * 1024 * 1024 if memory_budget_mb else None,
+        admin_token=os.getenv("MODEL_ADMIN_TOKEN") or None,
+        allowed_download_hosts=[
+            host.strip() for host in os.getenv("MODEL_ALLOWED_DOWNLOAD_HOSTS", "huggingface.co").split(",")
+            if host.strip()
+        ],
+    )
+
+
+def get_model_download_configuration(entry: Dict) -> ModelDownloadConfiguration:
+    """Build the configuration of a model registered at runtime, downloading it like the default model."""
+    return ModelDownloadConfiguration(**{
+        "folder_name": entry["model_name"].replace("/", "_"),
+        "quantization_model": entry["download_link"].rsplit("/", 1)[-1],
+        "model_kwargs": {},
+        "download_segments": int(os.getenv("MODEL_DOWNLOAD_SEGMENTS", "8")),
+        **entry,
+    })
@@ -1,54 +1,196 @@
-from src.document.document_sourcer import DocumentSourcer
-from src.model.huggingface_downloader import HuggingFaceDownloader
+from typing import TYPE_CHECKING, Optional
 
-from fastapi import Depends
+from src.cache.layered_response_cache import LayeredResponseCache
+from src.cache.query_embedding_cache import QueryEmbeddingCache
+from src.cache.response_cache import ResponseCache, SqliteCacheBackend
+from src.cache.semantic_cache import SemanticCache
+from src.config import ModelDownloadConfiguration, get_config_for_document_ingestion, get_config_for_model_download, \
+    get_config_for_response_cache, get_config_for_retrieval, get_config_for_semantic_cache, \
+    get_config_for_snapshot, get_config_for_vector_database
+from src.document.bm25_index import BM25Index
+from src.document.document_ingestion import DocumentIngestionService
+from src.document.document_sourcer import COLLECTION_NAME, DocumentSourcer
+from src.document.embedding_pipeline import EmbeddingPipeline, get_default_embedding_function
+
+from fastapi import Depends, Request
 
-from src.model.model_downloader import ModelDownloader
-from src.model.model_retriever import ModelRetriever
 from src.prompt.prompt_builder import PromptBuilder
+from src.prompt.retrieval_service import RetrievalService
+from src.startup.snapshot import Snapshot
+
+if TYPE_CHECKING:
+    import chromadb
+
+    from src.model.huggingface_downloader import HuggingFaceDownloader
+    from src.model.model_downloader import ModelDownloader
 
 MODEL_OUTPUT_PATH = "src/model/downloaded_models"
+LLAMA_CPP_DEFAULT_N_CTX = 512
+
+
+# the model modules import requests, httpx and llama_cpp, so they are only imported once a model is loaded
 
 
 def get_huggingface_downloader():
     """Returns a HuggingFaceDownloader instance."""
+    from src.model.huggingface_downloader import HuggingFaceDownloader
+
     return HuggingFaceDownloader()
 
 
 def get_model_downloader(
-        hugging_face_downloader: HuggingFaceDownloader = Depends(
+        hugging_face_downloader: "HuggingFaceDownloader" = Depends(
             get_huggingface_downloader
         ),
 ):
     """Returns a ModelDownloader instance."""
+    from src.model.model_downloader import ModelDownloader
+
     return ModelDownloader(
         hugging_face_downloader=hugging_face_downloader,
         output_path=MODEL_OUTPUT_PATH,
+        download_segments=get_config_for_model_download().download_segments,
     )
 
 
 def get_model_retriever(
-        model_downloader: ModelDownloader = Depends(get_model_downloader),
+        model_downloader: "ModelDownloader" = Depends(get_model_downloader),
 ):
     """Returns a ModelRetriever instance."""
+    from src.model.model_retriever import ModelRetriever
+
     return ModelRetriever(model_downloader=model_downloader)
 
 
 def get_document_sourcer():
-    """Returns a DocumentSourcer instance."""
-    return DocumentSourcer()
+    """Returns a DocumentSourcer instance, serving the snapshot's vector db read-only if there is a snapshot."""
+    config = get_config_for_vector_database()
+    embedding_pipeline = EmbeddingPipeline(batch_size=config.embedding_batch_size, workers=config.embedding_workers)
+    lexical_index = BM25Index() if get_config_for_retrieval().hybrid_enabled else None
+    snapshot_path = get_config_for_snapshot().path
+    if snapshot_path is not None:
+        return DocumentSourcer(persist_path=str(Snapshot(snapshot_path).vector_db_path),
+                               embedding_pipeline=embedding_pipeline, lexical_index=lexical_index, read_only=True)
+    return DocumentSourcer(persist_path=config.persist_path, embedding_pipeline=embedding_pipeline,
+                           lexical_index=lexical_index)
+
+
+def get_document_ingestion_service_on_app_start(document_sourcer: DocumentSourcer, chroma_client: "chromadb.API",
+                                               on_corpus_changed):
+    """Returns a DocumentIngestionService instance that indexes documents into the loaded vector db."""
+    config = get_config_for_document_ingestion()
+    return DocumentIngestionService(
+        document_sourcer,
+        chroma_client,
+        on_corpus_changed=on_corpus_changed,
+        max_pending_jobs=config.max_pending_jobs,
+        max_finished_jobs=config.max_finished_jobs,
+        read_only=document_sourcer.read_only,
+        max_document_bytes=config.max_document_bytes,
+    )
+
+
+def get_prompt_builder(request: Request):
+    """Returns a PromptBuilder instance that packs context into the loaded model's context window.
+
+    Tokens are counted on the app state's vocabulary-only copy of the model, never on a model a scheduler
+    worker generates with.
+    """
+    retrieval_service = getattr(request.app.state, "RETRIEVAL", None)
+    model = getattr(request.app.state, "MODEL", None)
+    if model is None:
+        return PromptBuilder(retrieval_service)
+
+    model_config = get_config_for_model_download()
+    return build_prompt_builder(retrieval_service, model, model_config, model_config.max_tokens)
 
 
-def get_prompt_builder():
-    """Returns a PromptBuilder instance."""
-    return PromptBuilder()
+def build_prompt_builder(
+    retrieval_service: Optional[RetrievalService], model, model_config: ModelDownloadConfiguration, max_tokens: int
+) -> PromptBuilder:
+    """Returns a PromptBuilder that packs context into the context window of `model`, leaving room for `max_tokens`."""
+    n_ctx = model_config.model_kwargs.get("n_ctx", LLAMA_CPP_DEFAULT_N_CTX)
+    return PromptBuilder(
+        retrieval_service,
+        # each count includes the BOS token, which keeps the packing on the safe side of the budget
+        count_tokens=lambda text: len(model.tokenize(text.encode("utf-8"))),
+        max_prompt_tokens=n_ctx - max_tokens,
+    )
+
+
+def get_retrieval_service_on_app_start(chroma_client: "chromadb.API", lexical_index: Optional[BM25Index]):
+    """Returns a RetrievalService instance holding the document collection and a query embedding cache."""
+    config = get_config_for_retrieval()
+    query_embedding_cache = QueryEmbeddingCache(
+        get_default_embedding_function(), max_entries=config.query_embedding_cache_size
+    )
+    return RetrievalService(
+        chroma_client.get_collection(COLLECTION_NAME),
+        query_embedding_cache,
+        lexical_index=lexical_index,
+        rrf_k=config.rrf_k,
+        vector_weight=config.vector_weight,
+        lexical_weight=config.lexical_weight,
+    )
 
 
 def get_retriever_on_app_start():
-    """Returns a ModelRetriever instance."""
+    """Returns a ModelRetriever instance, loading the model from the snapshot without downloading if there is one."""
+    from src.model.huggingface_downloader import HuggingFaceDownloader
+    from src.model.model_downloader import ModelDownloader
+    from src.model.model_retriever import ModelRetriever
+
+    snapshot_path = get_config_for_snapshot().path
+    output_path = str(Snapshot(snapshot_path).models_path) if snapshot_path is not None else MODEL_OUTPUT_PATH
     hugging_face_downloader = HuggingFaceDownloader()
     model_downloader = ModelDownloader(
         hugging_face_downloader=hugging_face_downloader,
-        output_path=MODEL_OUTPUT_PATH,
+        output_path=output_path,
+        download_segments=get_config_for_model_download().download_segments,
     )
+    if snapshot_path is not None:
+        return ModelRetriever(model_downloader, models_path=output_path, allow_download=False)
     return ModelRetriever(model_downloader)
+
+
+def get_response_cache_on_app_start(chroma_client: "chromadb.API", corpus_version: str,
+                                    query_embedding_cache: Optional[QueryEmbeddingCache] = None):
+    """Returns a LayeredResponseCache instance with the exact-match and semantic layers that are enabled."""
+    model_config = get_config_for_model_download()
+    exact_config = get_config_for_response_cache()
+    semantic_config = get_config_for_semantic_cache()
+
+    exact_cache = None
+    if exact_config.enabled:
+        backend = SqliteCacheBackend(exact_config.disk_path, exact_config.max_entries) \
+            if exact_config.disk_path else None
+        exact_cache = ResponseCache(
+            max_entries=exact_config.max_entries,
+            max_bytes=exact_config.max_bytes,
+            ttl_seconds=exact_config.ttl_seconds,
+            backend=backend,
+        )
+
+    semantic_cache = None
+    if semantic_config.enabled:
+        if get_config_for_snapshot().path:
+            import chromadb
+
+            # the snapshot's vector db is read-only and shared by every replica, cache answers in memory instead
+            chroma_client = chromadb.Client()
+        semantic_cache = SemanticCache(
+            chroma_client,
+            corpus_version,
+            similarity_threshold=semantic_config.similarity_threshold,
+            max_entries=semantic_config.max_entries,
+            query_embedding_cache=query_embedding_cache,
+        )
+
+    return LayeredResponseCache(
+        max_tokens=model_config.max_tokens,
+        temperature=model_config.temperature,
+        model_identity=f"{model_config.model_name}/{model_config.quantization_model}",
+        corpus_version=corpus_version,
+        exact_cache=exact_cache,
+        semantic_cache=semantic_cache,
+    )
@@ -0,0 +1,197 @@
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+from array import array
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Dict, Iterable, List, Tuple
+
+import structlog as logging
+
+from src.document.chroma_documents import DocumentChunk
+
+logger = logging.get_logger(__name__)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+_TOKEN_PATTERN = re.compile(r"\w+")
+# bumped whenever the saved structures change, an index saved in another format is rebuilt
+INDEX_FORMAT_VERSION = 1
+_STATE_FIELDS = (
+    "_ids", "_contents", "_sources", "_lengths", "_alive", "_postings", "_document_frequencies", "_positions",
+    "_positions_by_source", "_total_length", "_dead_count",
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+
+@dataclass
+class LexicalMatch:
+    id: str
+    content: str
+    score: float
+
+
+class BM25Index:
+    """An in-memory inverted index scoring document chunks with BM25 for exact-term matches.
+
+    Every term maps to a pair of compact unsigned int arrays, the positions of the chunks it occurs in
+    and its frequency in each of them. Removed chunks are only marked dead and skipped while scoring,
+    the postings are rebuilt once dead chunks outnumber live ones.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._reset()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._positions)
+
+    def add(self, chunks: Iterable[DocumentChunk]):
+        """Index the chunks, replacing chunks already indexed under the same id."""
+        with self._lock:
+            for chunk in chunks:
+                if chunk.id in self._positions:
+                    self._remove_position(self._positions[chunk.id])
+                self._add_chunk(chunk)
+            self._compact_if_sparse()
+
+    def remove_source(self, source_file: str):
+        """Drop every chunk of a document."""
+        with self._lock:
+            for position in list(self._positions_by_source.get(source_file, ())):
+                self._remove_position(position)
+            self._compact_if_sparse()
+
+    def search(self, query: str, n_results: int) -> List[LexicalMatch]:
+        """Return up to `n_results` chunks sharing terms with the query, best BM25 score first."""
+        with self._lock:
+            if not self._positions:
+                return []
+            # chunks without any word characters have no terms, keep the length normalization defined
+            average_length = self._total_length / len(self._positions) or 1.0
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                document_frequency = self._document_frequencies[term]
+                idf = math.log(1 + (len(self._positions) - document_frequency + 0.5) / (document_frequency + 0.5))
+                for position, frequency in zip(*postings):
+                    if not self._alive[position]:
+                        continue
+                    length_norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / average_length)
+                    score = idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+                    scores[position] = scores.get(position, 0.0) + score
+
+            best = heapq.nlargest(n_results, scores.items(), key=itemgetter(1))
+            return [LexicalMatch(self._ids[position], self._contents[position], score) for position, score in best]
+
+    def save(self, path: str, corpus_version: str):
+        """Atomically replace the index saved at `path` with this one, covering `corpus_version`."""
+        with self._lock:
+            if self._dead_count:
+                self._compact()
+            content = pickle.dumps({
+                "format_version": INDEX_FORMAT_VERSION,
+                "corpus_version": corpus_version,
+                "state": {name: getattr(self, name) for name in _STATE_FIELDS},
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+
+    def load(self, path: str, corpus_version: str) -> bool:
+        """Replace this index with the one saved at `path` if it covers `corpus_version`. Returns whether it did.
+
+        The file is unpickled, so it must only ever be written by `save`, next to the vector db it indexes.
+        """
+        try:
+            with open(path, "rb") as file:
+                saved = pickle.load(file)
+        except FileNotFoundError:
+            return False
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable keyword index {path}: {e}")
+            return False
+        if not isinstance(saved, dict) or saved.get("format_version") != INDEX_FORMAT_VERSION:
+            return False
+        if saved.get("corpus_version") != corpus_version:
+            return False
+
+        with self._lock:
+            for name, value in saved["state"].items():
+                setattr(self, name, value)
+        return True
+
+    def _reset(self):
+        self._ids: List[str] = []
+        self._contents: List[str] = []
+        self._sources: List[str] = []
+        self._lengths = array("I")
+        self._alive = bytearray()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._document_frequencies: Dict[str, int] = {}
+        self._positions: Dict[str, int] = {}
+        self._positions_by_source: Dict[str, set] = {}
+        self._total_length = 0
+        self._dead_count = 0
+
+    def _add_chunk(self, chunk: DocumentChunk):
+        position = len(self._ids)
+        source_file = chunk.metadata.get("source_file", "")
+        terms = tokenize(chunk.content)
+        frequencies: Dict[str, int] = {}
+        for term in terms:
+            frequencies[term] = frequencies.get(term, 0) + 1
+
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("I"))
+            postings[0].append(position)
+            postings[1].append(frequency)
+            self._document_frequencies[term] = self._document_frequencies.get(term, 0) + 1
+
+        self._ids.append(chunk.id)
+        self._contents.append(chunk.content)
+        self._sources.append(source_file)
+        self._lengths.append(len(terms))
+        self._alive.append(1)
+        self._positions[chunk.id] = position
+        self._positions_by_source.setdefault(source_file, set()).add(position)
+        self._total_length += len(terms)
+
+    def _remove_position(self, position: int):
+        for term in set(tokenize(self._contents[position])):
+            self._document_frequencies[term] -= 1
+        self._alive[position] = 0
+        self._total_length -= self._lengths[position]
+        self._dead_count += 1
+        del self._positions[self._ids[position]]
+        self._positions_by_source[self._sources[position]].discard(position)
+        if not self._positions_by_source[self._sources[position]]:
+            del self._positions_by_source[self._sources[position]]
+
+    def _compact_if_sparse(self):
+        if self._dead_count > len(self._positions):
+            self._compact()
+
+    def _compact(self):
+        live = [
+            DocumentChunk(self._contents[position], {"source_file": self._sources[position]}, self._ids[position])
+            for position in range(len(self._ids)) if self._alive[position]
+        ]
+        self._reset()
+        for chunk in live:
+            self._add_chunk(chunk)
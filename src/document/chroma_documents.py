@@ -11,3 +11,10 @@ class ChromaDocuments:
 @dataclass
 class DocumentMetadata:
     source: str
+
+
+@dataclass
+class DocumentChunk:
+    content: str
+    metadata: dict
+    id: str
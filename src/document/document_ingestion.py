@@ -0,0 +1,185 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+import structlog as logging
+
+from src.document.document_loader import TEMPORARY_FILE_SUFFIX
+from src.document.document_sourcer import COLLECTION_NAME, DocumentSourcer
+
+if TYPE_CHECKING:
+    import chromadb
+
+logger = logging.get_logger(__name__)
+
+OPERATION_ADD = "add"
+OPERATION_DELETE = "delete"
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+_STOP = object()
+
+
+class InvalidDocumentIdError(ValueError):
+    """Raised for document ids that are not a relative path inside the documents directory."""
+
+
+class DocumentTooLargeError(ValueError):
+    """Raised for a document whose content is larger than the service accepts."""
+
+
+class IngestionQueueFullError(Exception):
+    """Raised when a document change is submitted while the ingestion queue is at capacity."""
+
+
+class ReadOnlyCorpusError(Exception):
+    """Raised when a document change is submitted while the documents are served from a read-only vector db."""
+
+
+@dataclass
+class IngestionJob:
+    """A queued document upload or deletion and its outcome."""
+
+    operation: str
+    document_id: str
+    content: Optional[str] = field(default=None, repr=False)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = STATUS_QUEUED
+    chunks: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "operation": self.operation,
+            "document_id": self.document_id,
+            "status": self.status,
+            "chunks": self.chunks,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class DocumentIngestionService:
+    """Applies document uploads and deletions to the live vector db on a background thread.
+
+    Jobs run one at a time in submission order, so changes to the same document never interleave.
+    Chunking and embedding happen on the worker thread, off the event loop and without locking the
+    collection, which keeps serving queries while a document is indexed. After every applied change
+    `on_corpus_changed` is called with the new corpus version so caches can drop stale answers.
+    """
+
+    def __init__(
+        self,
+        document_sourcer: DocumentSourcer,
+        chroma_client: "chromadb.API",
+        on_corpus_changed: Optional[Callable[[str], None]] = None,
+        max_pending_jobs: int = 64,
+        max_finished_jobs: int = 1024,
+        read_only: bool = False,
+        max_document_bytes: Optional[int] = None,
+    ):
+        self.document_sourcer = document_sourcer
+        self.max_document_bytes = max_document_bytes
+        self.chroma_client = chroma_client
+        self.on_corpus_changed = on_corpus_changed
+        self.max_finished_jobs = max_finished_jobs
+        self.read_only = read_only
+        self._queue = queue.Queue(maxsize=max_pending_jobs)
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="document-ingestion", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finish the queued jobs and stop the worker."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit_document(self, document_id: str, content: str) -> IngestionJob:
+        """Queue a document to be saved and indexed, replacing any previous version."""
+        if self.max_document_bytes is not None and len(content.encode("utf-8")) > self.max_document_bytes:
+            raise DocumentTooLargeError(f"Document content is larger than {self.max_document_bytes} bytes")
+        return self._submit(IngestionJob(OPERATION_ADD, self._normalize_document_id(document_id), content))
+
+    def delete_document(self, document_id: str) -> IngestionJob:
+        """Queue a document to be removed from disk and from the vector db."""
+        return self._submit(IngestionJob(OPERATION_DELETE, self._normalize_document_id(document_id)))
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _submit(self, job: IngestionJob) -> IngestionJob:
+        if self.read_only:
+            raise ReadOnlyCorpusError("Documents are served from a read-only snapshot and cannot be changed")
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise IngestionQueueFullError(f"Ingestion queue is full ({self._queue.maxsize} jobs)")
+        logger.info(f"Queued ingestion job {job.id}: {job.operation} {job.document_id}")
+        return job
+
+    def _forget_finished_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            self._process(job)
+
+    def _process(self, job: IngestionJob):
+        job.status = STATUS_RUNNING
+        try:
+            collection = self.chroma_client.get_collection(COLLECTION_NAME)
+            if job.operation == OPERATION_ADD:
+                job.chunks = self.document_sourcer.add_document(collection, job.document_id, job.content)
+            elif not self.document_sourcer.delete_document(collection, job.document_id):
+                raise FileNotFoundError(f"Document {job.document_id} does not exist")
+            job.status = STATUS_SUCCEEDED
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = STATUS_FAILED
+        finally:
+            # the content is indexed or abandoned either way, do not keep it around with the job status
+            job.content = None
+            job.finished_at = time.time()
+
+        if job.status == STATUS_SUCCEEDED and self.on_corpus_changed is not None:
+            try:
+                self.on_corpus_changed(self.document_sourcer.get_corpus_version())
+            except Exception as e:
+                logger.error(f"Error handling corpus change after ingestion job {job.id}: {e}")
+
+    def _normalize_document_id(self, document_id: str) -> str:
+        normalized = os.path.normpath(document_id) if document_id else ""
+        if (not normalized or normalized == "." or os.path.isabs(normalized) or "\0" in normalized
+                or normalized == ".." or normalized.startswith(f"..{os.sep}")
+                or normalized.endswith(TEMPORARY_FILE_SUFFIX)):
+            raise InvalidDocumentIdError(f"Invalid document id: {document_id!r}")
+        return normalized
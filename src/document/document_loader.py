@@ -0,0 +1,74 @@
+import hashlib
+import os
+from typing import Iterable, Iterator, List
+
+from src.document.chroma_documents import DocumentChunk
+
+CHUNK_SIZE = 350
+CHUNK_OVERLAP = 20
+READ_BLOCK_SIZE = 1024 * 1024
+# documents are written to a temporary file first, one left behind by a crash is not a document
+TEMPORARY_FILE_SUFFIX = ".tmp"
+
+
+class DocumentLoader:
+    """Streams document chunks from a directory tree without holding whole files in memory.
+
+    Files are read in fixed-size blocks. Each block is cut at its last paragraph, line or word break, the text
+    up to the cut is split exactly once and the rest is carried over into the next block.
+    Chunk ids are derived from the source file and chunk content, so they are stable across restarts.
+    """
+
+    def __init__(self, documents_path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 read_block_size: int = READ_BLOCK_SIZE):
+        self.documents_path = documents_path
+        self.read_block_size = read_block_size
+        # langchain is slow to import, it is only imported once documents are loaded
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def get_file_names(self) -> List[str]:
+        """List every document below the documents path, relative to it, in a stable order."""
+        file_names = []
+        for directory, _, files in os.walk(self.documents_path):
+            for file_name in files:
+                if file_name.endswith(TEMPORARY_FILE_SUFFIX):
+                    continue
+                file_names.append(os.path.relpath(os.path.join(directory, file_name), self.documents_path))
+        return sorted(file_names)
+
+    def iter_chunks(self, file_names: Iterable[str]) -> Iterator[DocumentChunk]:
+        """Lazily yield the chunks of the given documents."""
+        for file_name in file_names:
+            yield from self._iter_file_chunks(file_name)
+
+    def _iter_file_chunks(self, file_name: str) -> Iterator[DocumentChunk]:
+        occurrences = {}
+        for content in self._split_file(file_name):
+            content_id = hashlib.sha256(f"{file_name}\0{content}".encode("utf-8")).hexdigest()[:32]
+            # identical chunks within a file get distinct, still deterministic ids
+            occurrence = occurrences.get(content_id, 0)
+            occurrences[content_id] = occurrence + 1
+            chunk_id = content_id if occurrence == 0 else f"{content_id}-{occurrence}"
+            yield DocumentChunk(content=content, metadata={"source_file": file_name}, id=chunk_id)
+
+    def _split_file(self, file_name: str) -> Iterator[str]:
+        remainder = ""
+        with open(os.path.join(self.documents_path, file_name), "r") as file:
+            for block in iter(lambda: file.read(self.read_block_size), ""):
+                text = remainder + block
+                # a short read is the end of the file, there is nothing left to carry the remainder into
+                boundary = self._find_split_boundary(text) if len(block) == self.read_block_size else len(text)
+                yield from self.text_splitter.split_text(text[:boundary])
+                remainder = text[boundary:]
+        if remainder.strip():
+            yield from self.text_splitter.split_text(remainder)
+
+    def _find_split_boundary(self, text: str) -> int:
+        """Find a separator in the second half of the text to cut at, so the carried over text stays bounded."""
+        for separator in ("\n\n", "\n", " "):
+            index = text.rfind(separator, len(text) // 2)
+            if index >= 0:
+                return index + len(separator)
+        return len(text)
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+import structlog as logging
+
+logger = logging.get_logger(__name__)
+
+MANIFEST_FILE_NAME = "document-manifest.json"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+@dataclass
+class DocumentFingerprint:
+    sha256: str
+    size: int
+    mtime_ns: int
+
+
+class DocumentManifest:
+    """Records the content hash of every indexed document file, so only changed files are re-embedded."""
+
+    def __init__(self, documents: Optional[Dict[str, DocumentFingerprint]] = None):
+        self.documents = documents or {}
+
+    @classmethod
+    def load(cls, directory: str) -> "DocumentManifest":
+        """Read the manifest stored in `directory`. A missing or unreadable manifest is empty."""
+        path = os.path.join(directory, MANIFEST_FILE_NAME)
+        try:
+            with open(path, "r") as file:
+                content = json.load(file)
+            return cls({name: DocumentFingerprint(**fingerprint) for name, fingerprint in content.items()})
+        except FileNotFoundError:
+            return cls()
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable document manifest {path}: {e}")
+            return cls()
+
+    def save(self, directory: str):
+        """Atomically replace the manifest stored in `directory`."""
+        path = os.path.join(directory, MANIFEST_FILE_NAME)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({name: asdict(fingerprint) for name, fingerprint in self.documents.items()}, file, indent=2)
+        os.replace(temporary_path, path)
+
+    def get_corpus_version(self) -> str:
+        """Fingerprint the whole corpus from the per-file hashes."""
+        corpus_hash = hashlib.sha256()
+        for name in sorted(self.documents):
+            corpus_hash.update(f"{name}\0{self.documents[name].sha256}\n".encode("utf-8"))
+        return corpus_hash.hexdigest()
+
+
+def fingerprint_file(path: str, previous: Optional[DocumentFingerprint] = None) -> DocumentFingerprint:
+    """Hash a file, reusing the previous hash when its size and modification time are unchanged."""
+    stat = os.stat(path)
+    if previous is not None and previous.size == stat.st_size and previous.mtime_ns == stat.st_mtime_ns:
+        return previous
+
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            file_hash.update(block)
+    return DocumentFingerprint(sha256=file_hash.hexdigest(), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
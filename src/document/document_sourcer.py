@@ -1,68 +1,230 @@
 import os
-import chromadb
+from typing import TYPE_CHECKING, Dict, Optional
 
-from src.document.chroma_documents import ChromaDocuments
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import structlog as logging
+
+from src.document.bm25_index import BM25Index
+from src.document.chroma_documents import DocumentChunk
+from src.document.document_loader import TEMPORARY_FILE_SUFFIX, DocumentLoader
+from src.document.document_manifest import DocumentFingerprint, DocumentManifest, fingerprint_file
+from src.document.embedding_pipeline import EmbeddingPipeline
+
+if TYPE_CHECKING:
+    import chromadb
+
+logger = logging.get_logger(__name__)
 
 COLLECTION_NAME = "all-documents"
 DOCUMENTS_PATH = 'src/document/saved_documents'
+# the number of chunks read back from the collection at once when building the keyword index
+LEXICAL_INDEX_PAGE_SIZE = 1000
+LEXICAL_INDEX_FILE_NAME = "keyword-index.pickle"
 
 
 class DocumentSourcer:
 
-    def get_preloaded_vector_database(self) -> chromadb.API:
+    def __init__(self, persist_path: Optional[str] = None, documents_path: str = DOCUMENTS_PATH,
+                 embedding_pipeline: Optional[EmbeddingPipeline] = None, lexical_index: Optional[BM25Index] = None,
+                 read_only: bool = False):
+        """
+        persist_path: str -> Directory of a persistent vector db, the vector db is in-memory if unset
+        documents_path: str -> Directory tree of the documents to load into the vector db
+        embedding_pipeline: EmbeddingPipeline -> Embeds and adds document chunks, in-process and one batch at a time if unset
+        lexical_index: BM25Index -> Keyword index kept in line with the collection, no keyword index is built if unset
+        read_only: bool -> Serve the persisted vector db as it is, without syncing it with the documents on disk
+        """
+        if read_only and persist_path is None:
+            raise ValueError("A read-only vector db must be persisted")
+        self.persist_path = persist_path
+        self.read_only = read_only
+        self.documents_path = documents_path
+        self.document_loader = DocumentLoader(documents_path)
+        self.embedding_pipeline = embedding_pipeline or EmbeddingPipeline(workers=1)
+        self.lexical_index = lexical_index
+        self.manifest: Optional[DocumentManifest] = None
+
+    def get_preloaded_vector_database(self) -> "chromadb.API":
+        """
+        Create a vector db and load the documents.
+
+        A persistent vector db is opened from disk and only documents that were added, changed or removed
+        since it was last synced are re-embedded or deleted. A read-only vector db is opened as it is.
+        """
+        if self.read_only:
+            return self._open_read_only_vector_database()
+
+        import chromadb
+
+        if self.persist_path is None:
+            # Setup Chroma in-memory
+            client = chromadb.Client()
+            collection = client.create_collection(COLLECTION_NAME)
+            previous_manifest = DocumentManifest()
+        else:
+            os.makedirs(self.persist_path, exist_ok=True)
+            client = chromadb.PersistentClient(path=self.persist_path)
+            collection = client.get_or_create_collection(COLLECTION_NAME)
+            previous_manifest = DocumentManifest.load(self.persist_path)
+            if not previous_manifest.documents and collection.count() > 0:
+                # without a manifest there is no telling which chunks are stale
+                logger.warning("Vector db has no document manifest, rebuilding the document collection")
+                client.delete_collection(COLLECTION_NAME)
+                collection = client.create_collection(COLLECTION_NAME)
+
+        self.manifest = self._sync_collection(collection, previous_manifest)
+        if self.persist_path is not None:
+            self.manifest.save(self.persist_path)
+        if self.lexical_index is not None:
+            self._load_lexical_index(collection)
+        return client
+
+    def get_corpus_version(self) -> str:
+        """
+        Fingerprint the document corpus so caches can tell when the documents changed.
+        """
+        if self.read_only:
+            return self.manifest.get_corpus_version()
+        manifest = DocumentManifest(self._fingerprint_documents(self.manifest or DocumentManifest()))
+        return manifest.get_corpus_version()
+
+    def add_document(self, collection, document_id: str, content: str) -> int:
         """
-        Create an in-memory vector db and load initial documents.
+        Save a document and index it in place of any previous version. Returns the number of chunks.
+
+        The document is embedded before the collection is touched, then its chunks are upserted and stale
+        chunks of the previous version deleted, so queries never see the document missing. The manifest is
+        updated last, so a document that was saved but not indexed is picked up by the next startup sync.
         """
-        # Setup Chroma in-memory
-        client = chromadb.Client()
+        path = os.path.join(self.documents_path, document_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}{TEMPORARY_FILE_SUFFIX}"
+        with open(temporary_path, "w") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+
+        chunks = list(self.document_loader.iter_chunks([document_id]))
+        embeddings = self.embedding_pipeline.embed(chunks)
+        stale_ids = self._get_chunk_ids(collection, document_id) - {chunk.id for chunk in chunks}
+        if chunks:
+            collection.upsert(
+                embeddings=embeddings,
+                documents=[chunk.content for chunk in chunks],
+                metadatas=[chunk.metadata for chunk in chunks],
+                ids=[chunk.id for chunk in chunks],
+            )
+        if stale_ids:
+            collection.delete(ids=sorted(stale_ids))
+        if self.lexical_index is not None:
+            self.lexical_index.remove_source(document_id)
+            self.lexical_index.add(chunks)
 
-        # Create a single collection for all our documents
-        collection = client.create_collection(COLLECTION_NAME)
+        self._update_manifest(document_id, fingerprint_file(path))
+        logger.info(f"Indexed document {document_id}: {len(chunks)} chunks, {len(stale_ids)} stale chunks deleted")
+        return len(chunks)
 
-        # Get chunked document content and metadata from specified location
-        chroma_documents = self._get_documents(DOCUMENTS_PATH)
+    def delete_document(self, collection, document_id: str) -> bool:
+        """
+        Remove a document from disk and from the collection. Returns False if there is no such document.
+        """
+        path = os.path.join(self.documents_path, document_id)
+        if not os.path.isfile(path):
+            return False
 
-        # Add document chunks to the collection
-        collection.add(
-            documents=chroma_documents.document_contents,
-            metadatas=chroma_documents.metadata,
-            ids=chroma_documents.ids,
-        )
+        os.remove(path)
+        collection.delete(where={'source_file': document_id})
+        if self.lexical_index is not None:
+            self.lexical_index.remove_source(document_id)
+        self._update_manifest(document_id, None)
+        logger.info(f"Deleted document {document_id}")
+        return True
+
+    def _open_read_only_vector_database(self) -> "chromadb.API":
+        """
+        Open a vector db persisted ahead of time, e.g. when the container image was built.
+        """
+        import chromadb
+
+        client = chromadb.PersistentClient(path=self.persist_path)
+        collection = client.get_collection(COLLECTION_NAME)
+        self.manifest = DocumentManifest.load(self.persist_path)
+        logger.info(f"Opened read-only vector db {self.persist_path} with {collection.count()} chunks "
+                    f"of {len(self.manifest.documents)} documents")
+        if self.lexical_index is not None:
+            self._load_lexical_index(collection)
         return client
 
-    def _get_documents(self, path_to_documents: str) -> ChromaDocuments:
+    def _load_lexical_index(self, collection):
         """
-        Loads all documents from given directory, formats metadata for chromadb.
+        Load the keyword index saved for the current corpus, or index every chunk of the collection page by page.
+
+        A rebuilt index is saved next to the manifest, unless the vector db is read-only.
         """
-        full_document_contents = []
-        metadata = []
-        for file_name in os.listdir(path_to_documents):
-            with open(os.path.join(path_to_documents, file_name), 'r') as file:
-                content = file.read()
-                full_document_contents.append(content)
-                metadata.append({'source_file': file_name})
+        corpus_version = self.manifest.get_corpus_version()
+        path = self._get_lexical_index_path()
+        if path is not None and self.lexical_index.load(path, corpus_version):
+            logger.info(f"Loaded keyword index of {len(self.lexical_index)} chunks")
+            return
+
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=LEXICAL_INDEX_PAGE_SIZE, offset=offset)
+            if not page['ids']:
+                break
+            self.lexical_index.add(
+                DocumentChunk(content, metadata, chunk_id)
+                for chunk_id, content, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+            )
+            offset += len(page['ids'])
+        logger.info(f"Built keyword index of {len(self.lexical_index)} chunks")
+        if path is not None and not self.read_only:
+            self.lexical_index.save(path, corpus_version)
 
-        chroma_documents = self._get_documents_as_chunks(full_document_contents, metadata)
-        return chroma_documents
+    def _get_lexical_index_path(self) -> Optional[str]:
+        if self.persist_path is None:
+            return None
+        return os.path.join(self.persist_path, LEXICAL_INDEX_FILE_NAME)
 
-    def _get_documents_as_chunks(self, document_contents: [], document_metadata: [], chunk_size=350,
-                                 chunk_overlap=20) -> ChromaDocuments:
+    def _get_chunk_ids(self, collection, document_id: str) -> set:
+        return set(collection.get(where={'source_file': document_id}, include=[])['ids'])
+
+    def _update_manifest(self, document_id: str, fingerprint: Optional[DocumentFingerprint]):
+        documents = dict(self.manifest.documents if self.manifest is not None else {})
+        if fingerprint is None:
+            documents.pop(document_id, None)
+        else:
+            documents[document_id] = fingerprint
+        self.manifest = DocumentManifest(documents)
+        if self.persist_path is not None:
+            self.manifest.save(self.persist_path)
+            if self.lexical_index is not None:
+                self.lexical_index.save(self._get_lexical_index_path(), self.manifest.get_corpus_version())
+
+    def _sync_collection(self, collection, previous_manifest: DocumentManifest) -> DocumentManifest:
         """
-        Split the documents into chunks.
+        Bring the collection in line with the documents on disk and return the resulting manifest.
         """
+        fingerprints = self._fingerprint_documents(previous_manifest)
+        removed = [name for name in previous_manifest.documents if name not in fingerprints]
+        changed = [
+            name for name, fingerprint in fingerprints.items()
+            if name not in previous_manifest.documents or previous_manifest.documents[name].sha256 != fingerprint.sha256
+        ]
+        logger.info(f"Syncing vector db: {len(changed)} new or changed and {len(removed)} removed documents, "
+                    f"{len(fingerprints) - len(changed)} unchanged")
+
+        # Delete every chunk of removed and changed documents, including leftovers of an interrupted sync
+        for file_name in removed + changed:
+            collection.delete(where={'source_file': file_name})
 
-        # Use the LangChain text splitter to convert documents to chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        documents = text_splitter.create_documents(document_contents, document_metadata)
-        chunked_documents = text_splitter.split_documents(documents)
+        if changed:
+            # Stream the chunks of the changed documents into batched embedding and indexing
+            self.embedding_pipeline.add(collection, self.document_loader.iter_chunks(changed))
+        return DocumentManifest(fingerprints)
 
-        # Extract the document chunks and metadata from the LangChain document object
-        document_contents = []
-        metadata = []
-        document_ids = []
-        for index, chunk in enumerate(chunked_documents):
-            document_contents.append(chunk.page_content)
-            metadata.append(chunk.metadata)
-            document_ids.append(str(index))
-        return ChromaDocuments(document_contents, metadata, document_ids)
+    def _fingerprint_documents(self, previous_manifest: DocumentManifest) -> Dict[str, DocumentFingerprint]:
+        return {
+            file_name: fingerprint_file(
+                os.path.join(self.documents_path, file_name), previous_manifest.documents.get(file_name)
+            )
+            for file_name in self.document_loader.get_file_names()
+        }
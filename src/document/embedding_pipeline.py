@@ -0,0 +1,174 @@
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import structlog as logging
+
+from src.document.chroma_documents import DocumentChunk
+
+logger = logging.get_logger(__name__)
+
+# the embedding function of a worker process, created once by the pool initializer
+_worker_embedding_function = None
+
+
+def get_default_embedding_function():
+    """Chroma's default embedding function, the one collections use to embed query texts."""
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+def get_available_core_count() -> int:
+    """The number of cores this process may run on, which respects CPU affinity and cpusets unlike cpu_count."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _limit_onnx_threads(threads: int):
+    """Make the ONNX runtime sessions created in this process use at most `threads` intra-op threads.
+
+    Chroma's embedding function has no option for the thread count and creates its session with options
+    that leave it unset, and such a session runs a thread per core, so several embedding workers would each
+    try to use every core. The session class is wrapped to fill in the thread count of the options it gets.
+    """
+    try:
+        import onnxruntime
+    except ImportError:
+        return
+
+    session_class = getattr(onnxruntime, "InferenceSession", None)
+    if session_class is None:
+        logger.warning("onnxruntime has no InferenceSession, embedding workers are not limited to "
+                       f"{threads} threads each")
+        return
+
+    def create_session(path_or_bytes, sess_options=None, *args, **kwargs):
+        if sess_options is None:
+            sess_options = onnxruntime.SessionOptions()
+        # zero is the default and lets the runtime pick a thread per core
+        if not sess_options.intra_op_num_threads:
+            sess_options.intra_op_num_threads = threads
+            sess_options.inter_op_num_threads = 1
+        return session_class(path_or_bytes, sess_options, *args, **kwargs)
+
+    onnxruntime.InferenceSession = create_session
+
+
+def _initialize_worker(embedding_function_factory: Callable, threads_per_worker: int):
+    global _worker_embedding_function
+    _limit_onnx_threads(threads_per_worker)
+    _worker_embedding_function = embedding_function_factory()
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_embedding_function(texts)
+
+
+class EmbeddingPipeline:
+    """Embeds document chunks in batches on a process pool and adds each batch to a collection as it completes.
+
+    Chunks are consumed lazily from any iterable and at most two batches per worker are in flight, so memory
+    stays bounded by the batch size rather than the corpus size. With a single worker, or fewer batches than
+    workers, the batches are embedded in the calling process.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 64,
+        workers: Optional[int] = None,
+        embedding_function_factory: Callable = get_default_embedding_function,
+    ):
+        self.batch_size = batch_size
+        self.workers = workers or get_available_core_count()
+        self.embedding_function_factory = embedding_function_factory
+        # the in-process embedding function, created on first use and kept for later calls
+        self._embedding_function = None
+
+    def add(self, collection, chunks: Iterable[DocumentChunk]) -> Dict:
+        """Embed the chunks and add them to the collection. Returns the chunk count and throughput."""
+        started_at = time.perf_counter()
+        batches = self._batch(chunks)
+        # starting the workers and loading a model in each only pays off with a batch for every worker
+        first_batches = list(itertools.islice(batches, self.workers))
+        batches = itertools.chain(first_batches, batches)
+        if len(first_batches) < self.workers or self.workers <= 1:
+            embedding_function = self._get_embedding_function()
+            embedded = ((batch, embedding_function([chunk.content for chunk in batch])) for batch in batches)
+            chunk_count = self._add_batches(collection, embedded, started_at)
+        else:
+            threads_per_worker = max(1, get_available_core_count() // self.workers)
+            # spawn rather than fork, the parent process runs threads that must not be forked
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialize_worker,
+                initargs=(self.embedding_function_factory, threads_per_worker),
+            ) as executor:
+                embedded = self._embed_on_pool(executor, batches)
+                chunk_count = self._add_batches(collection, embedded, started_at)
+
+        elapsed = time.perf_counter() - started_at
+        stats = {
+            "chunks": chunk_count,
+            "seconds": round(elapsed, 2),
+            "chunks_per_second": round(chunk_count / elapsed, 2) if elapsed else 0.0,
+        }
+        logger.info(f"Embedded and indexed {chunk_count} chunks: {stats}")
+        return stats
+
+    def embed(self, chunks: List[DocumentChunk]) -> List[List[float]]:
+        """Embed a small set of chunks in the calling process, e.g. a single uploaded document."""
+        embedding_function = self._get_embedding_function()
+        embeddings = []
+        for batch in self._batch(chunks):
+            embeddings.extend(embedding_function([chunk.content for chunk in batch]))
+        return embeddings
+
+    def _get_embedding_function(self):
+        if self._embedding_function is None:
+            self._embedding_function = self.embedding_function_factory()
+        return self._embedding_function
+
+    def _batch(self, chunks: Iterable[DocumentChunk]) -> Iterator[List[DocumentChunk]]:
+        iterator = iter(chunks)
+        while True:
+            batch = list(itertools.islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _embed_on_pool(self, executor: ProcessPoolExecutor, batches: Iterator[List[DocumentChunk]]):
+        """Keep the workers busy with a bounded number of batches and yield them in completion order."""
+        in_flight: Dict[Future, List[DocumentChunk]] = {}
+        max_in_flight = self.workers * 2
+        for batch in batches:
+            in_flight[executor.submit(_embed_in_worker, [chunk.content for chunk in batch])] = batch
+            if len(in_flight) >= max_in_flight:
+                yield from self._collect_completed(in_flight)
+        while in_flight:
+            yield from self._collect_completed(in_flight)
+
+    @staticmethod
+    def _collect_completed(in_flight: Dict[Future, List[DocumentChunk]]):
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield in_flight.pop(future), future.result()
+
+    def _add_batches(self, collection, embedded_batches, started_at: float) -> int:
+        chunk_count = 0
+        for batch, embeddings in embedded_batches:
+            collection.add(
+                embeddings=embeddings,
+                documents=[chunk.content for chunk in batch],
+                metadatas=[chunk.metadata for chunk in batch],
+                ids=[chunk.id for chunk in batch],
+            )
+            chunk_count += len(batch)
+            elapsed = time.perf_counter() - started_at
+            logger.info(f"Indexed {chunk_count} chunks ({chunk_count / elapsed:.1f} chunks/s)")
+        return chunk_count
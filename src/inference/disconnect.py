@@ -0,0 +1,31 @@
+import asyncio
+from typing import Awaitable, TypeVar
+
+from starlette.requests import Request
+
+DISCONNECT_POLL_INTERVAL_SECONDS = 0.5
+# non-standard status popularized by nginx for requests the client abandoned
+HTTP_499_CLIENT_CLOSED_REQUEST = 499
+
+T = TypeVar("T")
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client went away before its response was ready."""
+
+
+async def cancel_on_disconnect(
+    request: Request, awaitable: Awaitable[T], poll_interval: float = DISCONNECT_POLL_INTERVAL_SECONDS
+) -> T:
+    """Await `awaitable`, cancelling it as soon as the client disconnects."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnectedError("Client disconnected before the response was ready")
+    finally:
+        if not task.done():
+            task.cancel()
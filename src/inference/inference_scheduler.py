@@ -0,0 +1,451 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import structlog as logging
+
+from src.inference.streaming import FINISH_REASON_CANCELLED, collect_completion, stream_completion
+from src.model.model_registry import ModelRegistry, UnknownModelError
+from src.model.prefix_state_cache import PrefixStateCache
+
+logger = logging.get_logger(__name__)
+
+DEFAULT_PRIORITY = 0
+# weight of the newest sample in the moving averages of queue wait and service time
+STATS_SMOOTHING = 0.2
+_END_OF_STREAM = object()
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the scheduler queue is at capacity."""
+
+
+class SchedulerStoppedError(Exception):
+    """Raised when a job is submitted to, or still queued in, a stopped scheduler."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a job's deadline passed before a worker could start it."""
+
+
+@dataclass(order=True)
+class InferenceJob:
+    """A unit of work for the scheduler. Jobs are ordered by priority, then arrival."""
+
+    sort_key: tuple
+    prompt: str = field(compare=False)
+    max_tokens: int = field(compare=False)
+    temperature: float = field(compare=False)
+    on_event: Optional[Callable[[Dict], None]] = field(compare=False, default=None)
+    model: Optional[str] = field(compare=False, default=None)
+    deadline: Optional[float] = field(compare=False, default=None)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+    future: Future = field(compare=False, default_factory=Future)
+    cancelled: threading.Event = field(compare=False, default_factory=threading.Event)
+
+    @property
+    def is_stream(self) -> bool:
+        return self.on_event is not None
+
+    def cancel(self):
+        """Withdraw the job. A queued job leaves the queue and a running generation stops at the next token."""
+        self.cancelled.set()
+        self.future.cancel()
+
+    @property
+    def is_expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    @property
+    def batch_key(self) -> tuple:
+        """Jobs with the same batch key produce the same completion and can share one generation."""
+        return self.model, self.prompt, self.max_tokens, self.temperature
+
+
+class _JobQueue:
+    """A bounded priority queue that lets a worker pull out every queued job matching a batch key."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._heap: List[InferenceJob] = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap)
+
+    def put(self, job: InferenceJob):
+        with self._condition:
+            if self._closed:
+                raise SchedulerStoppedError("Inference scheduler is not running")
+            if len(self._heap) >= self.max_size:
+                raise QueueFullError(f"Inference queue is full ({self.max_size} jobs)")
+            heapq.heappush(self._heap, job)
+            self._condition.notify()
+
+    def get(self) -> Optional[InferenceJob]:
+        """Block until a job is available. Returns None once the queue is closed and drained."""
+        with self._condition:
+            while not self._heap and not self._closed:
+                self._condition.wait()
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)
+
+    def remove(self, job: InferenceJob) -> bool:
+        """Remove a queued job, freeing its slot. Returns False if a worker already took it."""
+        with self._condition:
+            remaining = [queued for queued in self._heap if queued is not job]
+            if len(remaining) == len(self._heap):
+                return False
+            self._heap = remaining
+            heapq.heapify(self._heap)
+            return True
+
+    def take_matching(self, batch_key: tuple, limit: int) -> List[InferenceJob]:
+        """Remove and return up to `limit` queued non-streaming jobs with the given batch key."""
+        with self._condition:
+            matching = [
+                job for job in sorted(self._heap) if not job.is_stream and job.batch_key == batch_key
+            ][:limit]
+            if matching:
+                taken = set(map(id, matching))
+                self._heap = [job for job in self._heap if id(job) not in taken]
+                heapq.heapify(self._heap)
+            return matching
+
+    def close(self) -> List[InferenceJob]:
+        """Stop accepting jobs, wake up the workers and return the jobs that never started."""
+        with self._condition:
+            self._closed = True
+            pending, self._heap = self._heap, []
+            self._condition.notify_all()
+            return pending
+
+
+class InferenceScheduler:
+    """Owns the loaded models and runs every generation on dedicated worker threads.
+
+    A llama-cpp model is not safe to call from several threads, so each worker thread owns
+    exactly one model instance and the scheduler's concurrency equals the number of models.
+    Endpoints submit jobs and await the returned futures instead of calling the model directly.
+
+    llama-cpp evaluates one sequence at a time, so micro-batching coalesces queued jobs that
+    ask for the same completion: the worker answers all of them from a single generation.
+
+    Admission control: submissions are rejected with `QueueFullError` once `max_queue_size` jobs
+    are waiting, and queued jobs whose deadline passes before a worker picks them up are dropped
+    with `DeadlineExceededError` instead of generating a response nobody is waiting for.
+
+    With a `prefix_cache`, every worker evaluates the static prompt prefix on its model when it
+    starts and restores that state before each generation.
+
+    The models may also be handles on models loaded in worker processes, see `InferenceProcessPool`,
+    in which case each worker thread dispatches its generations to its own process.
+
+    Jobs naming a `model` run on that model from the `model_registry`, which a worker holds for the
+    duration of the generation. Other jobs run on the worker's own model.
+    """
+
+    def __init__(
+        self, models: List, max_queue_size: int = 64, max_batch_size: int = 8,
+        default_timeout: Optional[float] = None, prefix_cache: Optional[PrefixStateCache] = None,
+        model_registry: Optional[ModelRegistry] = None,
+    ):
+        if not models:
+            raise ValueError("At least one model is required")
+        self.models = models
+        self.max_batch_size = max_batch_size
+        self.default_timeout = default_timeout
+        self.prefix_cache = prefix_cache
+        self.model_registry = model_registry
+        self._queue = _JobQueue(max_queue_size)
+        self._sequence = itertools.count()
+        self._workers: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self._average_wait_time = 0.0
+        self._average_service_time = 0.0
+        self._generations = 0
+        self._rejected_jobs = 0
+        self._expired_jobs = 0
+        self._cancelled_jobs = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def concurrency(self) -> int:
+        return len(self.models)
+
+    @property
+    def max_queue_size(self) -> int:
+        return self._queue.max_size
+
+    @property
+    def is_saturated(self) -> bool:
+        return self.queue_depth >= self._queue.max_size
+
+    def get_stats(self) -> Dict:
+        """Report queue depth and timing so load balancers can route around a saturated replica."""
+        with self._stats_lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_size": self._queue.max_size,
+                "concurrency": self.concurrency,
+                "average_wait_time_ms": round(self._average_wait_time * 1000, 2),
+                "average_service_time_ms": round(self._average_service_time * 1000, 2),
+                "generations": self._generations,
+                "rejected_jobs": self._rejected_jobs,
+                "expired_jobs": self._expired_jobs,
+                "cancelled_jobs": self._cancelled_jobs,
+            }
+
+    def get_retry_after_seconds(self) -> int:
+        """Estimate how long it will take the workers to drain the current queue."""
+        with self._stats_lock:
+            drain_time = self.queue_depth * self._average_service_time / len(self.models)
+        return max(1, math.ceil(drain_time))
+
+    def start(self):
+        """Start one worker thread per model."""
+        for index, model in enumerate(self.models):
+            worker = threading.Thread(
+                target=self._run_worker, args=(model,), name=f"inference-worker-{index}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"Started inference scheduler with {len(self._workers)} worker(s)")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Reject new jobs, fail the queued ones and wait for running generations to finish."""
+        for job in self._queue.close():
+            if self._claim(job):
+                self._fail(job, SchedulerStoppedError("Inference scheduler stopped"))
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def submit(
+        self, prompt: str, max_tokens: int, temperature: float, priority: int = DEFAULT_PRIORITY,
+        timeout: Optional[float] = None, on_event: Optional[Callable[[Dict], None]] = None,
+        model: Optional[str] = None,
+    ) -> InferenceJob:
+        """Queue a generation. Streaming jobs report events through `on_event` as they are produced.
+
+        `timeout` is the number of seconds the job may wait in the queue before it is dropped,
+        defaulting to the scheduler's `default_timeout`. `model` names a model of the registry to
+        generate with instead of the workers' own model.
+        """
+        if model is not None and (self.model_registry is None or not self.model_registry.has_model(model)):
+            raise UnknownModelError(f"Unknown model: {model}")
+        timeout = timeout if timeout is not None else self.default_timeout
+        job = InferenceJob(
+            sort_key=(-priority, next(self._sequence)),
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            on_event=on_event,
+            model=model,
+            deadline=time.monotonic() + timeout if timeout is not None else None,
+        )
+        # a job cancelled while queued gives its slot back right away instead of once a worker reaches it,
+        # a job that is running can no longer be cancelled through its future
+        job.future.add_done_callback(lambda future: self._withdraw(job) if future.cancelled() else None)
+        try:
+            self._queue.put(job)
+        except QueueFullError:
+            with self._stats_lock:
+                self._rejected_jobs += 1
+            raise
+        return job
+
+    async def complete(
+        self, prompt: str, max_tokens: int, temperature: float, priority: int = DEFAULT_PRIORITY,
+        timeout: Optional[float] = None, model: Optional[str] = None,
+    ) -> Dict:
+        """Queue a generation and wait for the full completion.
+
+        Cancelling the awaiting task cancels the job, stopping its generation if it already started.
+        """
+        job = self.submit(prompt, max_tokens, temperature, priority, timeout, model=model)
+        try:
+            return await asyncio.wrap_future(job.future)
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+    def stream(
+        self, prompt: str, max_tokens: int, temperature: float, priority: int = DEFAULT_PRIORITY,
+        timeout: Optional[float] = None, model: Optional[str] = None,
+    ) -> AsyncIterator[Dict]:
+        """Queue a streaming generation right away and return an iterator over its events.
+
+        Must be called from the event loop. The job is queued before the iterator is returned so
+        that submission errors are raised before a streaming response has started.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        job = self.submit(
+            prompt, max_tokens, temperature, priority, timeout,
+            on_event=lambda event: loop.call_soon_threadsafe(events.put_nowait, event), model=model,
+        )
+        return self._iterate_events(job, events)
+
+    @staticmethod
+    async def _iterate_events(job: InferenceJob, events: asyncio.Queue) -> AsyncIterator[Dict]:
+        try:
+            while True:
+                event = await events.get()
+                if event is _END_OF_STREAM:
+                    break
+                yield event
+            # surface a failed generation to the caller
+            await asyncio.wrap_future(job.future)
+        finally:
+            # the consumer stopped early, e.g. the client disconnected, so stop generating
+            if not job.future.done():
+                job.cancel()
+
+    def _run_worker(self, model):
+        # models running in worker processes keep the prefix state on their side
+        if self.prefix_cache is not None and not getattr(model, "manages_prefix_state", False):
+            try:
+                self.prefix_cache.warm(model)
+            except Exception as e:
+                logger.error(f"Error caching the prompt prefix state, prompts will be evaluated in full: {e}")
+
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.is_stream:
+                if self._claim(job):
+                    self._run_stream(model, job)
+            else:
+                batch = [job] + self._queue.take_matching(job.batch_key, self.max_batch_size - 1)
+                batch = [batched_job for batched_job in batch if self._claim(batched_job)]
+                if batch:
+                    self._run_batch(model, batch)
+
+    def _run_batch(self, model, batch: List[InferenceJob]):
+        job = batch[0]
+        if len(batch) > 1:
+            logger.info(f"Answering {len(batch)} identical queued jobs with a single generation")
+        started_at = time.monotonic()
+        try:
+            with self._use_model(model, job) as job_model:
+                self._restore_prefix(job_model)
+                # generate token by token so the batch can be abandoned once every caller is gone
+                completion = collect_completion(stream_completion(
+                    job_model, job.prompt, job.max_tokens, job.temperature,
+                    should_stop=lambda: all(batched_job.cancelled.is_set() for batched_job in batch),
+                ))
+        except Exception as e:
+            logger.error(f"Error running inference job: {e}")
+            for batched_job in batch:
+                self._fail(batched_job, e)
+            return
+        finally:
+            self._record_service_time(time.monotonic() - started_at)
+        if completion["choices"][0]["finish_reason"] == FINISH_REASON_CANCELLED:
+            self._record_cancellation(len(batch))
+        for batched_job in batch:
+            batched_job.future.set_result(completion)
+
+    def _run_stream(self, model, job: InferenceJob):
+        started_at = time.monotonic()
+        try:
+            with self._use_model(model, job) as job_model:
+                self._restore_prefix(job_model)
+                for event in stream_completion(
+                    job_model, job.prompt, job.max_tokens, job.temperature, should_stop=job.cancelled.is_set
+                ):
+                    if event["type"] == "done" and event["finish_reason"] == FINISH_REASON_CANCELLED:
+                        logger.info("Stopped streaming generation after the client went away")
+                        self._record_cancellation(1)
+                    job.on_event(event)
+        except Exception as e:
+            logger.error(f"Error running streaming inference job: {e}")
+            self._fail(job, e)
+            return
+        finally:
+            self._record_service_time(time.monotonic() - started_at)
+        job.future.set_result(None)
+        job.on_event(_END_OF_STREAM)
+
+    @contextmanager
+    def _use_model(self, model, job: InferenceJob) -> Iterator:
+        """Yield the model a job generates with, holding it in the registry if the job names one."""
+        if job.model is None:
+            yield model
+            return
+        with self.model_registry.use(job.model) as registry_model:
+            if self.prefix_cache is not None and not self.prefix_cache.is_warm(registry_model):
+                try:
+                    self.prefix_cache.warm(registry_model)
+                except Exception as e:
+                    logger.error(f"Error caching the prompt prefix state of model {job.model}: {e}")
+            yield registry_model
+
+    def _restore_prefix(self, model):
+        if self.prefix_cache is not None:
+            self.prefix_cache.restore(model)
+
+    def _claim(self, job: InferenceJob) -> bool:
+        """Mark a job as running.
+
+        Returns False if its caller already gave up and cancelled it, or if its deadline passed.
+        """
+        if not job.future.set_running_or_notify_cancel():
+            self._record_cancellation(1)
+            if job.is_stream:
+                job.on_event(_END_OF_STREAM)
+            return False
+
+        if job.is_expired:
+            logger.info("Dropping inference job whose deadline passed while queued")
+            with self._stats_lock:
+                self._expired_jobs += 1
+            self._fail(job, DeadlineExceededError("Request deadline passed before inference started"))
+            return False
+
+        with self._stats_lock:
+            self._average_wait_time = self._moving_average(
+                self._average_wait_time, time.monotonic() - job.enqueued_at
+            )
+        return True
+
+    def _withdraw(self, job: InferenceJob):
+        if self._queue.remove(job):
+            self._record_cancellation(1)
+            if job.is_stream:
+                job.on_event(_END_OF_STREAM)
+
+    def _record_cancellation(self, job_count: int):
+        with self._stats_lock:
+            self._cancelled_jobs += job_count
+
+    def _record_service_time(self, service_time: float):
+        with self._stats_lock:
+            self._generations += 1
+            self._average_service_time = self._moving_average(self._average_service_time, service_time)
+
+    @staticmethod
+    def _moving_average(average: float, sample: float) -> float:
+        if average == 0.0:
+            return sample
+        return STATS_SMOOTHING * sample + (1 - STATS_SMOOTHING) * average
+
+    def _fail(self, job: InferenceJob, error: Exception):
+        job.future.set_exception(error)
+        if job.is_stream:
+            job.on_event(_END_OF_STREAM)
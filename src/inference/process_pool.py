@@ -0,0 +1,261 @@
+import multiprocessing
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import structlog as logging
+
+from src.model.prefix_state_cache import PrefixStateCache
+
+logger = logging.get_logger(__name__)
+
+MESSAGE_READY = "ready"
+MESSAGE_GENERATE = "generate"
+MESSAGE_STOP = "stop"
+MESSAGE_SHUTDOWN = "shutdown"
+MESSAGE_CHUNK = "chunk"
+MESSAGE_END = "end"
+MESSAGE_ERROR = "error"
+# how long a worker may take to stop a generation whose stream was closed before it is terminated
+STOP_TIMEOUT_SECONDS = 10.0
+
+
+class InferenceWorkerError(Exception):
+    """Raised when an inference worker process fails to load its model, fails a generation or exits."""
+
+
+def get_core_slices(process_count: int, threads_per_process: Optional[int] = None,
+                    cores: Optional[List[int]] = None) -> List[List[int]]:
+    """Split the cores this process may run on into one slice per worker process.
+
+    Without `threads_per_process` the cores are split evenly. Slices wrap around and overlap when
+    more threads are asked for than there are cores.
+    """
+    if cores is None:
+        cores = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+    cores = sorted(cores)
+    size = threads_per_process or max(1, len(cores) // process_count)
+    return [[cores[(index * size + offset) % len(cores)] for offset in range(size)] for index in range(process_count)]
+
+
+def load_llama_model(model_path: str, **model_kwargs):
+    from llama_cpp import Llama
+
+    return Llama(model_path=model_path, **model_kwargs)
+
+
+def _run_worker_process(model_factory: Callable, model_path: str, model_kwargs: Dict, cores: List[int],
+                        prefix: Optional[str], connection):
+    """Load the model and answer generation requests from the connection until it is shut down."""
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        model = model_factory(model_path, **model_kwargs)
+    except Exception as e:
+        connection.send((MESSAGE_ERROR, f"Error loading model: {e}"))
+        return
+
+    prefix_cache = PrefixStateCache(prefix) if prefix is not None else None
+    if prefix_cache is not None:
+        try:
+            prefix_cache.warm(model)
+        except Exception as e:
+            logger.error(f"Error caching the prompt prefix state, prompts will be evaluated in full: {e}")
+    connection.send((MESSAGE_READY, os.getpid()))
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message[0] == MESSAGE_SHUTDOWN:
+            return
+        if message[0] != MESSAGE_GENERATE:
+            # a stop for a generation that already ended
+            continue
+
+        _, prompt, max_tokens, temperature = message
+        try:
+            if prefix_cache is not None:
+                prefix_cache.restore(model)
+            chunks = model(prompt, max_tokens=max_tokens, temperature=temperature, stream=True)
+            for chunk in chunks:
+                # the only message sent while generating is a stop, the caller closed the stream
+                if connection.poll():
+                    connection.recv()
+                    chunks.close()
+                    break
+                connection.send((MESSAGE_CHUNK, chunk))
+            connection.send((MESSAGE_END, None))
+        except Exception as e:
+            connection.send((MESSAGE_ERROR, str(e)))
+
+
+class InferenceProcess:
+    """A handle on a llama-cpp model loaded in a worker process, called like the model itself.
+
+    Generation requests and the generated chunks travel over a pipe. Tokenizing runs in the calling
+    process on `tokenizer`, a vocab-only copy of the model. The worker keeps the evaluated state of
+    the prompt prefix itself, so the scheduler does not warm it. A worker that exited is started
+    again on the next generation, and a worker that does not stop a generation within `stop_timeout`
+    of its stream being closed is terminated and started again.
+    """
+
+    manages_prefix_state = True
+
+    def __init__(
+        self, model_path: str, model_kwargs: Dict, cores: List[int], prefix: Optional[str] = None,
+        tokenizer=None, model_factory: Callable = load_llama_model, name: str = "inference-process",
+        stop_timeout: float = STOP_TIMEOUT_SECONDS,
+    ):
+        self.model_path = model_path
+        self.model_kwargs = model_kwargs
+        self.cores = cores
+        self.prefix = prefix
+        self.tokenizer = tokenizer
+        self.model_factory = model_factory
+        self.name = name
+        self.stop_timeout = stop_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._connection = None
+        self._ready = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process is not None else None
+
+    def start(self):
+        """Spawn the worker process. Returns right away, `wait_until_ready` waits for the model to load."""
+        self._ready = False
+        self._connection, child_connection = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_run_worker_process,
+            args=(self.model_factory, self.model_path, self.model_kwargs, self.cores, self.prefix, child_connection),
+            name=self.name,
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+
+    def wait_until_ready(self, timeout: Optional[float] = None):
+        kind, payload = self._receive(timeout)
+        if kind != MESSAGE_READY:
+            self.stop()
+            raise InferenceWorkerError(f"{self.name} failed to start: {payload}")
+        self._ready = True
+        logger.info(f"{self.name} loaded the model in process {payload} on cores {self.cores}")
+
+    def stop(self, timeout: Optional[float] = 10):
+        if self._process is None:
+            return
+        try:
+            self._connection.send((MESSAGE_SHUTDOWN,))
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._connection.close()
+        self._process = None
+
+    def __call__(self, prompt: str, max_tokens: int, temperature: float, stream: bool = True) -> Iterator[Dict]:
+        if self._process is None or not self._process.is_alive():
+            logger.warning(f"{self.name} is not running, starting it again")
+            self.stop()
+            self.start()
+        if not self._ready:
+            self.wait_until_ready()
+        self._connection.send((MESSAGE_GENERATE, prompt, max_tokens, temperature))
+        return self._iterate_chunks()
+
+    def tokenize(self, text: bytes) -> List[int]:
+        return self.tokenizer.tokenize(text)
+
+    def _iterate_chunks(self) -> Iterator[Dict]:
+        finished = False
+        try:
+            while True:
+                kind, payload = self._receive()
+                if kind == MESSAGE_CHUNK:
+                    yield payload
+                    continue
+                finished = True
+                if kind == MESSAGE_ERROR:
+                    raise InferenceWorkerError(payload)
+                return
+        finally:
+            if not finished and self._process is not None and self._process.is_alive():
+                self._stop_generation()
+
+    def _stop_generation(self):
+        """Stop the generation of a stream closed early and drop the chunks already sent.
+
+        Runs while the stream is closed, so it never raises: a worker that does not stop in time is
+        terminated and started again.
+        """
+        deadline = time.monotonic() + self.stop_timeout
+        try:
+            self._connection.send((MESSAGE_STOP,))
+            while self._receive(max(0.0, deadline - time.monotonic()))[0] == MESSAGE_CHUNK:
+                pass
+        except (InferenceWorkerError, OSError) as e:
+            logger.warning(f"{self.name} did not stop its generation, restarting it: {e}")
+            self.stop(timeout=0)
+            self.start()
+
+    def _receive(self, timeout: Optional[float] = None):
+        try:
+            if timeout is not None and not self._connection.poll(timeout):
+                raise InferenceWorkerError(f"{self.name} did not answer within {timeout}s")
+            return self._connection.recv()
+        except (EOFError, OSError) as e:
+            raise InferenceWorkerError(f"{self.name} exited") from e
+
+
+class InferenceProcessPool:
+    """Supervises worker processes that each load the model file and run generations on their own cores.
+
+    The model file is memory mapped read-only without mlock, so the page cache holds a single copy
+    of the weights shared by every worker instead of one copy per process. Each worker is pinned to
+    its own slice of cores and runs llama-cpp with as many threads as the slice has cores.
+    """
+
+    def __init__(
+        self, model_path: str, model_kwargs: Dict, process_count: int, threads_per_process: Optional[int] = None,
+        prefix: Optional[str] = None, tokenizer=None, model_factory: Callable = load_llama_model,
+        start_timeout: Optional[float] = None,
+    ):
+        if process_count < 1:
+            raise ValueError("At least one worker process is required")
+        self.start_timeout = start_timeout
+        self.processes = [
+            InferenceProcess(
+                model_path,
+                {**model_kwargs, "use_mmap": True, "use_mlock": False, "n_threads": len(cores)},
+                cores,
+                prefix=prefix,
+                tokenizer=tokenizer,
+                model_factory=model_factory,
+                name=f"inference-process-{index}",
+            )
+            for index, cores in enumerate(get_core_slices(process_count, threads_per_process))
+        ]
+
+    def start(self, report_step: Optional[Callable[[str], None]] = None):
+        """Start every worker process and wait until all of them loaded the model."""
+        for process in self.processes:
+            process.start()
+        try:
+            for index, process in enumerate(self.processes, start=1):
+                if report_step is not None:
+                    report_step(f"waiting for inference process {index} of {len(self.processes)}")
+                process.wait_until_ready(self.start_timeout)
+        except InferenceWorkerError:
+            self.stop()
+            raise
+
+    def stop(self):
+        for process in self.processes:
+            process.stop()
@@ -0,0 +1,93 @@
+import json
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+STREAM_FORMAT_SSE = "sse"
+STREAM_FORMAT_NDJSON = "ndjson"
+FINISH_REASON_CANCELLED = "cancelled"
+STREAM_MEDIA_TYPES = {
+    STREAM_FORMAT_SSE: "text/event-stream",
+    STREAM_FORMAT_NDJSON: "application/x-ndjson",
+}
+
+
+def stream_completion(
+    model,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Iterator[Dict]:
+    """Generate a completion token by token and yield stream events.
+
+    Yields one `token` event per generated chunk (the first one carries the
+    time-to-first-token) followed by a single `done` event with usage stats.
+    `should_stop` is checked before every token, generation is aborted as soon
+    as it returns True and the `done` event reports a `cancelled` finish reason.
+    """
+    started_at = time.perf_counter()
+    time_to_first_token_ms = None
+    completion_tokens = 0
+    finish_reason = None
+
+    chunks = model(prompt, max_tokens=max_tokens, temperature=temperature, stream=True)
+    for chunk in chunks:
+        if should_stop is not None and should_stop():
+            # closing the llama-cpp generator stops token generation right away
+            chunks.close()
+            finish_reason = FINISH_REASON_CANCELLED
+            break
+
+        choice = chunk["choices"][0]
+        finish_reason = choice.get("finish_reason") or finish_reason
+        text = choice["text"]
+        if not text:
+            continue
+
+        completion_tokens += 1
+        event = {"type": "token", "text": text}
+        if time_to_first_token_ms is None:
+            time_to_first_token_ms = _elapsed_ms(started_at)
+            event["time_to_first_token_ms"] = time_to_first_token_ms
+        yield event
+
+    prompt_tokens = len(model.tokenize(prompt.encode("utf-8")))
+    yield {
+        "type": "done",
+        "finish_reason": finish_reason,
+        "time_to_first_token_ms": time_to_first_token_ms,
+        "total_time_ms": _elapsed_ms(started_at),
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def collect_completion(events: Iterator[Dict]) -> Dict:
+    """Assemble stream events into the shape of a non-streaming llama-cpp completion."""
+    text = []
+    for event in events:
+        if event["type"] == "token":
+            text.append(event["text"])
+        elif event["type"] == "done":
+            return {
+                "choices": [{"text": "".join(text), "index": 0, "finish_reason": event["finish_reason"]}],
+                "usage": event["usage"],
+                "time_to_first_token_ms": event["time_to_first_token_ms"],
+                "total_time_ms": event["total_time_ms"],
+            }
+    raise ValueError("Completion stream ended without a done event")
+
+
+def format_event(event: Dict, stream_format: str) -> str:
+    """Serialize a stream event as a Server-Sent Event or a line of NDJSON."""
+    payload = json.dumps(event)
+    if stream_format == STREAM_FORMAT_SSE:
+        return f"event: {event['type']}\ndata: {payload}\n\n"
+    return f"{payload}\n"
+
+
+def _elapsed_ms(started_at: float) -> float:
+    return round((time.perf_counter() - started_at) * 1000, 2)
@@ -1,31 +1,184 @@
+import asyncio
+import hmac
+import os
+import time
 from contextlib import asynccontextmanager
+from dataclasses import replace
+from urllib.parse import urlparse
 import structlog as logging
-from fastapi import FastAPI, HTTPException, status, Depends
-from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException, Request, status, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
 
-from src.config import get_config_for_model_download
-from src.dependencies import get_document_sourcer, get_prompt_builder, get_retriever_on_app_start
+from src.config import get_config_for_inference_scheduler, get_config_for_model_download, \
+    get_config_for_model_registry, get_model_download_configuration
+from src.dependencies import build_prompt_builder, get_document_ingestion_service_on_app_start, \
+    get_document_sourcer, get_prompt_builder, get_response_cache_on_app_start, get_retrieval_service_on_app_start, \
+    get_retriever_on_app_start
 from dotenv import load_dotenv
 
-from src.prompt.prompt_builder import PromptBuilder
+from src.document.document_ingestion import DocumentTooLargeError, IngestionQueueFullError, InvalidDocumentIdError, \
+    ReadOnlyCorpusError
+from src.inference.disconnect import HTTP_499_CLIENT_CLOSED_REQUEST, ClientDisconnectedError, cancel_on_disconnect
+from src.inference.inference_scheduler import DEFAULT_PRIORITY, DeadlineExceededError, InferenceScheduler, \
+    QueueFullError
+from src.inference.process_pool import InferenceProcessPool
+from src.inference.streaming import FINISH_REASON_CANCELLED, STREAM_FORMAT_NDJSON, STREAM_FORMAT_SSE, \
+    STREAM_MEDIA_TYPES, format_event
+from src.model.model_registry import InvalidModelConfigurationError, ModelDownloadingError, \
+    ModelMemoryBudgetError, ModelRegistry, UnknownModelError
+from src.model.prefix_state_cache import PrefixStateCache
+from src.prompt.prompt_builder import STATIC_PROMPT_PREFIX, PromptBuilder
+from src.startup.component_loader import STATUS_FAILED, ComponentLoader
 
 logger = logging.get_logger(__name__)
 
 load_dotenv()
 
+# batch jobs yield to interactive requests in the inference queue
+BATCH_PRIORITY = DEFAULT_PRIORITY - 1
+# the batch queries each worker has queued or generating, one waiting while the other generates keeps it busy
+BATCH_JOBS_PER_WORKER = 2
+MAX_BATCH_QUERIES = 10000
+# the number of batch queries whose context is retrieved with one embedding call and one Chroma query
+BATCH_RETRIEVAL_SIZE = 32
+# the context sizes a model registered through the API may ask for
+MIN_REGISTERED_N_CTX = 128
+MAX_REGISTERED_N_CTX = 4096
+COMPONENT_MODEL = "model"
+COMPONENT_DOCUMENTS = "documents"
+# the app state each component sets last, a request needing a component is answered with 425 until it is set
+COMPONENT_STATES = {COMPONENT_MODEL: "MODEL", COMPONENT_DOCUMENTS: "INGESTION"}
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Load model and vector db on startup and close on shutdown."""
-    # download the model specified in the configurations and save it to the app state
+    """Load model and vector db concurrently in the background on startup and close on shutdown.
+
+    The app accepts connections while the components load, reporting their progress on /health/ready.
+    """
+    for state in ("MODEL", "SCHEDULER", "WORKER_POOL", "REGISTRY", "DB", "RETRIEVAL", "CORPUS_VERSION", "RESPONSE_CACHE", "INGESTION"):
+        setattr(app.state, state, None)
+    app.state.LOADER = ComponentLoader()
+    app.state.LOADER.start(COMPONENT_MODEL, load_model)
+    app.state.LOADER.start(COMPONENT_DOCUMENTS, load_documents)
+    yield
+
+    if app.state.INGESTION is not None:
+        app.state.INGESTION.stop()
+    if app.state.SCHEDULER is not None:
+        app.state.SCHEDULER.stop()
+    if app.state.WORKER_POOL is not None:
+        app.state.WORKER_POOL.stop()
+
+
+def load_model(report_step: Callable[[str], None]):
+    """Download the model specified in the configurations and start the inference scheduler on it.
+
+    The models of the registry are downloaded in the background and only loaded once a request selects them.
+    """
     model_config = get_config_for_model_download()
+    scheduler_config = get_config_for_inference_scheduler()
+    registry_config = get_config_for_model_registry()
     retriever = get_retriever_on_app_start()
-    app.state.MODEL = retriever.get_model(model_config)
 
-    # create a vector db with documents and save it to the app state
+    model_file = retriever.install_model(model_config)
+    prefix_cache = PrefixStateCache(STATIC_PROMPT_PREFIX) if scheduler_config.prefix_cache_enabled else None
+    # requests count prompt tokens on a copy of the vocabulary, a model a worker generates on is not thread-safe
+    report_step("loading the model vocabulary")
+    app_model = retriever.get_model(
+        replace(model_config, model_kwargs={**model_config.model_kwargs, "vocab_only": True})
+    )
+    if scheduler_config.worker_processes > 0:
+        # the worker processes share one mapping of the model file
+        pool = InferenceProcessPool(
+            model_file,
+            model_config.model_kwargs,
+            scheduler_config.worker_processes,
+            threads_per_process=scheduler_config.threads_per_process,
+            prefix=STATIC_PROMPT_PREFIX if prefix_cache is not None else None,
+            tokenizer=app_model,
+        )
+        app.state.WORKER_POOL = pool
+        pool.start(report_step)
+        models, model_copies = pool.processes, 1
+    else:
+        # every scheduler worker owns its own model instance
+        models = []
+        for instance in range(1, scheduler_config.concurrency + 1):
+            report_step(f"loading model instance {instance} of {scheduler_config.concurrency}")
+            models.append(retriever.get_model(model_config))
+        model_copies = len(models)
+
+    report_step("starting the inference scheduler")
+    registry = ModelRegistry(
+        retriever,
+        memory_budget_bytes=registry_config.memory_budget_bytes,
+        on_unload=prefix_cache.forget if prefix_cache is not None else None,
+    )
+    # the workers' copies of the default model stay loaded and count against the memory budget
+    registry.pin(model_config.model_name, os.path.getsize(model_file) * model_copies)
+    for name, config in registry_config.models.items():
+        registry.register(name, config)
+
+    scheduler = InferenceScheduler(
+        models,
+        max_queue_size=scheduler_config.max_queue_size,
+        max_batch_size=scheduler_config.max_batch_size,
+        default_timeout=scheduler_config.queue_timeout_seconds,
+        prefix_cache=prefix_cache,
+        model_registry=registry,
+    )
+    scheduler.start()
+    app.state.SCHEDULER = scheduler
+    app.state.REGISTRY = registry
+    app.state.MODEL = app_model
+
+
+def load_documents(report_step: Callable[[str], None]):
+    """Create a vector db with documents and the services reading and updating it."""
+    report_step("indexing documents")
     document_sourcer = get_document_sourcer()
-    app.state.DB = document_sourcer.get_preloaded_vector_database()
-    yield
+    db = document_sourcer.get_preloaded_vector_database()
+
+    report_step("starting retrieval and the response cache")
+    retrieval = get_retrieval_service_on_app_start(db, document_sourcer.lexical_index)
+    # cache responses to repeated queries, keyed on the corpus version so document changes invalidate them
+    corpus_version = document_sourcer.get_corpus_version()
+    response_cache = get_response_cache_on_app_start(
+        db, corpus_version, query_embedding_cache=retrieval.query_embedding_cache
+    )
+    app.state.DB = db
+    app.state.RETRIEVAL = retrieval
+    app.state.CORPUS_VERSION = corpus_version
+    app.state.RESPONSE_CACHE = response_cache
+
+    # index uploaded and deleted documents in the background while the app keeps serving
+    ingestion = get_document_ingestion_service_on_app_start(
+        document_sourcer, db, on_corpus_changed=set_corpus_version
+    )
+    ingestion.start()
+    app.state.INGESTION = ingestion
+
+
+def ensure_loaded(*components: str):
+    """Answer with 425 while a component the request needs is loading, and with 503 if it failed to load."""
+    loader = getattr(app.state, "LOADER", None)
+    for component in components:
+        if getattr(app.state, COMPONENT_STATES[component], None) is not None:
+            continue
+        if loader is not None and loader.get_status(component) == STATUS_FAILED:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=f"{component.capitalize()} failed to load")
+        raise HTTPException(status_code=status.HTTP_425_TOO_EARLY, detail=f"{component.capitalize()} not loaded")
+
+
+def set_corpus_version(corpus_version: str):
+    """Point the response cache at the new corpus version after a document change."""
+    app.state.CORPUS_VERSION = corpus_version
+    app.state.RESPONSE_CACHE.set_corpus_version(corpus_version)
 
 
 # create a FastAPI instance to start up the app
@@ -34,45 +187,504 @@ app = FastAPI(lifespan=lifespan)
 
 class UserQuery(BaseModel):
     query: str
+    priority: int = DEFAULT_PRIORITY
+    timeout_seconds: Optional[float] = None
+    model: Optional[str] = None
+
+
+class BatchUserQuery(BaseModel):
+    queries: List[str]
+    priority: int = BATCH_PRIORITY
+    timeout_seconds: Optional[float] = None
+    model: Optional[str] = None
+
+
+class ModelRegistration(BaseModel):
+    download_link: str
+    folder_name: Optional[str] = None
+    quantization_model: Optional[str] = None
+    # the only model parameter a registration may set, the others keep their llama-cpp defaults
+    n_ctx: Optional[int] = Field(None, ge=MIN_REGISTERED_N_CTX, le=MAX_REGISTERED_N_CTX)
+
+
+class DocumentUpload(BaseModel):
+    document_id: str
+    content: str
+
+
+async def get_cached_response(query: str) -> Optional[str]:
+    """Look the query up in the exact-match cache, then among answers to similar queries."""
+    try:
+        cached_response = app.state.RESPONSE_CACHE.get_exact(query)
+        if cached_response is None:
+            # the semantic lookup embeds the query, keep it off the event loop
+            cached_response = await run_in_threadpool(app.state.RESPONSE_CACHE.get_similar, query)
+        return cached_response
+    except Exception as e:
+        logger.warning(f"Error reading the response cache: {e}")
+        return None
+
+
+async def cache_response(query: str, response: str, corpus_version: str):
+    """Store a generated answer. A failure to cache never fails the request.
+
+    `corpus_version` is the version captured before the answer's context was retrieved.
+    """
+    try:
+        await run_in_threadpool(app.state.RESPONSE_CACHE.store, query, response, corpus_version)
+    except Exception as e:
+        logger.warning(f"Error writing the response cache: {e}")
+
+
+def get_scheduling_priority(requested: int, ceiling: int = DEFAULT_PRIORITY) -> int:
+    """Clamp a client's priority to its endpoint's ceiling, clients may lower their priority but never raise it."""
+    return min(requested, ceiling)
+
+
+def resolve_model(name: Optional[str]) -> Optional[str]:
+    """Return the registry model a request selects, None for the default model. Unknown models are answered with 404."""
+    if name is None or name == get_config_for_model_download().model_name:
+        return None
+    if not app.state.REGISTRY.has_model(name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown model: {name}")
+    return name
+
+
+def get_prompt_builder_for_model(model: Optional[str], prompt_builder: PromptBuilder) -> PromptBuilder:
+    """Return a prompt builder packing context into the context window of the selected registry model.
+
+    The default model's `prompt_builder` is returned for the default model. A registry model that is
+    still downloading is answered with 503.
+    """
+    if model is None:
+        return prompt_builder
+    try:
+        tokenizer, model_config = app.state.REGISTRY.get_tokenizer(model)
+    except (UnknownModelError, ModelDownloadingError) as e:
+        raise get_http_exception_for_rejected_job(e) from e
+    # generations of every model are capped at the default model's max tokens
+    max_tokens = get_config_for_model_download().max_tokens
+    return build_prompt_builder(prompt_builder.retrieval_service, tokenizer, model_config, max_tokens)
+
+
+def get_http_exception_for_rejected_job(error: Exception) -> Optional[HTTPException]:
+    """Map scheduler admission errors to a response telling the client to back off."""
+    if isinstance(error, QueueFullError):
+        retry_after = app.state.SCHEDULER.get_retry_after_seconds()
+        return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Inference queue is full",
+                             headers={"Retry-After": str(retry_after)})
+    if isinstance(error, DeadlineExceededError):
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                             detail="Request deadline passed before inference started")
+    if isinstance(error, UnknownModelError):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error))
+    if isinstance(error, (ModelMemoryBudgetError, ModelDownloadingError)):
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(error))
+    return None
+
+
+async def complete_when_queue_has_room(
+    prompt: str, priority: int, timeout: float, model: Optional[str] = None,
+) -> Dict:
+    """Queue a generation, waiting for room in the queue instead of failing when it is full.
+
+    `timeout` bounds the waiting for room and in the queue together, in place of the scheduler's
+    `default_timeout` for interactive requests. Once it passed the `QueueFullError` is raised.
+    """
+    config = get_config_for_model_download()
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            return await app.state.SCHEDULER.complete(
+                prompt, max_tokens=config.max_tokens, temperature=config.temperature, priority=priority,
+                timeout=remaining, model=model,
+            )
+        except QueueFullError:
+            retry_after = app.state.SCHEDULER.get_retry_after_seconds()
+            if time.monotonic() + retry_after > deadline:
+                raise
+            await asyncio.sleep(retry_after)
+
+
+async def iterate_batch_results(
+    batch: BatchUserQuery, prompt_builder: PromptBuilder, model: Optional[str] = None,
+) -> AsyncIterator[Dict]:
+    """Answer a batch of queries and yield one result per query, in completion order.
+
+    Context is retrieved for groups of queries at once. Generations are queued through the scheduler,
+    at most `BATCH_JOBS_PER_WORKER` per worker at a time, so a batch neither fills the queue ahead of
+    interactive requests nor has its queries wait out their deadline in it.
+    The response cache only holds answers of the default model, so it is bypassed for other models.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    in_flight = asyncio.Semaphore(app.state.SCHEDULER.concurrency * BATCH_JOBS_PER_WORKER)
+    timeout = batch.timeout_seconds
+    if timeout is None:
+        timeout = get_config_for_inference_scheduler().batch_timeout_seconds
+    tasks = []
+    yielded = 0
+
+    async def generate(index: int, query: str, prompt: str, corpus_version: str):
+        try:
+            async with in_flight:
+                completion = await complete_when_queue_has_room(
+                    prompt, get_scheduling_priority(batch.priority, BATCH_PRIORITY), timeout, model
+                )
+            response = "".join([choice["text"] for choice in completion["choices"]]).strip()
+            if model is None and completion["choices"][0]["finish_reason"] != FINISH_REASON_CANCELLED:
+                await cache_response(query, response, corpus_version)
+            results.put_nowait({"index": index, "query": query, "response": response})
+        except Exception as e:
+            logger.error(f"Error generating response for batch query {index}: {e}")
+            rejection = get_http_exception_for_rejected_job(e)
+            detail = rejection.detail if rejection is not None else "Error generating response"
+            results.put_nowait({"index": index, "query": query, "error": detail})
+
+    try:
+        for start in range(0, len(batch.queries), BATCH_RETRIEVAL_SIZE):
+            pending = []
+            for index, query in enumerate(batch.queries[start:start + BATCH_RETRIEVAL_SIZE], start=start):
+                if not query:
+                    results.put_nowait({"index": index, "query": query, "error": "Prompt cannot be empty"})
+                    continue
+                try:
+                    cached_response = app.state.RESPONSE_CACHE.get_exact(query) if model is None else None
+                except Exception as e:
+                    logger.warning(f"Error reading the response cache: {e}")
+                    cached_response = None
+                if cached_response is not None:
+                    results.put_nowait({"index": index, "query": query, "response": cached_response})
+                else:
+                    pending.append((index, query))
+
+            if pending:
+                # captured before retrieval, answers built on context of a replaced corpus are not cached
+                corpus_version = app.state.CORPUS_VERSION
+                try:
+                    prompts = await run_in_threadpool(prompt_builder.get_complete_prompts, [q for _, q in pending])
+                except Exception as e:
+                    logger.error(f"Error building prompts for batch queries {start} onwards: {e}")
+                    for index, query in pending:
+                        results.put_nowait({"index": index, "query": query, "error": "Error generating response"})
+                    continue
+                for (index, query), prompt in zip(pending, prompts):
+                    tasks.append(asyncio.create_task(generate(index, query, prompt, corpus_version)))
+
+            # hand out the results that are ready while the remaining context is retrieved
+            while not results.empty():
+                yielded += 1
+                yield results.get_nowait()
+
+        while yielded < len(batch.queries):
+            yielded += 1
+            yield await results.get()
+    finally:
+        # the consumer stopped early, e.g. the client disconnected, so stop the remaining generations
+        for task in tasks:
+            task.cancel()
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Only let requests carrying the MODEL_ADMIN_TOKEN bearer token through, and none if it is unset.
+
+    Guards the endpoints changing the models and the documents at runtime.
+    """
+    admin_token = get_config_for_model_registry().admin_token
+    if admin_token is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Changing models and documents at runtime is disabled")
+    expected = f"Bearer {admin_token}".encode("utf-8")
+    if authorization is None or not hmac.compare_digest(authorization.encode("utf-8"), expected):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+def submit_ingestion_job(submit, *args):
+    """Queue a document change and map rejected submissions to client errors."""
+    try:
+        return submit(*args).to_dict()
+    except InvalidDocumentIdError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)) from e
+    except IngestionQueueFullError as e:
+        logger.warning(f"Rejected document change: {e}")
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e)) from e
+    except ReadOnlyCorpusError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e)) from e
 
 
 # create a POST endpoint for model inference
 @app.post("/api/v1/inference")
-def inference(user_query: UserQuery, prompt_builder: PromptBuilder = Depends(get_prompt_builder)
-              ):
+async def inference(user_query: UserQuery, request: Request,
+                    prompt_builder: PromptBuilder = Depends(get_prompt_builder)):
     """Generate response for user query."""
-    #  retrieve the model from app state
-    model = app.state.MODEL
-
-    # if a request is received before the model loading is complete
-    if model is None:
-        raise HTTPException(status_code=status.HTTP_425_TOO_EARLY, detail="Model not loaded")
+    # if a request is received before the model and documents loading is complete
+    ensure_loaded(COMPONENT_MODEL, COMPONENT_DOCUMENTS)
 
     # if a request is received without a query
     query = user_query.query
     if not query:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prompt cannot be empty")
+    model = resolve_model(user_query.model)
+    prompt_builder = get_prompt_builder_for_model(model, prompt_builder)
+    # captured before retrieval, answers built on context of a replaced corpus are not cached
+    corpus_version = app.state.CORPUS_VERSION
 
     try:
+        # answer repeated and paraphrased queries straight from the response cache, which holds default model answers
+        cached_response = await get_cached_response(query) if model is None else None
+        if cached_response is not None:
+            logger.info("Serving response from the response cache")
+            return cached_response
+
         #  get a prompt for the model using the user query and document database
-        chroma_client = app.state.DB
-        engineered_prompt = prompt_builder.get_complete_prompt(query, chroma_client)
+        engineered_prompt = await run_in_threadpool(prompt_builder.get_complete_prompt, query)
 
-        #  send the prompt to the model
+        #  queue the prompt on the scheduler that owns the model and wait for the completion,
+        #  the generation is cancelled if the client disconnects while waiting
         config = get_config_for_model_download()
-        responses = model(
+        completion = await cancel_on_disconnect(request, app.state.SCHEDULER.complete(
             engineered_prompt,
             max_tokens=config.max_tokens,
             temperature=config.temperature,
-        )["choices"]
+            priority=get_scheduling_priority(user_query.priority),
+            timeout=user_query.timeout_seconds,
+            model=model,
+        ))
+        responses = completion["choices"]
 
         # format the model response
         concatenated_response = "".join([response["text"] for response in responses])
         logger.info(f"Generated response: {concatenated_response}")
+        response = concatenated_response.strip()
+
+        if model is None and responses[0]["finish_reason"] != FINISH_REASON_CANCELLED:
+            await cache_response(query, response, corpus_version)
 
         # return the response to the user
-        return concatenated_response.strip()
+        return response
+
+    except ClientDisconnectedError as e:
+        logger.info(f"Cancelled inference request: {e}")
+        raise HTTPException(status_code=HTTP_499_CLIENT_CLOSED_REQUEST, detail="Client closed request") from e
 
     except Exception as e:
+        rejection = get_http_exception_for_rejected_job(e)
+        if rejection is not None:
+            logger.warning(f"Rejected inference request: {e}")
+            raise rejection from e
         logger.error(f"Error generating response: {e}")
         raise HTTPException(status_code=500, detail="Error generating response") from e
+
+
+# create a POST endpoint that streams the model response token by token
+@app.post("/api/v1/inference/stream")
+async def inference_stream(user_query: UserQuery, stream_format: str = STREAM_FORMAT_SSE,
+                           prompt_builder: PromptBuilder = Depends(get_prompt_builder)):
+    """Stream the response for a user query as Server-Sent Events or newline-delimited JSON."""
+    ensure_loaded(COMPONENT_MODEL, COMPONENT_DOCUMENTS)
+
+    query = user_query.query
+    if not query:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prompt cannot be empty")
+
+    if stream_format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Stream format must be one of {list(STREAM_MEDIA_TYPES)}")
+    model = resolve_model(user_query.model)
+    prompt_builder = get_prompt_builder_for_model(model, prompt_builder)
+    corpus_version = app.state.CORPUS_VERSION
+
+    try:
+        # replay cached responses as a single token followed by the done event
+        cached_response = await get_cached_response(query) if model is None else None
+        if cached_response is not None:
+            logger.info("Serving streamed response from the response cache")
+            cached_events = [
+                {"type": "token", "text": cached_response, "time_to_first_token_ms": 0.0},
+                {"type": "done", "finish_reason": "stop", "cached": True},
+            ]
+            return StreamingResponse((format_event(event, stream_format) for event in cached_events),
+                                     media_type=STREAM_MEDIA_TYPES[stream_format])
+
+        # build the prompt before the response starts so failures surface as a regular error status
+        engineered_prompt = await run_in_threadpool(prompt_builder.get_complete_prompt, query)
+    except Exception as e:
+        logger.error(f"Error building prompt: {e}")
+        raise HTTPException(status_code=500, detail="Error generating response") from e
+
+    config = get_config_for_model_download()
+    try:
+        events = app.state.SCHEDULER.stream(
+            engineered_prompt, config.max_tokens, config.temperature, get_scheduling_priority(user_query.priority),
+            user_query.timeout_seconds, model=model,
+        )
+    except (QueueFullError, UnknownModelError) as e:
+        logger.warning(f"Rejected inference request: {e}")
+        raise get_http_exception_for_rejected_job(e) from e
+
+    # starlette stops iterating when the client disconnects, which cancels the generation
+    async def event_stream():
+        streamed_text = []
+        try:
+            async for event in events:
+                if event["type"] == "token":
+                    streamed_text.append(event["text"])
+                if event["type"] == "done":
+                    logger.info(f"Streamed response stats: {event}")
+                    if model is None and event["finish_reason"] != FINISH_REASON_CANCELLED:
+                        await cache_response(query, "".join(streamed_text).strip(), corpus_version)
+                yield format_event(event, stream_format)
+        except Exception as e:
+            # the status code has already been sent, so report the failure in-band
+            logger.error(f"Error streaming response: {e}")
+            yield format_event({"type": "error", "detail": "Error generating response"}, stream_format)
+
+    return StreamingResponse(event_stream(), media_type=STREAM_MEDIA_TYPES[stream_format])
+
+
+# create a GET endpoint reporting queue depth and wait times for load balancers
+@app.get("/api/v1/inference/queue")
+def inference_queue():
+    """Report inference queue stats. Responds with 503 while the queue is full."""
+    ensure_loaded(COMPONENT_MODEL)
+    stats = app.state.SCHEDULER.get_stats()
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE if app.state.SCHEDULER.is_saturated else status.HTTP_200_OK
+    return JSONResponse(content=stats, status_code=status_code)
+
+
+# create a GET endpoint reporting response cache effectiveness
+@app.get("/api/v1/cache")
+def response_cache_stats():
+    """Report response cache size and hit/miss counters for each cache layer and for query embeddings."""
+    ensure_loaded(COMPONENT_DOCUMENTS)
+    return {**app.state.RESPONSE_CACHE.get_stats(), **app.state.RETRIEVAL.get_stats()}
+
+
+# create a POST endpoint that queues a document to be indexed without restarting the app
+@app.post("/api/v1/documents", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+def upload_document(document: DocumentUpload):
+    """Queue a document to be added to, or replaced in, the vector db. Returns the ingestion job."""
+    ensure_loaded(COMPONENT_DOCUMENTS)
+    if not document.content.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Document content cannot be empty")
+    return submit_ingestion_job(app.state.INGESTION.submit_document, document.document_id, document.content)
+
+
+# create a DELETE endpoint that queues a document to be removed from the vector db
+@app.delete("/api/v1/documents/{document_id:path}", status_code=status.HTTP_202_ACCEPTED,
+            dependencies=[Depends(require_admin)])
+def delete_document(document_id: str):
+    """Queue a document to be removed from the vector db. Returns the ingestion job."""
+    ensure_loaded(COMPONENT_DOCUMENTS)
+    return submit_ingestion_job(app.state.INGESTION.delete_document, document_id)
+
+
+# create a GET endpoint reporting the progress of a document upload or deletion
+@app.get("/api/v1/documents/jobs/{job_id}")
+def document_ingestion_job(job_id: str):
+    """Report the status of an ingestion job."""
+    ensure_loaded(COMPONENT_DOCUMENTS)
+    job = app.state.INGESTION.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingestion job not found")
+    return job.to_dict()
+
+
+# create a POST endpoint answering many queries in one request, for offline jobs
+@app.post("/api/v1/inference/batch")
+async def inference_batch(batch: BatchUserQuery, request: Request, stream_format: Optional[str] = None,
+                          prompt_builder: PromptBuilder = Depends(get_prompt_builder)):
+    """Generate responses for a batch of queries.
+
+    Returns every result at once in query order, or streams them as newline-delimited JSON in
+    completion order with `stream_format=ndjson`. Each result carries its query's index and either
+    a `response` or an `error`.
+    """
+    ensure_loaded(COMPONENT_MODEL, COMPONENT_DOCUMENTS)
+
+    if not batch.queries or len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"A batch must have between 1 and {MAX_BATCH_QUERIES} queries")
+
+    if stream_format not in (None, STREAM_FORMAT_NDJSON):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Batch stream format must be {STREAM_FORMAT_NDJSON}")
+
+    model = resolve_model(batch.model)
+    results = iterate_batch_results(batch, get_prompt_builder_for_model(model, prompt_builder), model)
+    if stream_format == STREAM_FORMAT_NDJSON:
+        # starlette stops iterating when the client disconnects, which cancels the remaining generations
+        return StreamingResponse((format_event(result, STREAM_FORMAT_NDJSON) async for result in results),
+                                 media_type=STREAM_MEDIA_TYPES[STREAM_FORMAT_NDJSON])
+
+    async def collect_results() -> List[Dict]:
+        try:
+            return sorted([result async for result in results], key=lambda result: result["index"])
+        finally:
+            await results.aclose()
+
+    try:
+        return {"results": await cancel_on_disconnect(request, collect_results())}
+    except ClientDisconnectedError as e:
+        logger.info(f"Cancelled batch inference request: {e}")
+        raise HTTPException(status_code=HTTP_499_CLIENT_CLOSED_REQUEST, detail="Client closed request") from e
+
+
+# create a GET endpoint reporting the models requests can select and the memory they take
+@app.get("/api/v1/models")
+def list_models():
+    """Report the registered models, which of them are loaded and the memory budget they share."""
+    ensure_loaded(COMPONENT_MODEL)
+    return {"default_model": get_config_for_model_download().model_name, **app.state.REGISTRY.get_stats()}
+
+
+# create a PUT endpoint that registers a model, or swaps the model registered under a name, without a restart
+@app.put("/api/v1/models/{name:path}", dependencies=[Depends(require_admin)])
+def register_model(name: str, registration: ModelRegistration):
+    """Register a model under `name`. It is downloaded in the background and loaded when a request first selects it."""
+    ensure_loaded(COMPONENT_MODEL)
+    if name == get_config_for_model_download().model_name:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The default model cannot be replaced")
+
+    allowed_hosts = get_config_for_model_registry().allowed_download_hosts
+    download_link = urlparse(registration.download_link)
+    if download_link.scheme != "https" or download_link.hostname not in allowed_hosts:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Models can only be downloaded over https from {allowed_hosts}")
+
+    entry = {"model_name": name, "download_link": registration.download_link,
+             "model_kwargs": {"n_ctx": registration.n_ctx} if registration.n_ctx is not None else {}}
+    for field_name in ("folder_name", "quantization_model"):
+        if getattr(registration, field_name) is not None:
+            entry[field_name] = getattr(registration, field_name)
+    try:
+        app.state.REGISTRY.register(name, get_model_download_configuration(entry))
+    except InvalidModelConfigurationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    return app.state.REGISTRY.get_stats()["models"][name]
+
+
+# create a GET endpoint for liveness probes
+@app.get("/health/live")
+def health_live():
+    """Report that the app is up. Responds with 503 once a component failed to load, so the app is restarted."""
+    loader = getattr(app.state, "LOADER", None)
+    if loader is not None and loader.has_failed:
+        return JSONResponse(content={"status": "failed", "components": loader.get_stats()},
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "alive"}
+
+
+# create a GET endpoint for readiness probes reporting the load progress of each component
+@app.get("/health/ready")
+def health_ready():
+    """Report the load progress of the model and the documents. Responds with 503 until both are loaded."""
+    loader = getattr(app.state, "LOADER", None)
+    components = loader.get_stats() if loader is not None else {}
+    ready = loader is not None and loader.is_ready
+    readiness = "ready" if ready else "failed" if loader is not None and loader.has_failed else "loading"
+    return JSONResponse(content={"status": readiness, "components": components},
+                        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,72 @@
+import fcntl
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Optional
+
+import structlog as logging
+
+logger = logging.get_logger(__name__)
+
+LOCK_POLL_INTERVAL = 1.0
+
+
+class FileLock:
+    """An exclusive lock shared between processes through a lock file, used as a context manager.
+
+    The lock is an advisory `flock` on the file, which the kernel releases when the holder closes the
+    file or exits for any reason, so a crashed or killed holder never leaves a stale lock behind. The
+    lock file itself is left in place and only records the current holder for the processes waiting.
+    """
+
+    def __init__(self, path: str, timeout: Optional[float] = None, poll_interval: float = LOCK_POLL_INTERVAL):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._file = None
+
+    def acquire(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = open(self.path, "a+")
+        started_at = time.monotonic()
+        logged_holder = False
+        try:
+            while True:
+                try:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if not logged_holder:
+                        logger.info(f"Waiting for lock {self.path} held by {self._read_holder(file)}")
+                        logged_holder = True
+                    if self.timeout is not None and time.monotonic() - started_at >= self.timeout:
+                        raise TimeoutError(f"Timed out after {self.timeout}s waiting for lock {self.path}")
+                    time.sleep(self.poll_interval)
+        except BaseException:
+            file.close()
+            raise
+
+        file.seek(0)
+        file.truncate()
+        file.write(f"{socket.gethostname()} {os.getpid()} {time.time()}\n")
+        file.flush()
+        self._file = file
+
+    def release(self):
+        if self._file is None:
+            return
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def _read_holder(self, file) -> str:
+        file.seek(0)
+        return file.read().strip() or "another process"
@@ -7,23 +7,117 @@ Copied from https://github.com/oobabooga/text-generation-webui/blob/main/downloa
 """
 
 
+import asyncio
 import base64
 import datetime
 import hashlib
 import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
+import httpx
 import requests
+import structlog as logging
 import tqdm
 from requests.adapters import HTTPAdapter
-from tqdm.contrib.concurrent import thread_map
+
+logger = logging.get_logger(__name__)
+
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024  # 1MB
+# files are not split into segments smaller than this, the overhead of another request is not worth it
+MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+# how many segments per connection a segmented download may run ahead of the first unfinished one
+SEGMENT_READ_AHEAD = 2
+SEGMENT_MANIFEST_SUFFIX = ".segments.json"
+# the sha256 of a downloaded file is recorded next to it, in the format of sha256sum
+DIGEST_SUFFIX = ".sha256"
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+# the classification of a repository file is its first matching pattern, files matching none are not downloaded
+FILE_CLASSIFIERS = (
+    ("text", re.compile(r"(tokenizer|ice).*\.model|.*\.(txt|json|py|md)")),
+    ("safetensors", re.compile(r".*\.safetensors")),
+    ("pytorch", re.compile(r"(pytorch|adapter)_model.*\.bin")),
+    ("pt", re.compile(r".*\.pt")),
+    ("ggml", re.compile(r".*ggml.*\.bin")),
+)
+
+
+class _ContiguousHasher:
+    """Hashes a file written out of order, as its bytes become contiguous from the start.
+
+    Runs on its own thread next to the download and reads bytes back right after they were written,
+    while they are still in the page cache, so the digest is ready without a second pass over the file.
+    """
+
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_RDONLY)
+        self._hash = hashlib.sha256()
+        self._position = 0
+        self._frontier = 0
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="download-hasher", daemon=True)
+        self._thread.start()
+
+    def advance(self, frontier):
+        """Report that every byte before `frontier` has been written."""
+        with self._condition:
+            if frontier > self._frontier:
+                self._frontier = frontier
+                self._condition.notify()
+
+    def finish(self):
+        """Hash the remaining contiguous bytes and return the hex digest."""
+        self.close()
+        if self._error is not None:
+            raise self._error
+        return self._hash.hexdigest()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        os.close(self._fd)
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    while self._position >= self._frontier and not self._closed:
+                        self._condition.wait()
+                    frontier = self._frontier
+                    if self._position >= frontier:
+                        return
+                while self._position < frontier:
+                    data = os.pread(self._fd, min(DOWNLOAD_BLOCK_SIZE, frontier - self._position), self._position)
+                    if not data:
+                        raise IOError(f"File ends at byte {self._position}, before byte {frontier}")
+                    self._hash.update(data)
+                    self._position += len(data)
+        except Exception as e:
+            self._error = e
+
+
+def classify_file_name(fname):
+    """Classifies a repository file by its name, None for files that are not part of a model."""
+    for classification, pattern in FILE_CLASSIFIERS:
+        if pattern.match(fname):
+            return classification
+    return None
 
 
 class HuggingFaceDownloader:
     """Downloads models from Hugging Face to src/models/. Copied from https://github.com/oobabooga/text-generation-webui/blob/main/download-model.py."""
 
-    def __init__(self, max_retries=5):
+    def __init__(self, max_retries=5, min_segment_size=MIN_SEGMENT_SIZE):
+        self.max_retries = max_retries
+        self.min_segment_size = min_segment_size
         self.s = requests.Session()
         if max_retries:
             self.s.mount(
@@ -56,73 +150,44 @@ class HuggingFaceDownloader:
         links = []
         sha256 = []
         classifications = []
-        has_pytorch = False
-        has_pt = False
-        # has_ggml = False
-        has_safetensors = False
         is_lora = False
+        # every page's cursor is derived from the last file of the previous one, so pages are fetched in turn
         while True:
             url = f"{base}{page}" + (f"?cursor={cursor.decode()}" if cursor else "")
             r = self.s.get(url, timeout=20)
             r.raise_for_status()
-            content = r.content
-
-            dict = json.loads(content)
-            if len(dict) == 0:
+            entries = r.json()
+            if len(entries) == 0:
                 break
 
-            for i in range(len(dict)):
-                fname = dict[i]["path"]
+            for entry in entries:
+                fname = entry["path"]
                 if not is_lora and fname.endswith(
                     ("adapter_config.json", "adapter_model.bin")
                 ):
                     is_lora = True
 
-                is_pytorch = re.match(r"(pytorch|adapter)_model.*\.bin", fname)
-                is_safetensors = re.match(r".*\.safetensors", fname)
-                is_pt = re.match(r".*\.pt", fname)
-                is_ggml = re.match(r".*ggml.*\.bin", fname)
-                is_tokenizer = re.match(r"(tokenizer|ice).*\.model", fname)
-                is_text = re.match(r".*\.(txt|json|py|md)", fname) or is_tokenizer
-                if any(
-                    (is_pytorch, is_safetensors, is_pt, is_ggml, is_tokenizer, is_text)
-                ):
-                    if "lfs" in dict[i]:
-                        sha256.append([fname, dict[i]["lfs"]["oid"]])
-
-                    if is_text:
-                        links.append(
-                            f"https://huggingface.co/{model}/resolve/{branch}/{fname}"
-                        )
-                        classifications.append("text")
-                        continue
-
-                    if not text_only:
-                        links.append(
-                            f"https://huggingface.co/{model}/resolve/{branch}/{fname}"
-                        )
-                        if is_safetensors:
-                            has_safetensors = True
-                            classifications.append("safetensors")
-                        elif is_pytorch:
-                            has_pytorch = True
-                            classifications.append("pytorch")
-                        elif is_pt:
-                            has_pt = True
-                            classifications.append("pt")
-                        elif is_ggml:
-                            # has_ggml = True
-                            classifications.append("ggml")
+                classification = classify_file_name(fname)
+                if classification is None:
+                    continue
+                if "lfs" in entry:
+                    sha256.append([fname, entry["lfs"]["oid"]])
+                if classification == "text" or not text_only:
+                    links.append(
+                        f"https://huggingface.co/{model}/resolve/{branch}/{fname}"
+                    )
+                    classifications.append(classification)
 
             cursor = (
-                base64.b64encode(f'{{"file_name":"{dict[-1]["path"]}"}}'.encode())
+                base64.b64encode(f'{{"file_name":"{entries[-1]["path"]}"}}'.encode())
                 + b":50"
             )
             cursor = base64.b64encode(cursor)
             cursor = cursor.replace(b"=", b"%3D")
 
         # If both pytorch and safetensors are available, download safetensors only
-        if (has_pytorch or has_pt) and has_safetensors:
+        has_pytorch = "pytorch" in classifications or "pt" in classifications
+        if has_pytorch and "safetensors" in classifications:
             for i in range(len(classifications) - 1, -1, -1):
                 if classifications[i] in ["pytorch", "pt"]:
                     links.pop(i)
@@ -142,28 +207,40 @@ class HuggingFaceDownloader:
         return output_folder
 
     def get_single_file(
-        self, url, output_folder, start_from_scratch=False, filename=None
+        self, url, output_folder, start_from_scratch=False, filename=None, segments=1
     ):
-        """Gets a single file from Hugging Face."""
-        filename = filename if filename else Path(url.rsplit("/", 1)[1])
-        output_path = Path(output_folder + "/" + filename)
+        """Gets a single file from Hugging Face, over `segments` concurrent range requests if more than one."""
+        filename = filename if filename else url.rsplit("/", 1)[1]
+        output_path = Path(output_folder) / filename
+        if segments > 1 and self.get_single_file_in_segments(url, output_path, segments, start_from_scratch):
+            return
+
         headers = {}
         mode = "wb"
+        file_hash = hashlib.sha256()
+        segment_manifest_path = Path(f"{output_path}{SEGMENT_MANIFEST_SUFFIX}")
+        if segment_manifest_path.exists():
+            # a preallocated segmented download is not a prefix of the file, it cannot be resumed sequentially
+            start_from_scratch = True
+            segment_manifest_path.unlink()
         if output_path.exists() and not start_from_scratch:
             # Check if the file has already been downloaded completely
-            r = self.s.get(url, stream=True, timeout=20)
-            total_size = int(r.headers.get("content-length", 0))
-            if output_path.stat().st_size >= total_size:
+            total_size, remote_sha256 = self.get_remote_file_info(url)
+            if self._is_complete_download(output_path, total_size, remote_sha256):
                 return
 
-            # Otherwise, resume the download from where it left off
-            headers = {"Range": f"bytes={output_path.stat().st_size}-"}
-            mode = "ab"
+            if output_path.stat().st_size < total_size:
+                # Otherwise, resume the download from where it left off, the bytes on disk start the digest
+                headers = {"Range": f"bytes={output_path.stat().st_size}-"}
+                mode = "ab"
+                self._update_hash_from_file(file_hash, output_path)
+        if mode == "wb":
+            Path(f"{output_path}{DIGEST_SUFFIX}").unlink(missing_ok=True)
 
         with self.s.get(url, stream=True, headers=headers, timeout=20) as r:
             r.raise_for_status()  # Do not continue the download if the request was unsuccessful
             total_size = int(r.headers.get("content-length", 0))
-            block_size = 1024 * 1024  # 1MB
+            block_size = DOWNLOAD_BLOCK_SIZE
             with open(output_path, mode) as f:
                 with tqdm.tqdm(
                     total=total_size,
@@ -174,19 +251,281 @@ class HuggingFaceDownloader:
                     for data in r.iter_content(block_size):
                         t.update(len(data))
                         f.write(data)
+                        file_hash.update(data)
+        self._write_digest(output_path, file_hash.hexdigest())
+
+    def get_remote_file_info(self, url):
+        """Gets the size and, when the server reports it, the sha256 of a remote file with HEAD requests only."""
+        # Hugging Face answers for LFS files with a redirect that carries their size and sha256
+        r = self.s.head(url, allow_redirects=False, timeout=20)
+        if r.is_redirect and "x-linked-size" not in r.headers:
+            r = self.s.head(url, allow_redirects=True, timeout=20)
+        r.raise_for_status()
+        return self._parse_remote_file_info(r.headers)
+
+    @staticmethod
+    def _parse_remote_file_info(headers):
+        size = int(headers.get("x-linked-size") or headers.get("content-length") or 0)
+        etag = (headers.get("x-linked-etag") or headers.get("etag") or "").strip('"')
+        sha256 = etag if SHA256_PATTERN.fullmatch(etag) else None
+        return size, sha256
+
+    def get_single_file_in_segments(self, url, output_path, segments, start_from_scratch=False):
+        """Downloads a file as byte ranges over `segments` concurrent connections, written in place into a
+        preallocated file.
+
+        The file is split into segments of `min_segment_size` bytes that are downloaded in offset order,
+        never more than `SEGMENT_READ_AHEAD` segments per connection ahead of the first unfinished one. The
+        bytes contiguous from the start of the file so advance steadily, and the digest is computed from them
+        as they arrive. Progress is recorded in a segment manifest next to the file, so an interrupted download
+        resumes with the missing bytes of each segment. Returns False without downloading anything if the
+        server does not support range requests.
+        """
+        r = self.s.head(url, allow_redirects=True, timeout=20)
+        r.raise_for_status()
+        total_size = int(r.headers.get("content-length", 0))
+        if r.headers.get("accept-ranges") != "bytes" or total_size == 0:
+            return False
+
+        manifest_path = Path(f"{output_path}{SEGMENT_MANIFEST_SUFFIX}")
+        manifest = None if start_from_scratch else self._load_segment_manifest(manifest_path, url, total_size)
+        if manifest is None:
+            _, remote_sha256 = self._parse_remote_file_info(r.headers)
+            if not start_from_scratch and self._is_complete_download(output_path, total_size, remote_sha256):
+                return True
+
+            segment_count = max(1, total_size // self.min_segment_size)
+            bounds = [total_size * i // segment_count for i in range(segment_count + 1)]
+            manifest = {
+                "url": url,
+                "size": total_size,
+                "segments": [
+                    {"start": bounds[i], "end": bounds[i + 1], "downloaded": 0} for i in range(segment_count)
+                ],
+            }
+            # record the segments before preallocating, a full size file without them is never taken as complete
+            Path(f"{output_path}{DIGEST_SUFFIX}").unlink(missing_ok=True)
+            self._save_segment_manifest(manifest_path, manifest)
+            with open(output_path, "wb") as f:
+                f.truncate(total_size)
+
+        remaining = sorted(
+            (s for s in manifest["segments"] if s["start"] + s["downloaded"] < s["end"]), key=lambda s: s["start"]
+        )
+        downloaded = sum(s["downloaded"] for s in manifest["segments"])
+        lock = threading.Lock()
+        fd = os.open(output_path, os.O_WRONLY)
+        # segments arrive out of order, the digest follows the bytes contiguous from the start of the file
+        hasher = _ContiguousHasher(output_path)
+        hasher.advance(self._get_contiguous_size(manifest))
+        try:
+            with tqdm.tqdm(
+                total=total_size,
+                initial=downloaded,
+                unit="iB",
+                unit_scale=True,
+                bar_format="{l_bar}{bar}| {n_fmt:6}/{total_fmt:6} {rate_fmt:6}",
+            ) as t:
+                connections = max(1, min(segments, len(remaining)))
+                with ThreadPoolExecutor(max_workers=connections) as executor:
+                    # the index in `remaining` of each running segment
+                    running = {}
+                    next_index = 0
+                    while next_index < len(remaining) or running:
+                        first_unfinished = min(running.values(), default=next_index)
+                        while (
+                            next_index < len(remaining)
+                            and len(running) < connections
+                            and next_index - first_unfinished < connections * SEGMENT_READ_AHEAD
+                        ):
+                            future = executor.submit(
+                                self._download_segment, url, fd, remaining[next_index], manifest, manifest_path,
+                                lock, t, hasher,
+                            )
+                            running[future] = next_index
+                            next_index += 1
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            del running[future]
+                            future.result()
+        except BaseException:
+            hasher.close()
+            raise
+        finally:
+            os.close(fd)
+
+        self._write_digest(output_path, hasher.finish())
+        manifest_path.unlink()
+        return True
+
+    @staticmethod
+    def _get_contiguous_size(manifest):
+        """The number of bytes downloaded without a gap from the start of the file."""
+        size = 0
+        for segment in sorted(manifest["segments"], key=lambda segment: segment["start"]):
+            size = segment["start"] + segment["downloaded"]
+            if size < segment["end"]:
+                break
+        return size
+
+    def _download_segment(self, url, fd, segment, manifest, manifest_path, lock, progress, hasher):
+        """Downloads the missing bytes of a segment, retrying it on its own if the connection fails."""
+        for attempt in range(self.max_retries + 1):
+            offset = segment["start"] + segment["downloaded"]
+            try:
+                headers = {"Range": f"bytes={offset}-{segment['end'] - 1}"}
+                with self.s.get(url, stream=True, headers=headers, timeout=20) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise IOError(f"Server ignored the range request for bytes {offset}-{segment['end'] - 1}")
+                    for data in r.iter_content(DOWNLOAD_BLOCK_SIZE):
+                        data = data[: segment["end"] - offset]
+                        os.pwrite(fd, data, offset)
+                        offset += len(data)
+                        with lock:
+                            segment["downloaded"] += len(data)
+                            progress.update(len(data))
+                            self._save_segment_manifest(manifest_path, manifest)
+                            hasher.advance(self._get_contiguous_size(manifest))
+                if offset >= segment["end"]:
+                    return
+                raise IOError(f"Connection closed at byte {offset} of segment ending at {segment['end']}")
+            except (requests.RequestException, IOError) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Retrying segment {segment['start']}-{segment['end'] - 1} of {url}: {e}")
+                time.sleep(min(2**attempt, 30))
+
+    def _load_segment_manifest(self, manifest_path, url, total_size):
+        """Loads the segment manifest of an interrupted download of the same file, if there is one."""
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("url") != url or manifest.get("size") != total_size:
+            return None
+        return manifest
+
+    def _save_segment_manifest(self, manifest_path, manifest):
+        temporary_path = Path(f"{manifest_path}.tmp")
+        temporary_path.write_text(json.dumps(manifest))
+        os.replace(temporary_path, manifest_path)
+
+    @staticmethod
+    def hash_file(path):
+        """Computes the sha256 of a file in fixed-size blocks, in constant memory."""
+        file_hash = hashlib.sha256()
+        HuggingFaceDownloader._update_hash_from_file(file_hash, path)
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def _update_hash_from_file(file_hash, path):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(DOWNLOAD_BLOCK_SIZE), b""):
+                file_hash.update(block)
+
+    @staticmethod
+    def read_recorded_digest(path):
+        """Reads the sha256 recorded when the file was downloaded, None if there is none."""
+        try:
+            return Path(f"{path}{DIGEST_SUFFIX}").read_text().split()[0]
+        except (FileNotFoundError, IndexError):
+            return None
+
+    def _write_digest(self, path, digest):
+        path = Path(path)
+        Path(f"{path}{DIGEST_SUFFIX}").write_text(f"{digest}  {path.name}\n")
+
+    def _is_complete_download(self, path, total_size, remote_sha256=None):
+        """Whether a file without a segment manifest is a finished download.
+
+        A preallocated file has its full size from the start, so the size proves nothing on its own: the
+        file also needs the digest recorded once its download completed, or to hash to the server's sha256.
+        """
+        if not path.exists() or path.stat().st_size != total_size:
+            return False
+        recorded_digest = self.read_recorded_digest(path)
+        if recorded_digest is not None:
+            return remote_sha256 is None or recorded_digest == remote_sha256
+        if remote_sha256 is not None and self.hash_file(path) == remote_sha256:
+            self._write_digest(path, remote_sha256)
+            return True
+        return False
 
     def start_download_threads(
-        self, file_list, output_folder, start_from_scratch=False, threads=1
+        self, file_list, output_folder, start_from_scratch=False, threads=1, segments=1
     ):
-        """Starts the download threads."""
-        thread_map(
-            lambda url: self.get_single_file(
-                url, output_folder, start_from_scratch=start_from_scratch
-            ),
-            file_list,
-            max_workers=threads,
-            disable=True,
-        )
+        """Downloads the files, `threads` at a time, on an event loop sharing one connection pool."""
+        asyncio.run(self._download_files(file_list, output_folder, start_from_scratch, threads, segments))
+
+    async def _download_files(self, file_list, output_folder, start_from_scratch, threads, segments):
+        limit = asyncio.Semaphore(max(1, threads))
+        async with httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(retries=self.max_retries),
+            limits=httpx.Limits(max_connections=max(1, threads), max_keepalive_connections=max(1, threads)),
+            timeout=httpx.Timeout(20),
+            follow_redirects=True,
+        ) as client:
+
+            async def download(url):
+                async with limit:
+                    if segments > 1:
+                        # large files are split into range requests by the segmented downloader in a worker thread
+                        await asyncio.to_thread(
+                            self.get_single_file, url, output_folder, start_from_scratch, None, segments
+                        )
+                    else:
+                        await self._get_single_file_async(client, url, output_folder, start_from_scratch)
+
+            await asyncio.gather(*(download(url) for url in file_list))
+
+    async def _get_single_file_async(self, client, url, output_folder, start_from_scratch=False):
+        """Streams a single file to disk, resuming a partial download, writing and hashing blocks off the event loop."""
+        output_path = Path(output_folder) / url.rsplit("/", 1)[1]
+        headers = {}
+        mode = "wb"
+        file_hash = hashlib.sha256()
+        segment_manifest_path = Path(f"{output_path}{SEGMENT_MANIFEST_SUFFIX}")
+        if segment_manifest_path.exists():
+            # a preallocated segmented download is not a prefix of the file, it cannot be resumed sequentially
+            start_from_scratch = True
+            segment_manifest_path.unlink()
+        if output_path.exists() and not start_from_scratch:
+            r = await client.head(url, follow_redirects=False)
+            if r.is_redirect and "x-linked-size" not in r.headers:
+                r = await client.head(url)
+            r.raise_for_status()
+            total_size, remote_sha256 = self._parse_remote_file_info(r.headers)
+            if await asyncio.to_thread(self._is_complete_download, output_path, total_size, remote_sha256):
+                return
+
+            if output_path.stat().st_size < total_size:
+                headers = {"Range": f"bytes={output_path.stat().st_size}-"}
+                mode = "ab"
+                await asyncio.to_thread(self._update_hash_from_file, file_hash, output_path)
+        if mode == "wb":
+            Path(f"{output_path}{DIGEST_SUFFIX}").unlink(missing_ok=True)
+
+        async with client.stream("GET", url, headers=headers) as r:
+            r.raise_for_status()
+            total_size = int(r.headers.get("content-length", 0))
+            with open(output_path, mode) as f:
+                with tqdm.tqdm(
+                    total=total_size,
+                    unit="iB",
+                    unit_scale=True,
+                    bar_format="{l_bar}{bar}| {n_fmt:6}/{total_fmt:6} {rate_fmt:6}",
+                ) as t:
+                    async for data in r.aiter_bytes(DOWNLOAD_BLOCK_SIZE):
+                        await asyncio.to_thread(self._write_block, f, file_hash, data)
+                        t.update(len(data))
+        self._write_digest(output_path, file_hash.hexdigest())
+
+    @staticmethod
+    def _write_block(f, file_hash, data):
+        # hashlib and file writes release the GIL, so blocks of different files are written in parallel
+        f.write(data)
+        file_hash.update(data)
 
     def download_model_files(
         self,
@@ -198,6 +537,7 @@ class HuggingFaceDownloader:
         progress_bar=None,
         start_from_scratch=False,
         threads=1,
+        segments=1,
     ):
         """Downloads the model files."""
         self.progress_bar = progress_bar
@@ -220,29 +560,41 @@ class HuggingFaceDownloader:
         # Downloading the files
         print(f"Downloading the model to {output_folder}")
         self.start_download_threads(
-            links, output_folder, start_from_scratch=start_from_scratch, threads=threads
+            links, output_folder, start_from_scratch=start_from_scratch, threads=threads, segments=segments
         )
 
-    def check_model_files(self, model, branch, links, sha256, output_folder):
-        """Checks if the model files are present and valid."""
+        # The digests were computed while writing, so validating them reads nothing back from disk
+        self.check_recorded_digests(sha256, output_folder)
+
+    def check_model_files(self, model, branch, links, sha256, output_folder, threads=None):
+        """Checks if the model files are present and valid. Files are hashed in parallel, in constant memory."""
+
+        def hash_if_exists(item):
+            fpath = Path(output_folder) / item[0]
+            return self.hash_file(fpath) if fpath.exists() else None
+
+        with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as executor:
+            file_hashes = list(executor.map(hash_if_exists, sha256))
+
+        return self._report_checksums(sha256, file_hashes, output_folder)
+
+    def check_recorded_digests(self, sha256, output_folder):
+        """Checks the digests recorded while downloading against the expected ones, without reading the files."""
+        file_hashes = [self.read_recorded_digest(Path(output_folder) / item[0]) for item in sha256]
+        return self._report_checksums(sha256, file_hashes, output_folder)
+
+    def _report_checksums(self, sha256, file_hashes, output_folder):
         # Validate the checksums
         validated = True
-        for i in range(len(sha256)):
-            fpath = output_folder / sha256[i][0]
-
-            if not fpath.exists():
-                print(f"The following file is missing: {fpath}")
+        for (fname, expected_hash), file_hash in zip(sha256, file_hashes):
+            if file_hash is None:
+                print(f"The following file is missing: {Path(output_folder) / fname}")
                 validated = False
-                continue
-
-            with open(output_folder / sha256[i][0], "rb") as f:
-                bytes = f.read()
-                file_hash = hashlib.sha256(bytes).hexdigest()
-                if file_hash != sha256[i][1]:
-                    print(f"Checksum failed: {sha256[i][0]}  {sha256[i][1]}")
-                    validated = False
-                else:
-                    print(f"Checksum validated: {sha256[i][0]}  {sha256[i][1]}")
+            elif file_hash != expected_hash:
+                print(f"Checksum failed: {fname}  {expected_hash}")
+                validated = False
+            else:
+                print(f"Checksum validated: {fname}  {expected_hash}")
 
         if validated:
             print("[+] Validated checksums of all model files!")
@@ -250,3 +602,4 @@ class HuggingFaceDownloader:
             print(
                 "[-] Invalid checksums. Rerun download-model.py with the --clean flag."
             )
+        return validated
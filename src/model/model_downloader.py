@@ -1,30 +1,75 @@
 import os
+from typing import Optional
 
 import structlog as logging
 
+from src.model.file_lock import FileLock
 from src.model.huggingface_downloader import HuggingFaceDownloader
+from src.model.model_store import ModelStore
 
 logger = logging.get_logger(__name__)
 
 
 class ModelDownloader:
     def __init__(
-        self, hugging_face_downloader: HuggingFaceDownloader, output_path: str
+        self, hugging_face_downloader: HuggingFaceDownloader, output_path: str, download_segments: int = 1,
+        model_store: Optional[ModelStore] = None, lock_timeout: Optional[float] = None,
     ):
         self.hugging_face_downloader = hugging_face_downloader
         self.output_path = output_path
+        self.download_segments = download_segments
+        self.model_store = model_store or ModelStore(output_path)
+        self.lock_timeout = lock_timeout
 
-    def download_model(self, download_link: str, folder_name: str):
-        """Downloads a LlamaCpp based model to `self.output_path/folder_name` for the provided `download_link`. An example `download_link` is https://huggingface.co/vicuna/ggml-vicuna-13b-1.1/resolve/main/ggml-vic13b-q4_0.bin."""
+    def is_model_installed(self, download_link: str, folder_name: str, revalidate: bool = False) -> bool:
+        """Check the model store for a complete copy of the model. Only revalidating it makes a (HEAD) request."""
+        filename = download_link.split("/")[-1]
+        if not self.model_store.is_installed(folder_name, filename, source_url=download_link):
+            return self._adopt_unrecorded_file(download_link, folder_name, filename)
+        if not revalidate:
+            return True
+
+        stored = self.model_store.get(folder_name, filename)
+        size, sha256 = self.hugging_face_downloader.get_remote_file_info(download_link)
+        if size != stored.size or (sha256 is not None and sha256 != stored.sha256):
+            logger.info(f"Installed model {filename} differs from {download_link}, it will be downloaded again")
+            return False
+        return True
+
+    def _adopt_unrecorded_file(self, download_link: str, folder_name: str, filename: str) -> bool:
+        """Record a model file installed before the model store kept a manifest once its size matches the remote file."""
+        if not self.model_store.has_unrecorded_file(folder_name, filename):
+            return False
         try:
-            logger.info(f"Downloading model from URL {download_link}")
+            size, sha256 = self.hugging_face_downloader.get_remote_file_info(download_link)
+        except Exception as e:
+            logger.warning(f"Could not check model file {filename} against {download_link}, downloading it again: {e}")
+            return False
+        return self.model_store.adopt(folder_name, filename, download_link, size, sha256)
+
+    def download_model(self, download_link: str, folder_name: str):
+        """Downloads a LlamaCpp based model to `self.output_path/folder_name` for the provided `download_link`. An example `download_link` is https://huggingface.co/vicuna/ggml-vicuna-13b-1.1/resolve/main/ggml-vic13b-q4_0.bin.
 
+        Processes sharing the output path download a model once, the others wait for the lock and reuse it.
+        """
+        try:
             filename = download_link.split("/")[-1]
             output_folder = f"{self.output_path}/{folder_name}"
             os.makedirs(output_folder, exist_ok=True)
-            self.hugging_face_downloader.get_single_file(
-                url=download_link, output_folder=output_folder, filename=filename
-            )
+            with FileLock(f"{output_folder}/{filename}.lock", timeout=self.lock_timeout):
+                if self.model_store.is_installed(folder_name, filename, source_url=download_link):
+                    logger.info(f"Model from URL {download_link} was downloaded by another process")
+                    return
+
+                logger.info(f"Downloading model from URL {download_link}")
+                # download under a temporary name, the model only appears under its own name once complete
+                self.hugging_face_downloader.get_single_file(
+                    url=download_link,
+                    output_folder=output_folder,
+                    filename=self.model_store.get_temporary_path(folder_name, filename).name,
+                    segments=self.download_segments,
+                )
+                self.model_store.install(folder_name, filename, download_link)
             logger.info(f"Successfully downloaded model from URL {download_link}")
         except Exception as exc:
             logger.error(
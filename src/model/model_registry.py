@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Tuple
+
+import structlog as logging
+
+from src.config import ModelDownloadConfiguration
+
+if TYPE_CHECKING:
+    from src.model.model_retriever import ModelRetriever
+
+logger = logging.get_logger(__name__)
+
+
+class UnknownModelError(Exception):
+    """Raised when a request asks for a model that is not registered."""
+
+
+class ModelDownloadingError(Exception):
+    """Raised when a request selects a model that is still downloading, or whose download failed."""
+
+
+class InvalidModelConfigurationError(ValueError):
+    """Raised for a model whose folder or file name is not a single name inside the models directory."""
+
+
+class ModelMemoryBudgetError(Exception):
+    """Raised when a model does not fit in the memory budget even with every other model unloaded."""
+
+
+def validate_model_configuration(config: ModelDownloadConfiguration):
+    """Make sure the model is stored as a file directly inside its folder of the models directory."""
+    for field_name in ("folder_name", "quantization_model"):
+        value = getattr(config, field_name)
+        if not value or value in (".", "..") or "/" in value or "\\" in value or "\0" in value:
+            raise InvalidModelConfigurationError(f"Invalid model {field_name}: {value!r}")
+
+
+def get_resident_memory_bytes() -> Optional[int]:
+    """The resident memory of this process, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class LoadedModel:
+    name: str
+    config: ModelDownloadConfiguration
+    model: object
+    memory_bytes: int
+    in_use: bool = False
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ModelRegistry:
+    """Loads registered models on first use and keeps the loaded ones within a memory budget.
+
+    A llama-cpp model is not safe to call from several threads, so each registered model is loaded once
+    and used by one scheduler worker at a time. Before a model is loaded, idle models are unloaded least
+    recently used first until its file fits in the budget. The memory of a loaded model is the larger of
+    its file size and the growth of the resident memory while loading it, and models loaded outside the
+    registry are accounted for with `pin`.
+
+    A registered model is downloaded on a thread of its own, so a download never holds up a scheduler worker,
+    and requests for it are rejected with `ModelDownloadingError` until it is installed. Registering a model
+    under a name that is taken swaps it without a restart: the old model keeps serving while the new one
+    downloads, is unloaded once its current generation finishes after that, and the new one is loaded by the
+    next request for it.
+    """
+
+    def __init__(
+        self, model_retriever: "ModelRetriever", memory_budget_bytes: Optional[int] = None,
+        on_unload: Optional[Callable[[object], None]] = None,
+    ):
+        self.model_retriever = model_retriever
+        self.memory_budget_bytes = memory_budget_bytes
+        self.on_unload = on_unload
+        # the installed models requests get, with the model file and a vocabulary-only copy to count tokens with
+        self._configs: Dict[str, ModelDownloadConfiguration] = {}
+        self._model_files: Dict[str, str] = {}
+        self._tokenizers: Dict[str, object] = {}
+        # the registrations still downloading, a newer registration under the same name replaces the future
+        self._downloads: Dict[str, Tuple[ModelDownloadConfiguration, Future]] = {}
+        self._download_errors: Dict[str, str] = {}
+        self._loaded: Dict[str, LoadedModel] = {}
+        self._loading = set()
+        self._pinned: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        # loads run one at a time so the growth of the resident memory is down to the model being loaded
+        self._load_lock = threading.Lock()
+        self._loads = 0
+        self._evictions = 0
+
+    def register(self, name: str, config: ModelDownloadConfiguration) -> Future:
+        """Start downloading a model to make it available under `name`, replacing the model registered under it.
+
+        Returns a future resolving to the model file once the model is installed and requests get it.
+        """
+        validate_model_configuration(config)
+        download = Future()
+        with self._condition:
+            self._downloads[name] = (config, download)
+            self._download_errors.pop(name, None)
+        logger.info(f"Registered model {name}: {config.download_link}")
+        threading.Thread(
+            target=self._download, args=(name, config, download), name=f"model-download-{name}", daemon=True
+        ).start()
+        return download
+
+    def pin(self, name: str, memory_bytes: int):
+        """Account for the memory of a model kept loaded outside the registry, which is never unloaded."""
+        with self._condition:
+            self._pinned[name] = memory_bytes
+
+    def has_model(self, name: str) -> bool:
+        with self._condition:
+            return name in self._configs or name in self._downloads or name in self._download_errors
+
+    def get_tokenizer(self, name: str) -> Tuple[object, ModelDownloadConfiguration]:
+        """Return a vocabulary-only copy of the model registered under `name`, to count prompt tokens with,
+        and the configuration of the model."""
+        with self._condition:
+            self._ensure_installed(name)
+            return self._tokenizers[name], self._configs[name]
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[object]:
+        """Hold the model registered under `name`, loading it if needed, for the duration of a generation."""
+        loaded = self._acquire(name)
+        try:
+            yield loaded.model
+        finally:
+            self._release(loaded)
+
+    def get_stats(self) -> Dict:
+        with self._condition:
+            models = {}
+            for name in {**self._configs, **self._downloads, **self._download_errors}:
+                models[name] = {
+                    "loaded": False, "in_use": False, "memory_bytes": None, "idle_seconds": None,
+                    "downloading": name in self._downloads,
+                }
+                if name in self._download_errors:
+                    models[name]["download_error"] = self._download_errors[name]
+            for name, memory_bytes in self._pinned.items():
+                models[name] = {"loaded": True, "pinned": True, "memory_bytes": memory_bytes}
+            for name, loaded in self._loaded.items():
+                models[name].update({
+                    "loaded": True,
+                    "in_use": loaded.in_use,
+                    "memory_bytes": loaded.memory_bytes,
+                    "idle_seconds": None if loaded.in_use else round(time.monotonic() - loaded.last_used, 1),
+                })
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "memory_used_bytes": self._get_memory_used_bytes(),
+                "loads": self._loads,
+                "evictions": self._evictions,
+                "models": models,
+            }
+
+    def _download(self, name: str, config: ModelDownloadConfiguration, download: Future):
+        """Install a registered model and make it the model requests for `name` get, unless it was replaced."""
+        try:
+            model_file = self.model_retriever.install_model(config)
+            # the vocabulary is enough to count prompt tokens, the weights are only loaded on first use
+            tokenizer = self.model_retriever.load_model(
+                model_file, replace(config, model_kwargs={**config.model_kwargs, "vocab_only": True})
+            )
+        except Exception as e:
+            logger.error(f"Error downloading model {name}: {e}")
+            with self._condition:
+                if self._is_current_download(name, download):
+                    del self._downloads[name]
+                    self._download_errors[name] = str(e)
+            download.set_exception(e)
+            return
+
+        with self._condition:
+            if self._is_current_download(name, download):
+                del self._downloads[name]
+                self._configs[name] = config
+                self._model_files[name] = model_file
+                self._tokenizers[name] = tokenizer
+                loaded = self._loaded.get(name)
+                if loaded is not None and loaded.config != config and not loaded.in_use:
+                    self._unload(loaded)
+                self._condition.notify_all()
+        logger.info(f"Downloaded model {name}")
+        download.set_result(model_file)
+
+    def _is_current_download(self, name: str, download: Future) -> bool:
+        return name in self._downloads and self._downloads[name][1] is download
+
+    def _ensure_installed(self, name: str):
+        if name in self._configs:
+            return
+        if name in self._downloads:
+            raise ModelDownloadingError(f"Model {name} is still downloading")
+        if name in self._download_errors:
+            raise ModelDownloadingError(f"Model {name} failed to download: {self._download_errors[name]}")
+        raise UnknownModelError(f"Unknown model: {name}")
+
+    def _acquire(self, name: str) -> LoadedModel:
+        with self._condition:
+            while True:
+                self._ensure_installed(name)
+                config, model_file = self._configs[name], self._model_files[name]
+                loaded = self._loaded.get(name)
+                if loaded is None and name not in self._loading:
+                    self._loading.add(name)
+                    break
+                # wait for the running generation, or for a swapped out model to be unloaded after it
+                if loaded is not None and not loaded.in_use and loaded.config == config:
+                    loaded.in_use = True
+                    return loaded
+                self._condition.wait()
+
+        try:
+            return self._load(name, config, model_file)
+        finally:
+            with self._condition:
+                self._loading.discard(name)
+                self._condition.notify_all()
+
+    def _release(self, loaded: LoadedModel):
+        with self._condition:
+            loaded.in_use = False
+            loaded.last_used = time.monotonic()
+            if self._configs.get(loaded.name) != loaded.config:
+                self._unload(loaded)
+            self._condition.notify_all()
+
+    def _load(self, name: str, config: ModelDownloadConfiguration, model_file: str) -> LoadedModel:
+        required_bytes = os.path.getsize(model_file)
+        with self._load_lock:
+            self._make_room(name, required_bytes)
+            resident_before = get_resident_memory_bytes()
+            started_at = time.monotonic()
+            model = self.model_retriever.load_model(model_file, config)
+            resident_after = get_resident_memory_bytes()
+
+        memory_bytes = required_bytes
+        if resident_before is not None and resident_after is not None:
+            memory_bytes = max(required_bytes, resident_after - resident_before)
+        loaded = LoadedModel(name, config, model, memory_bytes, in_use=True)
+        with self._condition:
+            self._loaded[name] = loaded
+            self._loads += 1
+        logger.info(f"Loaded model {name} in {time.monotonic() - started_at:.1f}s, taking {memory_bytes} bytes")
+        return loaded
+
+    def _make_room(self, name: str, required_bytes: int):
+        """Unload idle models, least recently used first, until the model fits in the memory budget."""
+        if self.memory_budget_bytes is None:
+            return
+        with self._condition:
+            if sum(self._pinned.values()) + required_bytes > self.memory_budget_bytes:
+                raise ModelMemoryBudgetError(
+                    f"Model {name} needs {required_bytes} bytes, more than the memory budget of "
+                    f"{self.memory_budget_bytes} bytes leaves"
+                )
+            while self._get_memory_used_bytes() + required_bytes > self.memory_budget_bytes:
+                idle = [loaded for loaded in self._loaded.values() if not loaded.in_use]
+                if idle:
+                    self._unload(min(idle, key=lambda loaded: loaded.last_used))
+                else:
+                    # every loaded model is generating, the first one to finish can be unloaded
+                    self._condition.wait()
+
+    def _unload(self, loaded: LoadedModel):
+        del self._loaded[loaded.name]
+        self._evictions += 1
+        if self.on_unload is not None:
+            self.on_unload(loaded.model)
+        logger.info(f"Unloaded model {loaded.name}, freeing {loaded.memory_bytes} bytes")
+
+    def _get_memory_used_bytes(self) -> int:
+        return sum(self._pinned.values()) + sum(loaded.memory_bytes for loaded in self._loaded.values())
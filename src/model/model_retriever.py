@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Union
+from typing import Optional
 
 import structlog as logging
 from llama_cpp import Llama
@@ -12,34 +12,53 @@ logger = logging.get_logger(__name__)
 
 
 class ModelRetriever:
-    def __init__(self, model_downloader: ModelDownloader):
+    def __init__(self, model_downloader: ModelDownloader, models_path: Optional[str] = None,
+                 allow_download: bool = True):
+        """
+        model_downloader: ModelDownloader -> Checks for and downloads models, its output path must be `models_path`
+        models_path: str -> Directory the models are installed in, src/model/downloaded_models if unset
+        allow_download: bool -> Whether missing models are downloaded, or fail to load
+        """
         self.model_downloader = model_downloader
+        self.models_path = models_path
+        self.allow_download = allow_download
 
     """Retrieves model from local storage or downloads it if it does not exist."""
 
     def get_model(self, model_config: ModelDownloadConfiguration, llama_model=Llama):
         """Get model from local storage or download it if it does not exist."""
-        path = Path(f"{os.getcwd()}/src/model/downloaded_models/{model_config.folder_name}/")
-        if not self._does_model_exist(path, model_config.quantization_model):
+        return self.load_model(self.install_model(model_config), model_config, llama_model)
+
+    def load_model(self, model_file: str, model_config: ModelDownloadConfiguration, llama_model=Llama):
+        """Instantiate a model from an installed model file."""
+        logger.info(f"Instantiating model from: {model_file}")
+        model = llama_model(model_path=model_file, **model_config.model_kwargs)
+        logger.info(f"Model {model_config.model_name} loaded")
+        return model
+
+    def install_model(self, model_config: ModelDownloadConfiguration) -> str:
+        """Download the model if it is not in local storage yet and return the path of the model file."""
+        models_path = self.models_path or f"{os.getcwd()}/src/model/downloaded_models"
+        path = Path(f"{models_path}/{model_config.folder_name}/")
+        if not self._does_model_exist(model_config):
+            if not self.allow_download:
+                raise FileNotFoundError(f"Model {model_config.quantization_model} is not installed in {path}")
             logger.info("Model does not exist for environment. Attempting to download")
             self.model_downloader.download_model(
                 model_config.download_link, model_config.folder_name
             )
 
         logger.info(f"Loading model: {model_config.model_name} from path: {path}")
-        model_file: str = path.as_posix() + f"/{model_config.quantization_model}"
-        logger.info(f"Instantiating model from: {model_file}")
-        model = llama_model(model_path=model_file, **model_config.model_kwargs)
-        logger.info(f"Model {model_config.model_name} loaded")
-        return model
+        return path.as_posix() + f"/{model_config.quantization_model}"
 
-    def _does_model_exist(
-        self, path: Path, quantization_model: Union[str, None]
-    ) -> bool:
-        """Check if model exists in local storage."""
-        if quantization_model is None:
+    def _does_model_exist(self, model_config: ModelDownloadConfiguration) -> bool:
+        """Check if a complete copy of the model is installed in local storage."""
+        if model_config.quantization_model is None:
             raise ValueError("Quantization model must be specified")
-        model_file = f"{path.as_posix()}/{quantization_model}"
-        model_path = Path(model_file)
 
-        return model_path.exists()
+        return self.model_downloader.is_model_installed(
+            model_config.download_link,
+            model_config.folder_name,
+            # models that are not downloaded are not revalidated either, which would take a request
+            revalidate=model_config.revalidate_download and self.allow_download,
+        )
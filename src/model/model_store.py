@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import structlog as logging
+
+from src.model.file_lock import FileLock
+from src.model.huggingface_downloader import DIGEST_SUFFIX, HuggingFaceDownloader
+
+logger = logging.get_logger(__name__)
+
+MODEL_STORE_MANIFEST_FILE_NAME = "model-store-manifest.json"
+# downloads are written under this suffix and only renamed to the final name once complete
+TEMPORARY_FILE_SUFFIX = ".part"
+
+
+@dataclass
+class StoredModelFile:
+    size: int
+    sha256: str
+    source_url: str
+    installed_at: float
+
+
+class ModelStore:
+    """Keeps track of the model files installed under a directory.
+
+    A manifest records the size, sha256 and source URL of every installed file. Files are downloaded
+    to a temporary name and atomically renamed once complete, so a file under its final name is
+    always whole, and whether a file is installed is answered from the manifest and a `stat` alone.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def get_path(self, folder_name: str, filename: str) -> Path:
+        return self.root / folder_name / filename
+
+    def get_temporary_path(self, folder_name: str, filename: str) -> Path:
+        return self.root / folder_name / f"{filename}{TEMPORARY_FILE_SUFFIX}"
+
+    def get(self, folder_name: str, filename: str) -> Optional[StoredModelFile]:
+        return self._load_manifest().get(self._get_key(folder_name, filename))
+
+    def is_installed(self, folder_name: str, filename: str, source_url: str = "") -> bool:
+        """Check that the file was installed from `source_url` and still has its recorded size, without reading or fetching it."""
+        stored = self.get(folder_name, filename)
+        path = self.get_path(folder_name, filename)
+        if stored is None:
+            return False
+        if source_url and stored.source_url != source_url:
+            logger.info(f"Model file {path} was installed from {stored.source_url}, not from {source_url}")
+            return False
+        try:
+            return path.stat().st_size == stored.size
+        except FileNotFoundError:
+            return False
+
+    def install(self, folder_name: str, filename: str, source_url: str) -> StoredModelFile:
+        """Move a completed download from its temporary name into place and record it in the manifest."""
+        temporary_path = self.get_temporary_path(folder_name, filename)
+        path = self.get_path(folder_name, filename)
+        sha256 = HuggingFaceDownloader.read_recorded_digest(temporary_path) or HuggingFaceDownloader.hash_file(
+            temporary_path
+        )
+        stored = StoredModelFile(
+            size=temporary_path.stat().st_size, sha256=sha256, source_url=source_url, installed_at=time.time()
+        )
+        os.replace(temporary_path, path)
+        Path(f"{path}{DIGEST_SUFFIX}").write_text(f"{sha256}  {filename}\n")
+        Path(f"{temporary_path}{DIGEST_SUFFIX}").unlink(missing_ok=True)
+        self._update_manifest(folder_name, filename, stored)
+        logger.info(f"Installed model file {path} ({stored.size} bytes, sha256 {sha256})")
+        return stored
+
+    def has_unrecorded_file(self, folder_name: str, filename: str) -> bool:
+        """Check for a file installed before the store kept a manifest."""
+        return self.get(folder_name, filename) is None and self.get_path(folder_name, filename).exists()
+
+    def adopt(self, folder_name: str, filename: str, source_url: str, remote_size: int,
+              remote_sha256: Optional[str] = None) -> bool:
+        """Record a file installed before the store kept a manifest, if it is as large as the remote file.
+
+        The sha256 is taken from the digest written next to the file when it was downloaded or from
+        the server, the file is only hashed when neither is available.
+        """
+        path = self.get_path(folder_name, filename)
+        size = path.stat().st_size
+        recorded_sha256 = HuggingFaceDownloader.read_recorded_digest(path)
+        if size != remote_size or (remote_sha256 and recorded_sha256 and recorded_sha256 != remote_sha256):
+            logger.warning(f"Model file {path} does not match {source_url}, it will be downloaded again")
+            return False
+
+        logger.warning(f"Model file {path} is not in the model store manifest, recording it")
+        stored = StoredModelFile(
+            size=size,
+            sha256=recorded_sha256 or remote_sha256 or HuggingFaceDownloader.hash_file(path),
+            source_url=source_url,
+            installed_at=path.stat().st_mtime,
+        )
+        self._update_manifest(folder_name, filename, stored)
+        return True
+
+    def _get_key(self, folder_name: str, filename: str) -> str:
+        return f"{folder_name}/{filename}"
+
+    def _load_manifest(self) -> Dict[str, StoredModelFile]:
+        path = self.root / MODEL_STORE_MANIFEST_FILE_NAME
+        try:
+            with open(path, "r") as file:
+                content = json.load(file)
+            return {key: StoredModelFile(**stored) for key, stored in content.items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable model store manifest {path}: {e}")
+            return {}
+
+    def _update_manifest(self, folder_name: str, filename: str, stored: StoredModelFile):
+        path = self.root / MODEL_STORE_MANIFEST_FILE_NAME
+        # other processes may install other files into the same store
+        with self._lock, FileLock(f"{path}.lock"):
+            manifest = self._load_manifest()
+            manifest[self._get_key(folder_name, filename)] = stored
+            temporary_path = Path(f"{path}.tmp")
+            with open(temporary_path, "w") as file:
+                json.dump({key: asdict(value) for key, value in manifest.items()}, file, indent=2)
+            os.replace(temporary_path, path)
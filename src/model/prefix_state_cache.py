@@ -0,0 +1,56 @@
+import threading
+from typing import Dict, List
+
+import structlog as logging
+
+logger = logging.get_logger(__name__)
+
+
+class PrefixStateCache:
+    """Keeps the evaluated KV state of the static prompt prefix for each loaded model.
+
+    The prefix is evaluated once per model and saved with llama-cpp's `save_state`. Before a
+    generation the state is restored with `load_state` unless the model's KV cache already starts
+    with the prefix, and llama-cpp's prefix matching then only evaluates the rest of the prompt.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._prefix_tokens: Dict[int, List[int]] = {}
+        self._states: Dict[int, object] = {}
+        self._lock = threading.Lock()
+
+    def warm(self, model):
+        """Evaluate the prefix on `model` and save the resulting state."""
+        prefix_tokens = model.tokenize(self.prefix.encode("utf-8"))
+        model.reset()
+        model.eval(prefix_tokens)
+        state = model.save_state()
+        with self._lock:
+            self._prefix_tokens[id(model)] = list(prefix_tokens)
+            self._states[id(model)] = state
+        logger.info(f"Cached the evaluated state of a {len(prefix_tokens)} token prompt prefix")
+
+    def is_warm(self, model) -> bool:
+        with self._lock:
+            return id(model) in self._states
+
+    def forget(self, model):
+        """Drop the state saved for a model that is unloaded."""
+        with self._lock:
+            self._prefix_tokens.pop(id(model), None)
+            self._states.pop(id(model), None)
+
+    def restore(self, model):
+        """Make sure the model's KV cache starts with the evaluated prefix."""
+        with self._lock:
+            prefix_tokens = self._prefix_tokens.get(id(model))
+            state = self._states.get(id(model))
+        if state is None:
+            return
+
+        evaluated_tokens = list(getattr(model, "eval_tokens", []))
+        if evaluated_tokens[: len(prefix_tokens)] == prefix_tokens:
+            # the previous prompt shared the prefix, so it is still in the KV cache
+            return
+        model.load_state(state)
@@ -1,36 +1,107 @@
-import chromadb
+from typing import Callable, List, Optional
+
 import structlog as logging
 
+from src.document.document_loader import CHUNK_OVERLAP
+from src.prompt.retrieval_service import RetrievalService
+
 logger = logging.get_logger(__name__)
 
+LOCAL_LLAMA_PROMPT = "You are an artificial intelligence striving towards providing the most accurate and " \
+                     "comprehensive answers possible.\n"
+CONTEXT_PROMPT = "Given this document:\n"
+# the constant instructions lead every prompt so their evaluated state can be reused across requests,
+# it ends on a newline so it tokenizes the same on its own as at the start of a full prompt
+STATIC_PROMPT_PREFIX = f"{LOCAL_LLAMA_PROMPT}{CONTEXT_PROMPT}"
+CHUNK_SEPARATOR = "\n\n"
+# shorter matches between the end of one chunk and the start of another are treated as coincidence
+MIN_CHUNK_OVERLAP = 8
+
 
 class PromptBuilder:
 
-    def get_complete_prompt(self, query: str, chroma_client: chromadb.API) -> str:
+    def __init__(self, retrieval_service: Optional[RetrievalService] = None,
+                 count_tokens: Optional[Callable[[str], int]] = None, max_prompt_tokens: Optional[int] = None):
+        """
+        retrieval_service: RetrievalService -> Finds the document chunks relevant to a query, no context is added if unset
+        count_tokens: Callable -> Counts the tokens of a text with the loaded model's tokenizer
+        max_prompt_tokens: int -> The token budget of the whole prompt, retrieved chunks are packed up to it
+        """
+        self.retrieval_service = retrieval_service
+        self.count_tokens = count_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+
+    def get_complete_prompt(self, query: str) -> str:
         """
-        Build a model prompt string given a user query and vector DB of documents
+        Build a model prompt string given a user query, with context from the relevant documents
         """
-        documents = self._get_context_for_query(query, chroma_client)
+        documents = self.retrieval_service.retrieve(query) if self.retrieval_service is not None else []
         prompt = self._build_prompt_with_context(documents, query)
         logger.info(f"Created prompt: {prompt}")
 
         return prompt
 
-    def _get_context_for_query(self, query: str, chroma_client: chromadb.API) -> []:
-        # search the chroma db for document chunks that match the user query
-        results = chroma_client.get_collection("all-documents").query(
-            query_texts=[query],
-            n_results=2,
-        )
-        logger.info(f"Retrieved matching documents from Chroma: {results}")
-        documents = results['documents']
-
-        if documents is None:
-            return []
-        return documents[0]
+    def get_complete_prompts(self, queries: List[str]) -> List[str]:
+        """
+        Build the prompts for several user queries, retrieving the context for all of them at once
+        """
+        if self.retrieval_service is None:
+            return [self._build_prompt_with_context([], query) for query in queries]
+        documents = self.retrieval_service.retrieve_many(queries)
+        return [self._build_prompt_with_context(query_documents, query)
+                for query, query_documents in zip(queries, documents)]
 
     def _build_prompt_with_context(self, documents: [], query: str) -> str:
-        CONTEXT_PROMPT = "Given this document: "
-        LOCAL_LLAMA_PROMPT = "You are an artificial intelligence striving towards providing the most accurate and " \
-                             "comprehensive answers possible.\n Q: "
-        return f"{CONTEXT_PROMPT} {documents} {LOCAL_LLAMA_PROMPT} {query} A: "
+        context = CHUNK_SEPARATOR.join(self._pack_chunks(documents, query))
+        return self._format_prompt(context, query)
+
+    def _format_prompt(self, context: str, query: str) -> str:
+        return f"{STATIC_PROMPT_PREFIX}{context}\n Q: {query} A: "
+
+    def _pack_chunks(self, documents: List[str], query: str) -> List[str]:
+        """
+        Keep the chunks, in relevance order, that fit in the prompt token budget after removing overlapping text
+        """
+        packed = []
+        if self.count_tokens is None or self.max_prompt_tokens is None:
+            remaining_tokens = None
+        else:
+            remaining_tokens = self.max_prompt_tokens - self.count_tokens(self._format_prompt("", query))
+            if remaining_tokens <= 0:
+                logger.warning("The query alone fills the prompt token budget, building the prompt without context")
+                return packed
+
+        for chunk in documents:
+            chunk = self._remove_overlap(packed, chunk)
+            if not chunk:
+                continue
+
+            if remaining_tokens is not None:
+                separator_tokens = self.count_tokens(CHUNK_SEPARATOR) if packed else 0
+                chunk_tokens = self.count_tokens(chunk) + separator_tokens
+                if chunk_tokens > remaining_tokens:
+                    logger.info(f"Skipping a {chunk_tokens} token chunk, {remaining_tokens} prompt tokens left")
+                    continue
+                remaining_tokens -= chunk_tokens
+            packed.append(chunk)
+        return packed
+
+    def _remove_overlap(self, packed: List[str], chunk: str) -> str:
+        """
+        Strip text the chunk shares with already packed chunks, e.g. the overlap between neighbouring chunks
+        """
+        for existing in packed:
+            if chunk in existing:
+                return ""
+            chunk = chunk[self._get_overlap_length(existing, chunk):]
+            chunk = chunk[:len(chunk) - self._get_overlap_length(chunk, existing)]
+        return chunk.strip()
+
+    def _get_overlap_length(self, first: str, second: str) -> int:
+        """
+        The length of the longest end of `first` that `second` starts with, if long enough to not be a coincidence
+        """
+        for length in range(min(len(first), len(second), CHUNK_OVERLAP), MIN_CHUNK_OVERLAP - 1, -1):
+            if first.endswith(second[:length]):
+                return length
+        return 0
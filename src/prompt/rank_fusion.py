@@ -0,0 +1,17 @@
+from typing import Dict, List, Sequence
+
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[str]], weights: Sequence[float], k: int = RRF_K) -> List[str]:
+    """Merge ranked id lists into one ranking by weighted reciprocal rank fusion.
+
+    Each id scores `weight / (k + rank)` in every ranking it appears in, with ranks starting at 1.
+    A larger `k` flattens the advantage of the top ranks, a larger weight favours that ranking.
+    """
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank)
+    # sorted is stable, so ties keep the order in which the ids were first ranked
+    return sorted(scores, key=lambda item_id: scores[item_id], reverse=True)
@@ -0,0 +1,78 @@
+from typing import Dict, List, Optional
+
+import structlog as logging
+
+from src.cache.query_embedding_cache import QueryEmbeddingCache
+from src.document.bm25_index import BM25Index
+from src.prompt.rank_fusion import RRF_K, reciprocal_rank_fusion
+
+logger = logging.get_logger(__name__)
+
+# the number of candidate chunks retrieved for packing into the prompt, in relevance order
+MAX_RETRIEVED_CHUNKS = 4
+# the number of candidates each retriever contributes to the fused ranking in hybrid retrieval
+HYBRID_CANDIDATES = 8
+
+
+class RetrievalService:
+    """Finds the document chunks relevant to a query.
+
+    Holds the document collection resolved once at startup and embeds queries through a cache, so
+    repeated queries skip the embedding model and Chroma only runs the nearest neighbour search.
+    With a keyword index, vector results are fused with BM25 matches by reciprocal rank fusion.
+    """
+
+    def __init__(
+        self,
+        collection,
+        query_embedding_cache: QueryEmbeddingCache,
+        lexical_index: Optional[BM25Index] = None,
+        rrf_k: int = RRF_K,
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0,
+    ):
+        self.collection = collection
+        self.query_embedding_cache = query_embedding_cache
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.vector_weight = vector_weight
+        self.lexical_weight = lexical_weight
+
+    def retrieve(self, query: str) -> List[str]:
+        """Return the contents of the most relevant chunks, best first."""
+        return self.retrieve_many([query])[0]
+
+    def retrieve_many(self, queries: List[str]) -> List[List[str]]:
+        """Retrieve the chunks for several queries with a single embedding call and a single Chroma query."""
+        # search the chroma db for document chunks that match the user queries
+        results = self.collection.query(
+            query_embeddings=self.query_embedding_cache.embed_many(queries),
+            n_results=MAX_RETRIEVED_CHUNKS if self.lexical_index is None else HYBRID_CANDIDATES,
+        )
+        logger.info(f"Retrieved matching documents from Chroma: {results}")
+        documents = results['documents']
+
+        if documents is None:
+            documents = [[] for _ in queries]
+        if self.lexical_index is None:
+            return documents
+        return [
+            self._fuse_with_lexical_matches(query, ids, query_documents)
+            for query, ids, query_documents in zip(queries, results['ids'], documents)
+        ]
+
+    def get_stats(self) -> Dict:
+        return {"query_embeddings": self.query_embedding_cache.get_stats()}
+
+    def _fuse_with_lexical_matches(self, query: str, ids: List[str], documents: List[str]) -> List[str]:
+        """Merge the vector db results with BM25 keyword matches, which catch exact terms such as names and codes."""
+        lexical_matches = self.lexical_index.search(query, HYBRID_CANDIDATES)
+        contents = dict(zip(ids, documents))
+        contents.update((match.id, match.content) for match in lexical_matches)
+
+        fused_ids = reciprocal_rank_fusion(
+            [ids, [match.id for match in lexical_matches]],
+            [self.vector_weight, self.lexical_weight],
+            k=self.rrf_k,
+        )
+        return [contents[chunk_id] for chunk_id in fused_ids[:MAX_RETRIEVED_CHUNKS]]
@@ -0,0 +1,96 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import structlog as logging
+
+logger = logging.get_logger(__name__)
+
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class ComponentStatus:
+    """The load progress of an app component."""
+
+    name: str
+    status: str = STATUS_LOADING
+    step: Optional[str] = None
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "status": self.status,
+            "step": self.step,
+            "error": self.error,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.started_at, 3),
+        }
+
+
+class ComponentLoader:
+    """Loads app components concurrently, each on its own background thread, and tracks their progress.
+
+    A component's load function receives a callback to report the step it is on. Startup takes as long
+    as the slowest component instead of the sum of all of them, and the app serves health checks while
+    the components load.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, ComponentStatus] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self, name: str, load: Callable[[Callable[[str], None]], None]):
+        component = ComponentStatus(name)
+        with self._lock:
+            self._components[name] = component
+        # daemon threads, so a shutdown during a long model load is not held up by it
+        thread = threading.Thread(target=self._run, args=(component, load), name=f"load-{name}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def join(self, timeout: Optional[float] = None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def get_status(self, name: str) -> Optional[str]:
+        with self._lock:
+            component = self._components.get(name)
+            return component.status if component is not None else None
+
+    @property
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(component.status == STATUS_READY for component in self._components.values())
+
+    @property
+    def has_failed(self) -> bool:
+        with self._lock:
+            return any(component.status == STATUS_FAILED for component in self._components.values())
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {name: component.to_dict() for name, component in self._components.items()}
+
+    def _run(self, component: ComponentStatus, load: Callable[[Callable[[str], None]], None]):
+        logger.info(f"Loading {component.name}")
+
+        def report_step(step: str):
+            logger.info(f"Loading {component.name}: {step}")
+            component.step = step
+
+        try:
+            load(report_step)
+            component.status = STATUS_READY
+            logger.info(f"Loaded {component.name} in {time.time() - component.started_at:.1f}s")
+        except Exception as e:
+            logger.error(f"Error loading {component.name}: {e}")
+            component.error = str(e)
+            component.status = STATUS_FAILED
+        finally:
+            component.finished_at = time.time()
@@ -0,0 +1,46 @@
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import List, Optional
+
+# a line of `python -X importtime` output, the module name is indented by its nesting depth
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+@dataclass
+class ImportTiming:
+    """The time spent importing a module, in microseconds, on its own and including the modules it imported."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(module: str = "src.main", cwd: Optional[str] = None) -> List[ImportTiming]:
+    """Import the module in a fresh interpreter with `-X importtime` and return the timing of every module imported.
+
+    Raises ImportError if the module cannot be imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=cwd, capture_output=True, text=True
+    )
+    timings = []
+    errors = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            errors.append(line)
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        timings.append(ImportTiming(name, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    if result.returncode != 0:
+        raise ImportError(f"Importing {module} failed:\n" + "\n".join(errors))
+    return timings
+
+
+def get_import_time_us(timings: List[ImportTiming], module: str) -> int:
+    """The cumulative import time of a module, 0 if it was already imported by the interpreter on startup."""
+    return next((timing.cumulative_us for timing in timings if timing.module == module), 0)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+import structlog as logging
+
+from src.config import ModelDownloadConfiguration
+
+if TYPE_CHECKING:
+    from src.model.huggingface_downloader import HuggingFaceDownloader
+
+logger = logging.get_logger(__name__)
+
+SNAPSHOT_FILE_NAME = "snapshot.json"
+SNAPSHOT_MODELS_DIRECTORY = "models"
+SNAPSHOT_VECTOR_DB_DIRECTORY = "vector_db"
+# the symlink in the output directory pointing at the most recently built snapshot
+CURRENT_SNAPSHOT_LINK = "current"
+
+
+@dataclass
+class SnapshotInfo:
+    version: str
+    created_at: float
+    model_link: str
+    model_sha256: str
+    corpus_version: str
+
+
+class Snapshot:
+    """A model store and a persisted vector db prepared ahead of time, e.g. when the container image is built.
+
+    Its version is derived from the model's sha256 and the corpus version, so snapshots of the same model
+    and documents share a version and replicas serving the same version serve identical indexes.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    @property
+    def models_path(self) -> Path:
+        return self.path / SNAPSHOT_MODELS_DIRECTORY
+
+    @property
+    def vector_db_path(self) -> Path:
+        return self.path / SNAPSHOT_VECTOR_DB_DIRECTORY
+
+    def load_info(self) -> SnapshotInfo:
+        """Read the snapshot's metadata. Raises FileNotFoundError if the directory is not a complete snapshot."""
+        with open(self.path / SNAPSHOT_FILE_NAME, "r") as file:
+            return SnapshotInfo(**json.load(file))
+
+
+def build_snapshot(
+    output_path: str,
+    model_config: ModelDownloadConfiguration,
+    documents_path: Optional[str] = None,
+    embedding_batch_size: int = 64,
+    embedding_workers: Optional[int] = None,
+    hugging_face_downloader: Optional["HuggingFaceDownloader"] = None,
+) -> Snapshot:
+    """Download the model and embed the documents into a new snapshot under `output_path`.
+
+    The snapshot is prepared in a staging directory and renamed to its version once complete, then the
+    `current` link is pointed at it. Building a snapshot of an unchanged model and corpus again keeps the
+    existing one.
+    """
+    # the build pulls in the downloader and chromadb, which the app itself only imports when loading
+    from src.document.bm25_index import BM25Index
+    from src.document.document_sourcer import DOCUMENTS_PATH, DocumentSourcer
+    from src.document.embedding_pipeline import EmbeddingPipeline, get_default_embedding_function
+    from src.model.huggingface_downloader import HuggingFaceDownloader
+    from src.model.model_downloader import ModelDownloader
+
+    output = Path(output_path)
+    staging = Snapshot(str(output / f".building-{os.getpid()}"))
+    shutil.rmtree(staging.path, ignore_errors=True)
+    staging.path.mkdir(parents=True)
+
+    logger.info(f"Downloading model {model_config.model_name} into {staging.models_path}")
+    model_downloader = ModelDownloader(
+        hugging_face_downloader or HuggingFaceDownloader(),
+        str(staging.models_path),
+        download_segments=model_config.download_segments,
+    )
+    model_downloader.download_model(model_config.download_link, model_config.folder_name)
+    stored_model = model_downloader.model_store.get(model_config.folder_name, model_config.quantization_model)
+
+    logger.info(f"Embedding documents into {staging.vector_db_path}")
+    document_sourcer = DocumentSourcer(
+        persist_path=str(staging.vector_db_path),
+        documents_path=documents_path or DOCUMENTS_PATH,
+        embedding_pipeline=EmbeddingPipeline(batch_size=embedding_batch_size, workers=embedding_workers),
+        # ship the keyword index too, so a replica serving the snapshot with hybrid search does not rebuild it
+        lexical_index=BM25Index(),
+    )
+    document_sourcer.get_preloaded_vector_database()
+    # fetch the query embedding model now, so serving queries from the snapshot needs no download
+    get_default_embedding_function()(["snapshot"])
+
+    corpus_version = document_sourcer.get_corpus_version()
+    version = hashlib.sha256(f"{stored_model.sha256}\0{corpus_version}".encode("utf-8")).hexdigest()[:16]
+    info = SnapshotInfo(version, time.time(), model_config.download_link, stored_model.sha256, corpus_version)
+    (staging.path / SNAPSHOT_FILE_NAME).write_text(json.dumps(asdict(info), indent=2))
+
+    snapshot = Snapshot(str(output / version))
+    if snapshot.path.exists():
+        logger.info(f"Snapshot {version} already exists, keeping it")
+        shutil.rmtree(staging.path)
+    else:
+        os.replace(staging.path, snapshot.path)
+
+    temporary_link = output / f"{CURRENT_SNAPSHOT_LINK}.tmp"
+    temporary_link.unlink(missing_ok=True)
+    temporary_link.symlink_to(version, target_is_directory=True)
+    os.replace(temporary_link, output / CURRENT_SNAPSHOT_LINK)
+    logger.info(f"Built snapshot {version} in {snapshot.path}")
+    return snapshot
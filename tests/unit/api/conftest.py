@@ -0,0 +1,29 @@
+import pytest
+from starlette.datastructures import State
+
+from src.dependencies import get_prompt_builder
+from src.main import app
+
+
+@pytest.fixture
+def app_state(mocker):
+    """The state of an app whose model and documents are loaded, with an empty response cache."""
+    state = State()
+    state.MODEL = mocker.Mock()
+    state.INGESTION = mocker.Mock()
+    state.CORPUS_VERSION = "v1"
+    state.RESPONSE_CACHE = mocker.Mock()
+    state.RESPONSE_CACHE.get_exact.return_value = None
+    state.RESPONSE_CACHE.get_similar.return_value = None
+    mocker.patch.object(app, "state", state)
+    return state
+
+
+@pytest.fixture
+def prompt_builder(mocker):
+    """A prompt builder using each query as its own prompt."""
+    builder = mocker.Mock()
+    builder.get_complete_prompt.side_effect = lambda query: query
+    builder.get_complete_prompts.side_effect = lambda queries: list(queries)
+    mocker.patch.dict(app.dependency_overrides, {get_prompt_builder: lambda: builder})
+    return builder
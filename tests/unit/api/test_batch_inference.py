@@ -0,0 +1,93 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from src.inference.inference_scheduler import InferenceScheduler, QueueFullError
+from src.main import BATCH_PRIORITY, app
+
+
+class EchoModel:
+    """Fake llama-cpp model answering with the prompt after `delay` seconds, failing for the prompt "fail"."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def __call__(self, prompt, max_tokens, temperature, stream=False):
+        time.sleep(self.delay)
+        if prompt == "fail":
+            raise RuntimeError("generation failed")
+        yield {"choices": [{"text": f"answer to {prompt}", "finish_reason": "stop"}]}
+
+    def tokenize(self, text):
+        return list(text)
+
+
+def test_batch_answers_every_query_in_order_and_reports_failed_ones(app_state, prompt_builder):
+    # Arrange
+    app_state.SCHEDULER = InferenceScheduler([EchoModel()], max_queue_size=4)
+    app_state.SCHEDULER.start()
+
+    # Act
+    try:
+        response = TestClient(app).post("/api/v1/inference/batch", json={"queries": ["a", "fail", "", "b"]})
+    finally:
+        app_state.SCHEDULER.stop()
+
+    # Assert
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {"index": 0, "query": "a", "response": "answer to a"},
+        {"index": 1, "query": "fail", "error": "Error generating response"},
+        {"index": 2, "query": "", "error": "Prompt cannot be empty"},
+        {"index": 3, "query": "b", "response": "answer to b"},
+    ]
+
+
+def test_batch_queries_do_not_wait_out_the_interactive_queue_timeout(app_state, prompt_builder):
+    # Arrange
+    app_state.SCHEDULER = InferenceScheduler([EchoModel(delay=0.02)], max_queue_size=64, default_timeout=0.05)
+    app_state.SCHEDULER.start()
+    queries = [f"query {index}" for index in range(20)]
+
+    # Act
+    try:
+        response = TestClient(app).post("/api/v1/inference/batch", json={"queries": queries})
+    finally:
+        app_state.SCHEDULER.stop()
+
+    # Assert
+    assert [result.get("response") for result in response.json()["results"]] == [
+        f"answer to {query}" for query in queries
+    ]
+
+
+def test_batch_retries_a_full_queue_at_the_clamped_batch_priority(mocker, app_state, prompt_builder):
+    # Arrange
+    completion = {"choices": [{"text": "answer", "finish_reason": "stop"}]}
+    app_state.SCHEDULER = mocker.Mock(concurrency=1)
+    app_state.SCHEDULER.complete = mocker.AsyncMock(side_effect=[QueueFullError("full"), completion])
+    app_state.SCHEDULER.get_retry_after_seconds.return_value = 0
+
+    # Act
+    response = TestClient(app).post("/api/v1/inference/batch", json={"queries": ["a"], "priority": 50})
+
+    # Assert
+    assert response.json()["results"] == [{"index": 0, "query": "a", "response": "answer"}]
+    assert app_state.SCHEDULER.complete.await_count == 2
+    assert {call.kwargs["priority"] for call in app_state.SCHEDULER.complete.await_args_list} == {BATCH_PRIORITY}
+
+
+def test_batch_stops_retrying_a_full_queue_once_its_timeout_passed(mocker, app_state, prompt_builder):
+    # Arrange
+    app_state.SCHEDULER = mocker.Mock(concurrency=1)
+    app_state.SCHEDULER.complete = mocker.AsyncMock(side_effect=QueueFullError("full"))
+    app_state.SCHEDULER.get_retry_after_seconds.return_value = 1
+
+    # Act
+    started_at = time.monotonic()
+    response = TestClient(app).post("/api/v1/inference/batch", json={"queries": ["a"], "timeout_seconds": 0.5})
+
+    # Assert
+    assert response.json()["results"] == [{"index": 0, "query": "a", "error": "Inference queue is full"}]
+    assert time.monotonic() - started_at < 1
+    app_state.SCHEDULER.complete.assert_awaited_once()
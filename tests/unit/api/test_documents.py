@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import app
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setenv("MODEL_ADMIN_TOKEN", "secret")
+    return "secret"
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("POST", "/api/v1/documents", {"document_id": "a.txt", "content": "text"}),
+    ("DELETE", "/api/v1/documents/a.txt", None),
+])
+def test_document_changes_require_the_admin_token(app_state, admin_token, method, path, body):
+    # Arrange
+    for submit in (app_state.INGESTION.submit_document, app_state.INGESTION.delete_document):
+        submit.return_value.to_dict.return_value = {"id": "job"}
+
+    # Act
+    without_token = TestClient(app).request(method, path, json=body)
+    wrong_token = TestClient(app).request(method, path, json=body, headers={"Authorization": "Bearer wrong"})
+    with_token = TestClient(app).request(method, path, json=body, headers={"Authorization": f"Bearer {admin_token}"})
+
+    # Assert
+    assert without_token.status_code == 401
+    assert wrong_token.status_code == 401
+    assert with_token.status_code == 202
+
+
+def test_document_changes_are_disabled_without_an_admin_token(app_state, monkeypatch):
+    # Arrange
+    monkeypatch.delenv("MODEL_ADMIN_TOKEN", raising=False)
+
+    # Act
+    response = TestClient(app).post("/api/v1/documents", json={"document_id": "a.txt", "content": "text"})
+
+    # Assert
+    assert response.status_code == 403
+    app_state.INGESTION.submit_document.assert_not_called()
@@ -0,0 +1,18 @@
+from src.main import app, load_model
+
+
+def test_load_model_counts_prompt_tokens_on_a_vocabulary_only_copy(mocker, tmp_path, app_state):
+    # Arrange
+    model_file = tmp_path / "model.bin"
+    model_file.write_bytes(b"\0" * 100)
+    retriever = mocker.patch("src.main.get_retriever_on_app_start").return_value
+    retriever.install_model.return_value = str(model_file)
+    retriever.get_model.side_effect = lambda config: mocker.Mock(vocab_only=config.model_kwargs.get("vocab_only"))
+
+    # Act
+    load_model(lambda step: None)
+    app.state.SCHEDULER.stop()
+
+    # Assert
+    assert app.state.MODEL.vocab_only
+    assert not any(model.vocab_only for model in app.state.SCHEDULER.models)
@@ -0,0 +1,64 @@
+from fastapi.testclient import TestClient
+
+from src.inference.inference_scheduler import DEFAULT_PRIORITY
+from src.main import BATCH_PRIORITY, app, get_scheduling_priority
+
+
+def _completion(text="answer"):
+    return {"choices": [{"text": text, "finish_reason": "stop"}]}
+
+
+def test_scheduling_priority_clamps_a_priority_above_the_ceiling_and_keeps_lower_ones():
+    # Act
+    raised = get_scheduling_priority(DEFAULT_PRIORITY + 100)
+    lowered = get_scheduling_priority(DEFAULT_PRIORITY - 5)
+    raised_batch = get_scheduling_priority(DEFAULT_PRIORITY, BATCH_PRIORITY)
+
+    # Assert
+    assert raised == DEFAULT_PRIORITY
+    assert lowered == DEFAULT_PRIORITY - 5
+    assert raised_batch == BATCH_PRIORITY
+
+
+def test_inference_schedules_a_raised_priority_at_the_default_priority(mocker, app_state, prompt_builder):
+    # Arrange
+    app_state.SCHEDULER = mocker.Mock()
+    app_state.SCHEDULER.complete = mocker.AsyncMock(return_value=_completion())
+
+    # Act
+    response = TestClient(app).post("/api/v1/inference", json={"query": "a", "priority": 100})
+
+    # Assert
+    assert response.status_code == 200
+    assert app_state.SCHEDULER.complete.await_args.kwargs["priority"] == DEFAULT_PRIORITY
+
+
+def test_stream_schedules_a_raised_priority_at_the_default_priority(mocker, app_state, prompt_builder):
+    # Arrange
+    async def events():
+        yield {"type": "token", "text": "answer"}
+        yield {"type": "done", "finish_reason": "stop"}
+
+    app_state.SCHEDULER = mocker.Mock()
+    app_state.SCHEDULER.stream.return_value = events()
+
+    # Act
+    response = TestClient(app).post("/api/v1/inference/stream", json={"query": "a", "priority": 100})
+
+    # Assert
+    assert response.status_code == 200
+    prompt, max_tokens, temperature, priority, timeout = app_state.SCHEDULER.stream.call_args.args
+    assert priority == DEFAULT_PRIORITY
+
+
+def test_batch_schedules_a_raised_priority_at_the_batch_priority(mocker, app_state, prompt_builder):
+    # Arrange
+    app_state.SCHEDULER = mocker.Mock(concurrency=1)
+    app_state.SCHEDULER.complete = mocker.AsyncMock(return_value=_completion())
+
+    # Act
+    response = TestClient(app).post("/api/v1/inference/batch", json={"queries": ["a", "b"], "priority": 100})
+
+    # Assert
+    assert response.status_code == 200
+    assert {call.kwargs["priority"] for call in app_state.SCHEDULER.complete.await_args_list} == {BATCH_PRIORITY}
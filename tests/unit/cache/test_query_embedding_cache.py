@@ -0,0 +1,31 @@
+from src.cache.query_embedding_cache import QueryEmbeddingCache
+
+
+def test_embed_many_only_embeds_uncached_queries_in_one_batch(mocker):
+    # Arrange
+    mock_embedding_function = mocker.Mock(side_effect=lambda texts: [[float(len(text))] for text in texts])
+    cache = QueryEmbeddingCache(mock_embedding_function)
+    cache.embed("cached")
+
+    # Act
+    embeddings = cache.embed_many(["cached", "new", "newer", "new"])
+
+    # Assert
+    assert embeddings == [[6.0], [3.0], [5.0], [3.0]]
+    assert mock_embedding_function.call_args_list[-1].args == (["new", "newer"],)
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_cache_evicts_the_least_recently_used_query_embeddings():
+    # Arrange
+    cache = QueryEmbeddingCache(lambda texts: [[0.0] for _ in texts], max_entries=2)
+    cache.embed("first")
+    cache.embed("second")
+    cache.embed("first")
+
+    # Act
+    cache.embed("third")
+
+    # Assert
+    assert list(cache._entries) == ["first", "third"]
+    assert cache.get_stats()["entries"] == 2
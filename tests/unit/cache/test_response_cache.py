@@ -0,0 +1,89 @@
+from src.cache.response_cache import CacheEntry, ResponseCache, SqliteCacheBackend
+
+
+def _key(query, corpus_version="v1"):
+    return ResponseCache.make_key(query, 1028, 0.1, "model/file.bin", corpus_version)
+
+
+def test_make_key_normalizes_the_query_and_includes_the_corpus_version():
+    # Act & Assert
+    assert _key("Who is  Grace Hopper?") == _key("  who is grace hopper? ")
+    assert _key("Who is Grace Hopper?") != _key("Who is Grace Hopper?", corpus_version="v2")
+
+
+def test_cache_returns_hits_and_counts_misses():
+    # Arrange
+    cache = ResponseCache()
+    cache.put(_key("question"), "answer")
+
+    # Act
+    hit = cache.get(_key("question"))
+    miss = cache.get(_key("other question"))
+
+    # Assert
+    assert hit == "answer"
+    assert miss is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used_entries_by_count_and_bytes():
+    # Arrange
+    cache = ResponseCache(max_entries=2, max_bytes=10)
+    cache.put("a", "1234")
+    cache.put("b", "1234")
+    cache.get("a")
+
+    # Act
+    cache.put("c", "1234")
+    cache.put("d", "12345678")
+
+    # Assert
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") is None
+    assert cache.get("d") == "12345678"
+
+
+def test_cache_expires_entries_after_the_ttl(mocker):
+    # Arrange
+    mock_time = mocker.patch("src.cache.response_cache.time.time", return_value=1000.0)
+    cache = ResponseCache(ttl_seconds=60)
+    cache.put("key", "answer")
+
+    # Act
+    mock_time.return_value = 1061.0
+
+    # Assert
+    assert cache.get("key") is None
+
+
+def test_cache_reads_entries_back_from_the_sqlite_backend(tmp_path):
+    # Arrange
+    path = str(tmp_path / "cache.sqlite")
+    ResponseCache(backend=SqliteCacheBackend(path, max_entries=10)).put("key", "answer")
+
+    # Act
+    restarted_cache = ResponseCache(backend=SqliteCacheBackend(path, max_entries=10))
+
+    # Assert
+    assert restarted_cache.get("key") == "answer"
+
+
+def test_sqlite_backend_hits_do_not_write_and_are_kept_by_the_next_eviction(tmp_path):
+    # Arrange
+    backend = SqliteCacheBackend(str(tmp_path / "cache.sqlite"), max_entries=2)
+    for key in ("first", "second"):
+        backend.put(key, CacheEntry(response=key, created_at=0.0))
+    changes_before_hit = backend._connection.total_changes
+
+    # Act
+    hit = backend.get("first")
+    changes_after_hit = backend._connection.total_changes
+    backend.put("third", CacheEntry(response="third", created_at=0.0))
+
+    # Assert
+    assert hit.response == "first"
+    assert changes_after_hit == changes_before_hit
+    assert backend.get("first") is not None
+    assert backend.get("second") is None
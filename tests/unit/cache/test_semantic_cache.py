@@ -0,0 +1,97 @@
+from src.cache.layered_response_cache import LayeredResponseCache
+from src.cache.query_embedding_cache import QueryEmbeddingCache
+from src.cache.response_cache import ResponseCache
+from src.cache.semantic_cache import SEMANTIC_CACHE_COLLECTION_NAME, SemanticCache
+
+
+def _query_results(distance, response="cached answer"):
+    return {"ids": [["id"]], "distances": [[distance]], "metadatas": [[{"response": response}]]}
+
+
+def test_semantic_cache_returns_answers_for_similar_enough_queries(mocker):
+    # Arrange
+    mock_client = mocker.Mock()
+    mock_client.get_collection.return_value.metadata = {"corpus_version": "v1"}
+    collection = mock_client.get_collection.return_value
+    collection.count.return_value = 1
+    cache = SemanticCache(mock_client, "v1", similarity_threshold=0.9)
+
+    # Act
+    collection.query.return_value = _query_results(distance=0.05)
+    hit = cache.lookup("who was grace hopper", "generation-key")
+    collection.query.return_value = _query_results(distance=0.3)
+    miss = cache.lookup("what is cobol", "generation-key")
+
+    # Assert
+    assert hit == "cached answer"
+    assert miss is None
+    assert collection.query.call_args.kwargs["where"] == {"generation_key": "generation-key"}
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_semantic_cache_is_cleared_when_the_corpus_version_changes(mocker):
+    # Arrange
+    mock_client = mocker.Mock()
+    mock_client.get_collection.return_value.metadata = {"corpus_version": "v1"}
+
+    # Act
+    cache = SemanticCache(mock_client, "v2")
+
+    # Assert
+    mock_client.delete_collection.assert_called_once_with(SEMANTIC_CACHE_COLLECTION_NAME)
+    mock_client.create_collection.assert_called_once_with(
+        SEMANTIC_CACHE_COLLECTION_NAME, metadata={"hnsw:space": "cosine", "corpus_version": "v2"}
+    )
+    assert cache.collection == mock_client.create_collection.return_value
+
+
+def test_layered_cache_drops_answers_when_the_corpus_version_changes(mocker):
+    # Arrange
+    exact_cache = ResponseCache()
+    mock_semantic_cache = mocker.Mock()
+    cache = LayeredResponseCache(10, 0.1, "model", "v1", exact_cache=exact_cache, semantic_cache=mock_semantic_cache)
+    cache.store("query", "answer")
+
+    # Act
+    cache.set_corpus_version("v2")
+
+    # Assert
+    assert cache.get_exact("query") is None
+    mock_semantic_cache.invalidate.assert_called_once_with("v2")
+
+
+def test_layered_cache_drops_answers_generated_while_the_corpus_changed(mocker):
+    # Arrange
+    mock_client = mocker.Mock()
+    mock_client.get_collection.return_value.metadata = {"corpus_version": "v1"}
+    semantic_cache = SemanticCache(mock_client, "v1")
+    cache = LayeredResponseCache(10, 0.1, "model", "v1", exact_cache=ResponseCache(), semantic_cache=semantic_cache)
+    corpus_version_at_retrieval = cache.corpus_version
+
+    # Act
+    cache.set_corpus_version("v2")
+    cache.store("query", "stale answer", corpus_version_at_retrieval)
+
+    # Assert
+    assert cache.get_exact("query") is None
+    semantic_cache.collection.upsert.assert_not_called()
+
+
+def test_semantic_cache_reuses_query_embeddings_from_the_shared_cache(mocker):
+    # Arrange
+    mock_client = mocker.Mock()
+    mock_client.get_collection.return_value.metadata = {"corpus_version": "v1"}
+    collection = mock_client.get_collection.return_value
+    collection.count.return_value = 1
+    collection.query.return_value = _query_results(distance=0.5)
+    mock_embedding_function = mocker.Mock(side_effect=lambda texts: [[1.0] for _ in texts])
+    cache = SemanticCache(mock_client, "v1", query_embedding_cache=QueryEmbeddingCache(mock_embedding_function))
+
+    # Act
+    cache.lookup("what is cobol", "generation-key")
+    cache.store("what is cobol", "an answer", "generation-key")
+
+    # Assert
+    mock_embedding_function.assert_called_once_with(["what is cobol"])
+    assert collection.query.call_args.kwargs["query_embeddings"] == [[1.0]]
+    assert collection.upsert.call_args.kwargs["embeddings"] == [[1.0]]
@@ -0,0 +1,76 @@
+from src.document.bm25_index import BM25Index
+from src.document.chroma_documents import DocumentChunk
+
+
+def _chunk(chunk_id, content, source_file="guide.txt"):
+    return DocumentChunk(content=content, metadata={"source_file": source_file}, id=chunk_id)
+
+
+def test_search_ranks_chunks_with_rare_exact_terms_first():
+    # Arrange
+    index = BM25Index()
+    index.add([
+        _chunk("setup", "install the service and configure the service"),
+        _chunk("codes", "error code XJ-900 means the service is out of memory"),
+        _chunk("other", "the service answers questions about the documents"),
+    ])
+
+    # Act
+    matches = index.search("What does XJ-900 mean?", 2)
+
+    # Assert
+    assert matches[0].id == "codes"
+    assert matches[0].content.startswith("error code XJ-900")
+    assert all(match.score > 0 for match in matches)
+
+
+def test_search_skips_removed_documents_and_replaced_chunks():
+    # Arrange
+    index = BM25Index()
+    index.add([_chunk("kept", "grace hopper compiler", "kept.txt"), _chunk("gone", "grace hopper cobol", "gone.txt")])
+    index.add([_chunk("kept", "grace hopper navy", "kept.txt")])
+
+    # Act
+    index.remove_source("gone.txt")
+
+    # Assert
+    assert len(index) == 1
+    assert index.search("cobol", 5) == []
+    assert index.search("compiler", 5) == []
+    assert [match.id for match in index.search("hopper navy", 5)] == ["kept"]
+
+
+def test_index_stays_searchable_after_compacting_removed_chunks():
+    # Arrange
+    index = BM25Index()
+    index.add(_chunk(str(number), f"chunk number {number}", f"{number}.txt") for number in range(10))
+
+    # Act
+    for number in range(8):
+        index.remove_source(f"{number}.txt")
+
+    # Assert
+    assert len(index) == 2
+    assert [match.id for match in index.search("9", 5)] == ["9"]
+    assert {match.id for match in index.search("chunk", 5)} == {"8", "9"}
+
+
+def test_saved_index_is_only_loaded_for_the_corpus_version_it_covers(tmp_path):
+    # Arrange
+    index = BM25Index()
+    index.add([_chunk("codes", "error code XJ-900"), _chunk("stale", "removed chunk", source_file="old.txt")])
+    index.remove_source("old.txt")
+    path = str(tmp_path / "keyword-index.pickle")
+
+    # Act
+    index.save(path, "v1")
+    loaded, stale = BM25Index(), BM25Index()
+    loaded_current = loaded.load(path, "v1")
+    loaded_stale = stale.load(path, "v2")
+
+    # Assert
+    assert loaded_current is True
+    assert [match.id for match in loaded.search("XJ-900", 5)] == ["codes"]
+    assert len(loaded) == 1
+    assert loaded_stale is False
+    assert len(stale) == 0
@@ -0,0 +1,114 @@
+import pytest
+
+from src.document.document_ingestion import STATUS_FAILED, STATUS_SUCCEEDED, DocumentIngestionService, \
+    DocumentTooLargeError, IngestionQueueFullError, InvalidDocumentIdError
+from src.document.document_sourcer import DocumentSourcer
+from src.document.embedding_pipeline import EmbeddingPipeline
+
+
+def length_embedding_function():
+    return lambda texts: [[float(len(text))] for text in texts]
+
+
+def test_add_document_upserts_new_chunks_then_deletes_stale_ones(tmp_path, mocker):
+    # Arrange
+    embedding_pipeline = EmbeddingPipeline(workers=1, embedding_function_factory=length_embedding_function)
+    document_sourcer = DocumentSourcer(documents_path=str(tmp_path), embedding_pipeline=embedding_pipeline)
+    mock_collection = mocker.Mock()
+    mock_collection.get.return_value = {"ids": ["stale-chunk"]}
+    calls = []
+    mock_collection.upsert.side_effect = lambda **kwargs: calls.append("upsert")
+    mock_collection.delete.side_effect = lambda **kwargs: calls.append("delete")
+
+    # Act
+    chunks = document_sourcer.add_document(mock_collection, "nested/guide.txt", "how to use the service")
+
+    # Assert
+    assert (tmp_path / "nested" / "guide.txt").read_text() == "how to use the service"
+    assert chunks == 1
+    assert calls == ["upsert", "delete"]
+    assert mock_collection.upsert.call_args.kwargs["metadatas"] == [{"source_file": "nested/guide.txt"}]
+    assert mock_collection.delete.call_args.kwargs == {"ids": ["stale-chunk"]}
+    assert list(document_sourcer.manifest.documents) == ["nested/guide.txt"]
+
+
+def test_delete_document_reports_missing_documents(tmp_path, mocker):
+    # Arrange
+    document_sourcer = DocumentSourcer(documents_path=str(tmp_path), embedding_pipeline=mocker.Mock())
+    mock_collection = mocker.Mock()
+
+    # Act
+    deleted = document_sourcer.delete_document(mock_collection, "missing.txt")
+
+    # Assert
+    assert deleted is False
+    mock_collection.delete.assert_not_called()
+
+
+def test_service_applies_jobs_in_the_background_and_reports_the_new_corpus_version(mocker):
+    # Arrange
+    mock_document_sourcer = mocker.Mock()
+    mock_document_sourcer.add_document.return_value = 3
+    mock_document_sourcer.get_corpus_version.return_value = "v2"
+    mock_on_corpus_changed = mocker.Mock()
+    service = DocumentIngestionService(mock_document_sourcer, mocker.Mock(), on_corpus_changed=mock_on_corpus_changed)
+    service.start()
+
+    # Act
+    job = service.submit_document("./guide.txt", "content")
+    service.stop(timeout=5)
+
+    # Assert
+    assert service.get_job(job.id).to_dict()["status"] == STATUS_SUCCEEDED
+    assert job.document_id == "guide.txt"
+    assert job.chunks == 3
+    assert job.content is None
+    mock_on_corpus_changed.assert_called_once_with("v2")
+
+
+def test_service_marks_failed_jobs_without_changing_the_corpus_version(mocker):
+    # Arrange
+    mock_document_sourcer = mocker.Mock()
+    mock_document_sourcer.delete_document.return_value = False
+    mock_on_corpus_changed = mocker.Mock()
+    service = DocumentIngestionService(mock_document_sourcer, mocker.Mock(), on_corpus_changed=mock_on_corpus_changed)
+    service.start()
+
+    # Act
+    job = service.delete_document("missing.txt")
+    service.stop(timeout=5)
+
+    # Assert
+    assert job.status == STATUS_FAILED
+    assert "does not exist" in job.error
+    mock_on_corpus_changed.assert_not_called()
+
+
+@pytest.mark.parametrize("document_id", ["", "../outside.txt", "/etc/passwd", "nested/../../outside.txt"])
+def test_service_rejects_document_ids_outside_the_documents_directory(mocker, document_id):
+    # Arrange
+    service = DocumentIngestionService(mocker.Mock(), mocker.Mock())
+
+    # Act & Assert
+    with pytest.raises(InvalidDocumentIdError):
+        service.submit_document(document_id, "content")
+
+
+def test_service_rejects_jobs_when_the_queue_is_full(mocker):
+    # Arrange
+    service = DocumentIngestionService(mocker.Mock(), mocker.Mock(), max_pending_jobs=1)
+    service.submit_document("first.txt", "content")
+
+    # Act & Assert
+    with pytest.raises(IngestionQueueFullError):
+        service.submit_document("second.txt", "content")
+
+
+def test_service_rejects_documents_larger_than_the_limit(mocker):
+    # Arrange
+    service = DocumentIngestionService(mocker.Mock(), mocker.Mock(), max_document_bytes=4)
+
+    # Act & Assert
+    with pytest.raises(DocumentTooLargeError):
+        service.submit_document("large.txt", "ééé")
+    assert service.submit_document("small.txt", "éé").document_id == "small.txt"
@@ -0,0 +1,70 @@
+from src.document.document_loader import DocumentLoader
+
+
+def _write_documents(path, documents):
+    for file_name, content in documents.items():
+        (path / file_name).parent.mkdir(parents=True, exist_ok=True)
+        (path / file_name).write_text(content)
+
+
+def test_get_file_names_walks_the_documents_tree(tmp_path):
+    # Arrange
+    _write_documents(tmp_path, {"b.txt": "b", "a.txt": "a", "nested/deeper/c.txt": "c"})
+    document_loader = DocumentLoader(str(tmp_path))
+
+    # Act
+    file_names = document_loader.get_file_names()
+
+    # Assert
+    assert file_names == ["a.txt", "b.txt", "nested/deeper/c.txt"]
+
+
+def test_get_file_names_skips_temporary_files_left_by_an_interrupted_upload(tmp_path):
+    # Arrange
+    _write_documents(tmp_path, {"a.txt": "a", "nested/b.txt.tmp": "partial"})
+    document_loader = DocumentLoader(str(tmp_path))
+
+    # Act
+    file_names = document_loader.get_file_names()
+
+    # Assert
+    assert file_names == ["a.txt"]
+
+
+def test_iter_chunks_yields_stable_ids_tagged_with_the_source_file(tmp_path):
+    # Arrange
+    _write_documents(tmp_path, {"document.txt": "repeated words " * 100})
+
+    # Act
+    first_chunks = list(DocumentLoader(str(tmp_path), chunk_size=50).iter_chunks(["document.txt"]))
+    second_chunks = list(DocumentLoader(str(tmp_path), chunk_size=50).iter_chunks(["document.txt"]))
+
+    # Assert
+    assert [chunk.id for chunk in first_chunks] == [chunk.id for chunk in second_chunks]
+    assert len({chunk.id for chunk in first_chunks}) == len(first_chunks)
+    assert all(chunk.metadata == {"source_file": "document.txt"} for chunk in first_chunks)
+
+
+def test_iter_chunks_reads_in_small_blocks_without_losing_or_splitting_words(tmp_path):
+    # Arrange
+    words = [f"word{index}" for index in range(500)]
+    _write_documents(tmp_path, {"document.txt": "\n".join(" ".join(words[i:i + 7]) for i in range(0, 500, 7))})
+    document_loader = DocumentLoader(str(tmp_path), chunk_size=60, chunk_overlap=0, read_block_size=64)
+
+    # Act
+    chunks = list(document_loader.iter_chunks(["document.txt"]))
+
+    # Assert
+    assert " ".join(chunk.content for chunk in chunks).split() == words
+    assert all(len(chunk.content) <= 60 for chunk in chunks)
+
+
+def test_iter_chunks_keeps_a_file_smaller_than_a_block_in_one_piece(tmp_path):
+    # Arrange
+    _write_documents(tmp_path, {"document.txt": "a short document"})
+
+    # Act
+    chunks = list(DocumentLoader(str(tmp_path)).iter_chunks(["document.txt"]))
+
+    # Assert
+    assert [chunk.content for chunk in chunks] == ["a short document"]
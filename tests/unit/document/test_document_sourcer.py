@@ -0,0 +1,117 @@
+from src.document.bm25_index import BM25Index
+from src.document.chroma_documents import DocumentChunk
+from src.document.document_manifest import DocumentFingerprint, DocumentManifest, fingerprint_file
+from src.document.document_sourcer import DocumentSourcer
+
+
+def _write_documents(path, documents):
+    for file_name, content in documents.items():
+        (path / file_name).write_text(content)
+
+
+def test_sync_collection_only_reembeds_changed_documents_and_deletes_removed_ones(tmp_path, mocker):
+    # Arrange
+    _write_documents(tmp_path, {"unchanged.txt": "same", "changed.txt": "new", "added.txt": "added"})
+    previous_manifest = DocumentManifest({
+        "unchanged.txt": fingerprint_file(str(tmp_path / "unchanged.txt")),
+        "changed.txt": fingerprint_file(str(tmp_path / "unchanged.txt")),
+        "removed.txt": fingerprint_file(str(tmp_path / "unchanged.txt")),
+    })
+    mock_collection = mocker.Mock()
+    mock_embedding_pipeline = mocker.Mock()
+    document_sourcer = DocumentSourcer(documents_path=str(tmp_path), embedding_pipeline=mock_embedding_pipeline)
+    mock_iter_chunks = mocker.patch.object(
+        document_sourcer.document_loader, "iter_chunks", return_value=iter([DocumentChunk("chunk", {}, "id")])
+    )
+
+    # Act
+    manifest = document_sourcer._sync_collection(mock_collection, previous_manifest)
+
+    # Assert
+    mock_iter_chunks.assert_called_once_with(["added.txt", "changed.txt"])
+    deleted = [call.kwargs["where"]["source_file"] for call in mock_collection.delete.call_args_list]
+    assert deleted == ["removed.txt", "added.txt", "changed.txt"]
+    added_collection, added_chunks = mock_embedding_pipeline.add.call_args.args
+    assert added_collection == mock_collection
+    assert [chunk.id for chunk in added_chunks] == ["id"]
+    assert sorted(manifest.documents) == ["added.txt", "changed.txt", "unchanged.txt"]
+
+
+def test_sync_collection_does_not_touch_the_collection_for_an_unchanged_corpus(tmp_path, mocker):
+    # Arrange
+    _write_documents(tmp_path, {"document.txt": "content"})
+    previous_manifest = DocumentManifest({"document.txt": fingerprint_file(str(tmp_path / "document.txt"))})
+    mock_collection = mocker.Mock()
+    mock_embedding_pipeline = mocker.Mock()
+    document_sourcer = DocumentSourcer(documents_path=str(tmp_path), embedding_pipeline=mock_embedding_pipeline)
+
+    # Act
+    document_sourcer._sync_collection(mock_collection, previous_manifest)
+
+    # Assert
+    mock_collection.delete.assert_not_called()
+    mock_embedding_pipeline.add.assert_not_called()
+
+
+def test_manifest_round_trips_through_disk(tmp_path):
+    # Arrange
+    (tmp_path / "document.txt").write_text("content")
+    manifest = DocumentManifest({"document.txt": fingerprint_file(str(tmp_path / "document.txt"))})
+
+    # Act
+    manifest.save(str(tmp_path))
+    loaded = DocumentManifest.load(str(tmp_path))
+
+    # Assert
+    assert loaded.documents == manifest.documents
+    assert loaded.get_corpus_version() == manifest.get_corpus_version()
+
+
+def test_read_only_vector_database_is_opened_without_syncing_or_embedding_documents(tmp_path, mocker):
+    # Arrange
+    (tmp_path / "document.txt").write_text("content")
+    manifest = DocumentManifest({"document.txt": fingerprint_file(str(tmp_path / "document.txt"))})
+    manifest.save(str(tmp_path))
+    mock_client = mocker.patch("chromadb.PersistentClient").return_value
+    mock_embedding_pipeline = mocker.Mock()
+    document_sourcer = DocumentSourcer(persist_path=str(tmp_path), documents_path=str(tmp_path / "missing"),
+                                       embedding_pipeline=mock_embedding_pipeline, read_only=True)
+
+    # Act
+    client = document_sourcer.get_preloaded_vector_database()
+
+    # Assert
+    assert client == mock_client
+    mock_client.get_collection.assert_called_once_with("all-documents")
+    mock_client.get_collection.return_value.delete.assert_not_called()
+    mock_embedding_pipeline.add.assert_not_called()
+    assert document_sourcer.get_corpus_version() == manifest.get_corpus_version()
+
+
+def test_keyword_index_is_loaded_from_disk_and_only_rebuilt_when_the_corpus_changes(tmp_path, mocker):
+    # Arrange
+    manifest = DocumentManifest({"document.txt": DocumentFingerprint(sha256="a", size=1, mtime_ns=1)})
+    mock_collection = mocker.Mock()
+    mock_collection.get.side_effect = [
+        {"ids": ["id"], "documents": ["error code XJ-900"], "metadatas": [{"source_file": "document.txt"}]},
+        {"ids": [], "documents": [], "metadatas": []},
+    ]
+    document_sourcer = DocumentSourcer(persist_path=str(tmp_path), lexical_index=BM25Index())
+    document_sourcer.manifest = manifest
+    document_sourcer._load_lexical_index(mock_collection)
+    restarted = DocumentSourcer(persist_path=str(tmp_path), lexical_index=BM25Index())
+    restarted.manifest = manifest
+    changed = DocumentSourcer(persist_path=str(tmp_path), lexical_index=BM25Index())
+    changed.manifest = DocumentManifest({"document.txt": DocumentFingerprint(sha256="b", size=1, mtime_ns=1)})
+    mock_changed_collection = mocker.Mock()
+    mock_changed_collection.get.return_value = {"ids": [], "documents": [], "metadatas": []}
+
+    # Act
+    restarted._load_lexical_index(mock_collection)
+    changed._load_lexical_index(mock_changed_collection)
+
+    # Assert
+    assert mock_collection.get.call_count == 2
+    assert [match.id for match in restarted.lexical_index.search("XJ-900", 5)] == ["id"]
+    mock_changed_collection.get.assert_called_once()
+    assert len(changed.lexical_index) == 0
@@ -0,0 +1,120 @@
+import sys
+import types
+
+import pytest
+
+from src.document.chroma_documents import DocumentChunk
+from src.document.embedding_pipeline import EmbeddingPipeline, _limit_onnx_threads
+
+
+def length_embedding_function():
+    return lambda texts: [[float(len(text))] for text in texts]
+
+
+def _chunks(count):
+    return (DocumentChunk(content="x" * index, metadata={"source_file": "file"}, id=str(index)) for index in range(count))
+
+
+def test_pipeline_adds_chunks_in_batches_with_their_embeddings(mocker):
+    # Arrange
+    mock_collection = mocker.Mock()
+    pipeline = EmbeddingPipeline(batch_size=2, workers=1, embedding_function_factory=length_embedding_function)
+
+    # Act
+    stats = pipeline.add(mock_collection, _chunks(5))
+
+    # Assert
+    assert stats["chunks"] == 5
+    assert [len(call.kwargs["ids"]) for call in mock_collection.add.call_args_list] == [2, 2, 1]
+    first_batch = mock_collection.add.call_args_list[0].kwargs
+    assert first_batch["embeddings"] == [[0.0], [1.0]]
+    assert first_batch["documents"] == ["", "x"]
+
+
+def test_pipeline_embeds_batches_on_a_process_pool(mocker):
+    # Arrange
+    mock_collection = mocker.Mock()
+    pipeline = EmbeddingPipeline(batch_size=3, workers=2, embedding_function_factory=length_embedding_function)
+
+    # Act
+    stats = pipeline.add(mock_collection, _chunks(10))
+
+    # Assert
+    added = {}
+    for call in mock_collection.add.call_args_list:
+        added.update(zip(call.kwargs["ids"], call.kwargs["embeddings"]))
+    assert stats["chunks"] == 10
+    assert added == {str(index): [float(index)] for index in range(10)}
+
+
+def test_pipeline_embeds_in_process_when_there_are_fewer_batches_than_workers(mocker):
+    # Arrange
+    mock_collection = mocker.Mock()
+    mock_executor = mocker.patch("src.document.embedding_pipeline.ProcessPoolExecutor")
+    pipeline = EmbeddingPipeline(batch_size=3, workers=4, embedding_function_factory=length_embedding_function)
+
+    # Act
+    stats = pipeline.add(mock_collection, _chunks(7))
+
+    # Assert
+    mock_executor.assert_not_called()
+    assert stats["chunks"] == 7
+    assert [len(call.kwargs["ids"]) for call in mock_collection.add.call_args_list] == [3, 3, 1]
+
+
+def test_pipeline_defaults_to_a_worker_per_core_the_process_may_run_on(mocker):
+    # Arrange
+    mocker.patch("os.sched_getaffinity", return_value={2, 3}, create=True)
+    mocker.patch("os.cpu_count", return_value=64)
+
+    # Act
+    pipeline = EmbeddingPipeline()
+
+    # Assert
+    assert pipeline.workers == 2
+
+
+class FakeSessionOptions:
+    def __init__(self):
+        self.intra_op_num_threads = 0
+        self.inter_op_num_threads = 0
+        self.log_severity_level = 2
+
+
+def test_onnx_sessions_created_like_chroma_does_are_limited_to_the_worker_threads(mocker):
+    # Arrange
+    mock_session_class = mocker.Mock()
+    fake_onnxruntime = types.ModuleType("onnxruntime")
+    fake_onnxruntime.InferenceSession = mock_session_class
+    fake_onnxruntime.SessionOptions = FakeSessionOptions
+    mocker.patch.dict(sys.modules, {"onnxruntime": fake_onnxruntime})
+    chroma_options = FakeSessionOptions()
+    chroma_options.log_severity_level = 3
+
+    # Act
+    _limit_onnx_threads(2)
+    fake_onnxruntime.InferenceSession("model.onnx", providers=["CPUExecutionProvider"], sess_options=chroma_options)
+    fake_onnxruntime.InferenceSession("model.onnx")
+
+    # Assert
+    (first_path, first_options), first_kwargs = mock_session_class.call_args_list[0]
+    assert first_path == "model.onnx"
+    assert first_options is chroma_options
+    assert first_kwargs == {"providers": ["CPUExecutionProvider"]}
+    assert (chroma_options.intra_op_num_threads, chroma_options.inter_op_num_threads) == (2, 1)
+    assert chroma_options.log_severity_level == 3
+    (_, default_options), _ = mock_session_class.call_args_list[1]
+    assert default_options.intra_op_num_threads == 2
+
+
+def test_onnxruntime_still_has_the_attributes_the_thread_limit_patches():
+    # Arrange
+    onnxruntime = pytest.importorskip("onnxruntime")
+
+    # Act
+    options = onnxruntime.SessionOptions()
+
+    # Assert
+    assert callable(onnxruntime.InferenceSession)
+    assert options.intra_op_num_threads == 0
+    assert hasattr(options, "inter_op_num_threads")
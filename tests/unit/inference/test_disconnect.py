@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from src.inference.disconnect import ClientDisconnectedError, cancel_on_disconnect
+
+
+def test_cancel_on_disconnect_cancels_the_awaitable_when_the_client_goes_away(mocker):
+    # Arrange
+    request = mocker.Mock()
+    request.is_disconnected = mocker.AsyncMock(return_value=True)
+    cancelled = []
+
+    async def slow_generation():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        await cancel_on_disconnect(request, slow_generation(), poll_interval=0.01)
+
+    # Act & Assert
+    with pytest.raises(ClientDisconnectedError):
+        asyncio.run(run())
+    assert cancelled == [True]
+
+
+def test_cancel_on_disconnect_returns_the_result_while_the_client_is_connected(mocker):
+    # Arrange
+    request = mocker.Mock()
+    request.is_disconnected = mocker.AsyncMock(return_value=False)
+
+    async def generation():
+        await asyncio.sleep(0.03)
+        return "response"
+
+    # Act
+    result = asyncio.run(cancel_on_disconnect(request, generation(), poll_interval=0.01))
+
+    # Assert
+    assert result == "response"
@@ -0,0 +1,239 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.inference.inference_scheduler import DeadlineExceededError, InferenceScheduler, QueueFullError
+from src.model.model_registry import UnknownModelError
+
+
+class BlockingModel:
+    """Fake llama-cpp model that blocks until released and records every call."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def __call__(self, prompt, max_tokens, temperature, stream=False):
+        self.release.wait(timeout=5)
+        self.calls.append(prompt)
+        return self._generate(prompt)
+
+    @staticmethod
+    def _generate(prompt):
+        yield {"choices": [{"text": prompt, "finish_reason": "stop"}]}
+
+    def tokenize(self, text):
+        return list(text)
+
+
+def test_scheduler_answers_identical_queued_jobs_with_a_single_generation():
+    # Arrange
+    model = BlockingModel()
+    scheduler = InferenceScheduler([model], max_queue_size=8)
+    blocker = scheduler.submit("first", max_tokens=4, temperature=0.1)
+    scheduler.start()
+
+    # Act
+    duplicates = [scheduler.submit("same", max_tokens=4, temperature=0.1) for _ in range(3)]
+    model.release.set()
+    results = [job.future.result(timeout=5) for job in [blocker] + duplicates]
+    scheduler.stop()
+
+    # Assert
+    assert model.calls == ["first", "same"]
+    assert [result["choices"][0]["text"] for result in results] == ["first", "same", "same", "same"]
+
+
+def test_scheduler_runs_higher_priority_jobs_first():
+    # Arrange
+    model = BlockingModel()
+    model.release.set()
+    scheduler = InferenceScheduler([model], max_queue_size=8)
+    jobs = [
+        scheduler.submit("low", max_tokens=4, temperature=0.1, priority=0),
+        scheduler.submit("high", max_tokens=4, temperature=0.1, priority=5),
+    ]
+
+    # Act
+    scheduler.start()
+    for job in jobs:
+        job.future.result(timeout=5)
+    scheduler.stop()
+
+    # Assert
+    assert model.calls == ["high", "low"]
+
+
+def test_scheduler_rejects_jobs_when_the_queue_is_full():
+    # Arrange
+    scheduler = InferenceScheduler([BlockingModel()], max_queue_size=1)
+    scheduler.submit("queued", max_tokens=4, temperature=0.1)
+
+    # Act & Assert
+    with pytest.raises(QueueFullError):
+        scheduler.submit("rejected", max_tokens=4, temperature=0.1)
+
+
+def test_scheduler_streams_events_to_the_caller():
+    # Arrange
+    model = BlockingModel()
+    model.release.set()
+    scheduler = InferenceScheduler([model])
+    scheduler.start()
+
+    async def collect():
+        return [event async for event in scheduler.stream("hello", max_tokens=4, temperature=0.1)]
+
+    # Act
+    events = asyncio.run(collect())
+    scheduler.stop()
+
+    # Assert
+    assert [event["type"] for event in events] == ["token", "done"]
+    assert events[0]["text"] == "hello"
+
+
+def test_scheduler_drops_queued_jobs_whose_deadline_passed():
+    # Arrange
+    model = BlockingModel()
+    model.release.set()
+    scheduler = InferenceScheduler([model])
+    expired = scheduler.submit("expired", max_tokens=4, temperature=0.1, timeout=0)
+    time.sleep(0.01)
+
+    # Act
+    scheduler.start()
+    with pytest.raises(DeadlineExceededError):
+        expired.future.result(timeout=5)
+    scheduler.stop()
+
+    # Assert
+    assert model.calls == []
+    assert scheduler.get_stats()["expired_jobs"] == 1
+
+
+def test_scheduler_counts_rejected_jobs_and_suggests_a_retry_delay():
+    # Arrange
+    scheduler = InferenceScheduler([BlockingModel()], max_queue_size=1)
+    scheduler.submit("queued", max_tokens=4, temperature=0.1)
+
+    # Act
+    with pytest.raises(QueueFullError):
+        scheduler.submit("rejected", max_tokens=4, temperature=0.1)
+
+    # Assert
+    assert scheduler.is_saturated
+    assert scheduler.get_stats()["rejected_jobs"] == 1
+    assert scheduler.get_retry_after_seconds() >= 1
+
+
+def test_cancelling_a_running_job_stops_its_generation():
+    # Arrange
+    started = threading.Event()
+    generated = []
+
+    class EndlessModel:
+        def __call__(self, prompt, max_tokens, temperature, stream=False):
+            def tokens():
+                started.set()
+                while len(generated) < 1000:
+                    generated.append("token")
+                    time.sleep(0.001)
+                    yield {"choices": [{"text": "token", "finish_reason": None}]}
+            return tokens()
+
+        def tokenize(self, text):
+            return [1]
+
+    scheduler = InferenceScheduler([EndlessModel()])
+    scheduler.start()
+    job = scheduler.submit("prompt", max_tokens=1000, temperature=0.1)
+    started.wait(timeout=5)
+
+    # Act
+    job.cancel()
+    scheduler.stop(timeout=5)
+
+    # Assert
+    assert len(generated) < 1000
+    assert scheduler.get_stats()["cancelled_jobs"] == 1
+
+
+def test_cancelled_queued_jobs_are_never_started():
+    # Arrange
+    model = BlockingModel()
+    model.release.set()
+    scheduler = InferenceScheduler([model])
+    job = scheduler.submit("cancelled", max_tokens=4, temperature=0.1)
+
+    # Act
+    job.cancel()
+    scheduler.start()
+    scheduler.stop(timeout=5)
+
+    # Assert
+    assert model.calls == []
+
+
+def test_cancelling_a_queued_job_frees_its_queue_slot():
+    # Arrange
+    model = BlockingModel()
+    scheduler = InferenceScheduler([model], max_queue_size=2)
+    scheduler.start()
+    running = scheduler.submit("running", max_tokens=4, temperature=0.1)
+    while scheduler.queue_depth:
+        time.sleep(0.01)
+    queued = [scheduler.submit(f"queued {index}", max_tokens=4, temperature=0.1) for index in range(2)]
+
+    # Act
+    for job in queued:
+        job.cancel()
+    admitted = scheduler.submit("admitted", max_tokens=4, temperature=0.1)
+    depth = scheduler.queue_depth
+    model.release.set()
+    admitted.future.result(timeout=5)
+    running.future.result(timeout=5)
+    scheduler.stop()
+
+    # Assert
+    assert depth == 1
+    assert model.calls == ["running", "admitted"]
+    assert scheduler.get_stats()["cancelled_jobs"] == 2
+
+
+def test_scheduler_runs_jobs_naming_a_model_on_the_registry_model(mocker):
+    # Arrange
+    default_model = BlockingModel()
+    registry_model = BlockingModel()
+    for model in (default_model, registry_model):
+        model.release.set()
+    registry = mocker.Mock()
+    registry.use.return_value.__enter__ = mocker.Mock(return_value=registry_model)
+    registry.use.return_value.__exit__ = mocker.Mock(return_value=False)
+    scheduler = InferenceScheduler([default_model], max_queue_size=8, model_registry=registry)
+    scheduler.start()
+
+    # Act
+    jobs = [
+        scheduler.submit("same", max_tokens=4, temperature=0.1, model="other"),
+        scheduler.submit("same", max_tokens=4, temperature=0.1),
+    ]
+    for job in jobs:
+        job.future.result(timeout=5)
+    scheduler.stop()
+
+    # Assert
+    registry.use.assert_called_once_with("other")
+    assert registry_model.calls == ["same"]
+    assert default_model.calls == ["same"]
+
+
+def test_scheduler_rejects_jobs_naming_an_unknown_model():
+    # Arrange
+    scheduler = InferenceScheduler([BlockingModel()], max_queue_size=8)
+
+    # Act & Assert
+    with pytest.raises(UnknownModelError):
+        scheduler.submit("prompt", max_tokens=4, temperature=0.1, model="missing")
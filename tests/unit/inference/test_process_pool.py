@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from src.inference.process_pool import InferenceProcess, InferenceProcessPool, InferenceWorkerError, \
+    get_core_slices
+from src.inference.streaming import collect_completion, stream_completion
+
+
+class EchoModel:
+    """Fake llama-cpp model loaded in the worker process, streaming the prompt back word by word."""
+
+    def __init__(self, model_path, **model_kwargs):
+        self.model_kwargs = model_kwargs
+
+    def __call__(self, prompt, max_tokens, temperature, stream=False):
+        for word in prompt.split()[:max_tokens]:
+            yield {"choices": [{"text": f"{word} ", "finish_reason": None}]}
+        yield {"choices": [{"text": str(self.model_kwargs["n_threads"]), "finish_reason": "stop"}]}
+
+
+def fail_to_load(model_path, **model_kwargs):
+    raise FileNotFoundError(model_path)
+
+
+def test_get_core_slices_splits_the_cores_evenly_and_wraps_around_when_oversubscribed():
+    # Act
+    even = get_core_slices(2, cores=[0, 1, 2, 3, 4])
+    oversubscribed = get_core_slices(3, threads_per_process=2, cores=[0, 1, 2, 3])
+
+    # Assert
+    assert even == [[0, 1], [2, 3]]
+    assert oversubscribed == [[0, 1], [2, 3], [0, 1]]
+
+
+def test_pool_streams_generations_from_worker_processes_pinned_to_their_cores(mocker):
+    # Arrange
+    mocker.patch("src.inference.process_pool.get_core_slices", return_value=[[0], [0]])
+    tokenizer = mocker.Mock()
+    tokenizer.tokenize.side_effect = lambda text: text.split()
+    pool = InferenceProcessPool(
+        "model.bin", {"use_mlock": True}, process_count=2, tokenizer=tokenizer, model_factory=EchoModel,
+        start_timeout=60,
+    )
+    pool.start()
+
+    # Act
+    try:
+        completions = [
+            collect_completion(stream_completion(process, "hello from the pool", max_tokens=3, temperature=0.1))
+            for process in pool.processes
+        ]
+        pids = {process.pid for process in pool.processes}
+    finally:
+        pool.stop()
+
+    # Assert
+    assert len(pids) == 2
+    assert [completion["choices"][0]["text"] for completion in completions] == ["hello from the 1"] * 2
+    assert completions[0]["usage"]["prompt_tokens"] == 4
+    assert pool.processes[0].model_kwargs == {"use_mlock": False, "use_mmap": True, "n_threads": 1}
+
+
+def test_process_reports_a_model_that_fails_to_load():
+    # Arrange
+    process = InferenceProcess("missing.bin", {}, cores=[0], model_factory=fail_to_load)
+    process.start()
+
+    # Act & Assert
+    with pytest.raises(InferenceWorkerError, match="missing.bin"):
+        process.wait_until_ready(timeout=60)
+
+
+class HangingModel(EchoModel):
+    """Fake model that stops answering after its first chunk for prompts starting with "hang"."""
+
+    def __call__(self, prompt, max_tokens, temperature, stream=False):
+        for chunk in super().__call__(prompt, max_tokens, temperature, stream):
+            yield chunk
+            if prompt.startswith("hang"):
+                time.sleep(60)
+
+
+def test_process_restarts_a_worker_that_does_not_stop_a_closed_stream_in_time(mocker):
+    # Arrange
+    tokenizer = mocker.Mock()
+    tokenizer.tokenize.side_effect = lambda text: text.split()
+    process = InferenceProcess(
+        "model.bin", {"n_threads": 1}, cores=[0], tokenizer=tokenizer, model_factory=HangingModel, stop_timeout=0.5
+    )
+    process.start()
+    process.wait_until_ready(timeout=60)
+    hung_pid = process.pid
+
+    # Act
+    try:
+        chunks = process("hang on", max_tokens=3, temperature=0.1)
+        next(chunks)
+        chunks.close()
+        completion = collect_completion(stream_completion(process, "after restart", max_tokens=3, temperature=0.1))
+        restarted_pid = process.pid
+    finally:
+        process.stop()
+
+    # Assert
+    assert restarted_pid != hung_pid
+    assert completion["choices"][0]["text"] == "after restart 1"
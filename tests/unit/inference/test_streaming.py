@@ -0,0 +1,89 @@
+import json
+
+from src.inference.streaming import (
+    FINISH_REASON_CANCELLED,
+    STREAM_FORMAT_NDJSON,
+    STREAM_FORMAT_SSE,
+    collect_completion,
+    format_event,
+    stream_completion,
+)
+
+
+def _chunk(text, finish_reason=None):
+    return {"choices": [{"text": text, "finish_reason": finish_reason}]}
+
+
+def test_stream_completion_yields_tokens_then_done_event_with_usage(mocker):
+    # Arrange
+    mock_model = mocker.Mock()
+    mock_model.return_value = (chunk for chunk in [_chunk("Grace"), _chunk(" Hopper"), _chunk("", "stop")])
+    mock_model.tokenize.return_value = [1, 2, 3]
+
+    # Act
+    events = list(stream_completion(mock_model, "prompt", max_tokens=16, temperature=0.1))
+
+    # Assert
+    mock_model.assert_called_once_with("prompt", max_tokens=16, temperature=0.1, stream=True)
+    assert [event["text"] for event in events[:-1]] == ["Grace", " Hopper"]
+    assert "time_to_first_token_ms" in events[0]
+    assert "time_to_first_token_ms" not in events[1]
+    done = events[-1]
+    assert done["type"] == "done"
+    assert done["finish_reason"] == "stop"
+    assert done["usage"] == {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+
+
+def test_stream_completion_stops_generating_when_asked_to(mocker):
+    # Arrange
+    generated = []
+
+    def tokens():
+        for token in ["a", "b", "c", "d"]:
+            generated.append(token)
+            yield _chunk(token)
+
+    mock_model = mocker.Mock(side_effect=lambda *args, **kwargs: tokens())
+    mock_model.tokenize.return_value = [1]
+
+    # Act
+    events = list(stream_completion(
+        mock_model, "prompt", max_tokens=16, temperature=0.1, should_stop=lambda: len(generated) > 2
+    ))
+
+    # Assert
+    assert [event["text"] for event in events[:-1]] == ["a", "b"]
+    assert events[-1]["finish_reason"] == FINISH_REASON_CANCELLED
+    assert generated == ["a", "b", "c"]
+
+
+def test_collect_completion_assembles_a_llama_cpp_style_completion():
+    # Arrange
+    events = [
+        {"type": "token", "text": "Grace", "time_to_first_token_ms": 1.0},
+        {"type": "token", "text": " Hopper"},
+        {"type": "done", "finish_reason": "stop", "time_to_first_token_ms": 1.0, "total_time_ms": 2.0,
+         "usage": {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3}},
+    ]
+
+    # Act
+    completion = collect_completion(iter(events))
+
+    # Assert
+    assert completion["choices"][0]["text"] == "Grace Hopper"
+    assert completion["choices"][0]["finish_reason"] == "stop"
+    assert completion["usage"]["total_tokens"] == 3
+
+
+def test_format_event_serializes_sse_and_ndjson():
+    # Arrange
+    event = {"type": "token", "text": "hi"}
+
+    # Act
+    sse = format_event(event, STREAM_FORMAT_SSE)
+    ndjson = format_event(event, STREAM_FORMAT_NDJSON)
+
+    # Assert
+    assert sse == f"event: token\ndata: {json.dumps(event)}\n\n"
+    assert json.loads(ndjson) == event
+    assert ndjson.endswith("\n")
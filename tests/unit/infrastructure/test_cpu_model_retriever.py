@@ -14,7 +14,7 @@ def test_get_cpu_model_downloads_model_if_does_not_exist_then_instantiates_model
 ):
     # Arrange
     mock_cwd = "/current/working/directory"
-    mocker.patch("pathlib.Path.exists", return_value=False)
+    mock_model_downloader.is_model_installed.return_value = False
     mocker.patch("os.getcwd", return_value=mock_cwd)
     mock_llama.return_value = Llama
 
@@ -28,7 +28,7 @@ def test_get_cpu_model_downloads_model_if_does_not_exist_then_instantiates_model
     mock_model_downloader.download_model.assert_called_once_with(
         mock_env_config.download_link, mock_env_config.folder_name
     )
-    expected_model_path = f"{mock_cwd}/src/models/{mock_env_config.folder_name}/{mock_env_config.quantization_model}"
+    expected_model_path = f"{mock_cwd}/src/model/downloaded_models/{mock_env_config.folder_name}/{mock_env_config.quantization_model}"
     mock_llama.assert_called_once_with(
         model_path=expected_model_path, **mock_env_config.model_kwargs
     )
@@ -41,7 +41,7 @@ def test_get_cpu_model_does_not_downloads_model_if_exists_then_instantiates_mode
 ):
     # Arrange
     mock_cwd = "/current/working/directory"
-    mocker.patch("pathlib.Path.exists", return_value=True)
+    mock_model_downloader.is_model_installed.return_value = True
     mocker.patch("os.getcwd", return_value=mock_cwd)
     mock_llama.return_value = Llama
 
@@ -53,7 +53,7 @@ def test_get_cpu_model_does_not_downloads_model_if_exists_then_instantiates_mode
 
     # Assert
     mock_model_downloader.download_model.assert_not_called()
-    expected_model_path = f"{mock_cwd}/src/models/{mock_env_config.folder_name}/{mock_env_config.quantization_model}"
+    expected_model_path = f"{mock_cwd}/src/model/downloaded_models/{mock_env_config.folder_name}/{mock_env_config.quantization_model}"
     mock_llama.assert_called_once_with(
         model_path=expected_model_path, **mock_env_config.model_kwargs
     )
@@ -74,3 +74,21 @@ def test_get_cpu_model_raises_error_if_quantization_model_is_none(
 
     # Assert
     assert str(e.value) == "Quantization model must be specified"
+
+
+def test_get_cpu_model_does_not_download_a_missing_model_when_downloads_are_not_allowed(
+    mock_model_downloader, mock_env_config, mock_llama
+):
+    # Arrange
+    mock_model_downloader.is_model_installed.return_value = False
+    cpu_model_retriever = ModelRetriever(
+        model_downloader=mock_model_downloader, models_path="/snapshot/models", allow_download=False
+    )
+
+    # Act
+    with pytest.raises(FileNotFoundError):
+        cpu_model_retriever.get_model(mock_env_config, mock_llama)
+
+    # Assert
+    mock_model_downloader.download_model.assert_not_called()
+    mock_llama.assert_not_called()
@@ -0,0 +1,30 @@
+import pytest
+
+from src.model.file_lock import FileLock
+
+
+def test_acquire_times_out_while_another_holder_has_the_lock(tmp_path):
+    # Arrange
+    lock_path = tmp_path / "model.bin.lock"
+
+    # Act & Assert
+    with FileLock(str(lock_path)):
+        with pytest.raises(TimeoutError):
+            FileLock(str(lock_path), timeout=0.1, poll_interval=0.05).acquire()
+
+
+def test_acquire_recovers_the_lock_of_a_holder_that_exited_without_releasing_it(tmp_path):
+    # Arrange
+    lock_path = tmp_path / "model.bin.lock"
+    stale_lock = FileLock(str(lock_path))
+    stale_lock.acquire()
+    # closing the file is what the kernel does when the holding process dies
+    stale_lock._file.close()
+
+    # Act
+    with FileLock(str(lock_path), timeout=0.1, poll_interval=0.05) as lock:
+        holder = lock_path.read_text()
+
+    # Assert
+    assert lock._file is None
+    assert holder
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.model.huggingface_downloader import (
+    DIGEST_SUFFIX,
+    SEGMENT_MANIFEST_SUFFIX,
+    SEGMENT_READ_AHEAD,
+    HuggingFaceDownloader,
+    classify_file_name,
+)
+
+FILE_CONTENT = os.urandom(64 * 1024)
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serves FILE_CONTENT with byte range support, failing the first `failures` range requests midway."""
+
+    failures = 0
+    requested_ranges = []
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(FILE_CONTENT)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        if "Range" not in self.headers:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(FILE_CONTENT)))
+            self.end_headers()
+            self.wfile.write(FILE_CONTENT)
+            return
+
+        start, end = self.headers["Range"].split("=")[1].split("-")
+        start, end = int(start), int(end or len(FILE_CONTENT) - 1)
+        type(self).requested_ranges.append((start, end))
+        body = FILE_CONTENT[start:end + 1]
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(FILE_CONTENT)}")
+        self.end_headers()
+        if type(self).failures > 0:
+            type(self).failures -= 1
+            # send part of the range, then drop the connection
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    RangeRequestHandler.failures = 0
+    RangeRequestHandler.requested_ranges = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/model.bin"
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_single_file_downloads_segments_concurrently_and_retries_failed_ones(file_server, tmp_path, mocker):
+    # Arrange
+    mocker.patch("time.sleep")
+    RangeRequestHandler.failures = 1
+    downloader = HuggingFaceDownloader(max_retries=2, min_segment_size=1024)
+    hash_file = mocker.spy(HuggingFaceDownloader, "hash_file")
+
+    # Act
+    downloader.get_single_file(file_server, str(tmp_path), segments=4)
+
+    # Assert
+    assert (tmp_path / "model.bin").read_bytes() == FILE_CONTENT
+    assert not (tmp_path / f"model.bin{SEGMENT_MANIFEST_SUFFIX}").exists()
+    assert downloader.read_recorded_digest(tmp_path / "model.bin") == hashlib.sha256(FILE_CONTENT).hexdigest()
+    # one request per 1KB segment and one for the rest of the segment that failed midway
+    assert len(RangeRequestHandler.requested_ranges) == len(FILE_CONTENT) // 1024 + 1
+    # the digest is taken while the segments stream, not by reading the whole file again
+    hash_file.assert_not_called()
+
+
+def test_get_single_file_downloads_segments_in_offset_order_close_behind_the_digest(file_server, tmp_path, mocker):
+    # Arrange
+    downloader = HuggingFaceDownloader(min_segment_size=1024)
+    download_segment = downloader._download_segment
+    lags = []
+
+    def record_lag(url, fd, segment, manifest, *args):
+        lags.append(segment["start"] - downloader._get_contiguous_size(manifest))
+        return download_segment(url, fd, segment, manifest, *args)
+
+    mocker.patch.object(downloader, "_download_segment", side_effect=record_lag)
+
+    # Act
+    downloader.get_single_file(file_server, str(tmp_path), segments=4)
+
+    # Assert
+    assert (tmp_path / "model.bin").read_bytes() == FILE_CONTENT
+    assert len(lags) == len(FILE_CONTENT) // 1024
+    # a segment only starts while the bytes before it are at most the read-ahead of every connection
+    assert max(lags) < 4 * SEGMENT_READ_AHEAD * 1024
+
+
+def test_get_single_file_resumes_the_missing_bytes_from_the_segment_manifest(file_server, tmp_path):
+    # Arrange
+    half = len(FILE_CONTENT) // 2
+    # the first segment is complete and the first 100 bytes of the second one were written before the crash
+    (tmp_path / "model.bin").write_bytes(FILE_CONTENT[:half + 100] + bytes(len(FILE_CONTENT) - half - 100))
+    (tmp_path / f"model.bin{SEGMENT_MANIFEST_SUFFIX}").write_text(json.dumps({
+        "url": file_server,
+        "size": len(FILE_CONTENT),
+        "segments": [
+            {"start": 0, "end": half, "downloaded": half},
+            {"start": half, "end": len(FILE_CONTENT), "downloaded": 100},
+        ],
+    }))
+    downloader = HuggingFaceDownloader(min_segment_size=1024)
+
+    # Act
+    downloader.get_single_file(file_server, str(tmp_path), segments=2)
+
+    # Assert
+    assert (tmp_path / "model.bin").read_bytes() == FILE_CONTENT
+    assert RangeRequestHandler.requested_ranges == [(half + 100, len(FILE_CONTENT) - 1)]
+
+
+def test_get_single_file_records_the_digest_of_a_resumed_download(file_server, tmp_path):
+    # Arrange
+    (tmp_path / "model.bin").write_bytes(FILE_CONTENT[:1000])
+    downloader = HuggingFaceDownloader()
+
+    # Act
+    downloader.get_single_file(file_server, str(tmp_path))
+
+    # Assert
+    assert (tmp_path / "model.bin").read_bytes() == FILE_CONTENT
+    assert RangeRequestHandler.requested_ranges == [(1000, len(FILE_CONTENT) - 1)]
+    recorded_digest = (tmp_path / f"model.bin{DIGEST_SUFFIX}").read_text()
+    assert recorded_digest == f"{hashlib.sha256(FILE_CONTENT).hexdigest()}  model.bin\n"
+
+
+@pytest.mark.parametrize("segments", [1, 2])
+def test_get_single_file_downloads_again_a_full_size_file_without_a_manifest_or_digest(
+    file_server, tmp_path, segments
+):
+    # Arrange
+    # a segmented download preallocated the file and died before any bytes or its manifest were written
+    (tmp_path / "model.bin").write_bytes(bytes(len(FILE_CONTENT)))
+    downloader = HuggingFaceDownloader(min_segment_size=1024)
+
+    # Act
+    downloader.get_single_file(file_server, str(tmp_path), segments=segments)
+
+    # Assert
+    assert (tmp_path / "model.bin").read_bytes() == FILE_CONTENT
+    assert downloader.read_recorded_digest(tmp_path / "model.bin") == hashlib.sha256(FILE_CONTENT).hexdigest()
+
+
+def test_check_model_files_reports_missing_and_corrupted_files(tmp_path):
+    # Arrange
+    (tmp_path / "good.bin").write_bytes(b"good")
+    (tmp_path / "bad.bin").write_bytes(b"corrupted")
+    sha256 = [
+        ["good.bin", hashlib.sha256(b"good").hexdigest()],
+        ["bad.bin", hashlib.sha256(b"bad").hexdigest()],
+        ["missing.bin", hashlib.sha256(b"missing").hexdigest()],
+    ]
+    downloader = HuggingFaceDownloader()
+
+    # Act
+    all_valid = downloader.check_model_files("model", "main", [], sha256[:1], tmp_path)
+    any_invalid = downloader.check_model_files("model", "main", [], sha256, tmp_path, threads=2)
+
+    # Assert
+    assert all_valid is True
+    assert any_invalid is False
+
+
+def test_start_download_threads_streams_several_files_concurrently_and_resumes_partial_ones(file_server, tmp_path):
+    # Arrange
+    urls = [file_server.replace("model.bin", f"model-0000{i}.safetensors") for i in range(1, 4)]
+    (tmp_path / "model-00001.safetensors").write_bytes(FILE_CONTENT[:1000])
+    downloader = HuggingFaceDownloader()
+
+    # Act
+    downloader.start_download_threads(urls, tmp_path, threads=3)
+
+    # Assert
+    expected_digest = hashlib.sha256(FILE_CONTENT).hexdigest()
+    for i in range(1, 4):
+        assert (tmp_path / f"model-0000{i}.safetensors").read_bytes() == FILE_CONTENT
+        assert downloader.read_recorded_digest(tmp_path / f"model-0000{i}.safetensors") == expected_digest
+    assert RangeRequestHandler.requested_ranges == [(1000, len(FILE_CONTENT) - 1)]
+
+
+@pytest.mark.parametrize(
+    "fname, expected",
+    [
+        ("config.json", "text"),
+        ("tokenizer.model", "text"),
+        ("model.safetensors.index.json", "text"),
+        ("model-00001-of-00002.safetensors", "safetensors"),
+        ("pytorch_model-00001-of-00002.bin", "pytorch"),
+        ("consolidated.pt", "pt"),
+        ("ggml-model-q4_0.bin", "ggml"),
+        (".gitattributes", None),
+    ],
+)
+def test_classify_file_name(fname, expected):
+    # Act & Assert
+    assert classify_file_name(fname) == expected
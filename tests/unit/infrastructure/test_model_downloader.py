@@ -3,6 +3,7 @@ import os
 import pytest
 
 from src.model.model_downloader import ModelDownloader
+from src.model.model_store import ModelStore
 
 
 def test_download_cpu_model_creates_the_output_folder_and_call_huggingface_downloader_with_correct_parameters(
@@ -14,11 +15,14 @@ def test_download_cpu_model_creates_the_output_folder_and_call_huggingface_downl
     mock_folder_name = "folder_name"
 
     mocker.patch("os.makedirs")
+    mocker.patch("src.model.model_downloader.FileLock")
     mock_huggingface_model_downloader.get_single_file.return_value = None
+    mock_install = mocker.patch.object(ModelStore, "install")
 
     model_downloader = ModelDownloader(
         hugging_face_downloader=mock_huggingface_model_downloader,
         output_path=mock_output_path,
+        model_store=ModelStore(mock_output_path),
     )
 
     # Act
@@ -31,8 +35,10 @@ def test_download_cpu_model_creates_the_output_folder_and_call_huggingface_downl
     mock_huggingface_model_downloader.get_single_file.assert_called_once_with(
         url=huggingface_model_link,
         output_folder="/output/path/folder_name",
-        filename="ggml-vic13b-q4_0.bin",
+        filename="ggml-vic13b-q4_0.bin.part",
+        segments=1,
     )
+    mock_install.assert_called_once_with(mock_folder_name, "ggml-vic13b-q4_0.bin", huggingface_model_link)
 
 
 def test_download_cpu_model_raises_an_exception_if_the_downloader_fails(
@@ -44,14 +50,66 @@ def test_download_cpu_model_raises_an_exception_if_the_downloader_fails(
     mock_folder_name = "folder_name"
 
     mocker.patch("os.makedirs")
+    mocker.patch("src.model.model_downloader.FileLock")
     mock_huggingface_model_downloader.get_single_file.side_effect = Exception
 
     model_downloader = ModelDownloader(
         hugging_face_downloader=mock_huggingface_model_downloader,
         output_path=mock_output_path,
+        model_store=ModelStore(mock_output_path),
     )
 
     # Act & Assert
     with pytest.raises(Exception):
         model_downloader.download_model(huggingface_model_link, mock_folder_name)
 
+
+
+def test_is_model_installed_only_requests_the_remote_file_info_when_revalidating(
+    mock_huggingface_model_downloader, tmp_path
+):
+    # Arrange
+    huggingface_model_link = "https://huggingface.co/vicuna/ggml-vicuna-13b-1.1/resolve/main/ggml-vic13b-q4_0.bin"
+    model_store = ModelStore(str(tmp_path))
+    model_store.get_temporary_path("folder_name", "ggml-vic13b-q4_0.bin").parent.mkdir()
+    model_store.get_temporary_path("folder_name", "ggml-vic13b-q4_0.bin").write_bytes(b"model")
+    stored = model_store.install("folder_name", "ggml-vic13b-q4_0.bin", huggingface_model_link)
+    mock_huggingface_model_downloader.get_remote_file_info.return_value = (stored.size + 1, None)
+
+    model_downloader = ModelDownloader(
+        hugging_face_downloader=mock_huggingface_model_downloader,
+        output_path=str(tmp_path),
+        model_store=model_store,
+    )
+
+    # Act
+    installed = model_downloader.is_model_installed(huggingface_model_link, "folder_name")
+    revalidated = model_downloader.is_model_installed(huggingface_model_link, "folder_name", revalidate=True)
+
+    # Assert
+    assert installed
+    assert not revalidated
+    mock_huggingface_model_downloader.get_remote_file_info.assert_called_once_with(huggingface_model_link)
+
+
+def test_download_model_reuses_a_model_downloaded_by_another_process_while_waiting_for_the_lock(
+    mock_huggingface_model_downloader, tmp_path, mocker
+):
+    # Arrange
+    huggingface_model_link = "https://huggingface.co/vicuna/ggml-vicuna-13b-1.1/resolve/main/ggml-vic13b-q4_0.bin"
+    model_store = ModelStore(str(tmp_path))
+    mocker.patch.object(model_store, "is_installed", return_value=True)
+    mock_file_lock = mocker.patch("src.model.model_downloader.FileLock")
+
+    model_downloader = ModelDownloader(
+        hugging_face_downloader=mock_huggingface_model_downloader,
+        output_path=str(tmp_path),
+        model_store=model_store,
+    )
+
+    # Act
+    model_downloader.download_model(huggingface_model_link, "folder_name")
+
+    # Assert
+    mock_file_lock.assert_called_once_with(f"{tmp_path}/folder_name/ggml-vic13b-q4_0.bin.lock", timeout=None)
+    mock_huggingface_model_downloader.get_single_file.assert_not_called()
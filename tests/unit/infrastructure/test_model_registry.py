@@ -0,0 +1,154 @@
+import threading
+
+import pytest
+
+from src.config import ModelDownloadConfiguration
+from src.model.model_registry import InvalidModelConfigurationError, ModelDownloadingError, \
+    ModelMemoryBudgetError, ModelRegistry, UnknownModelError
+
+
+def get_model_config(name: str, link: str = "https://huggingface.co/org/model/resolve/main/model.bin"):
+    return ModelDownloadConfiguration(
+        model_name=name, folder_name=name, download_link=link, model_kwargs={}, quantization_model="model.bin"
+    )
+
+
+@pytest.fixture
+def mock_retriever(mocker, tmp_path):
+    """A retriever installing 100 byte model files and returning a new mock model for every load of the weights."""
+    def install_model(config):
+        path = tmp_path / f"{config.folder_name}-{config.download_link.rsplit('/', 1)[-1]}"
+        path.write_bytes(b"\0" * 100)
+        return str(path)
+
+    retriever = mocker.Mock()
+    retriever.install_model.side_effect = install_model
+    retriever.load_model.side_effect = lambda model_file, config: mocker.Mock(name=config.download_link)
+    mocker.patch("src.model.model_registry.get_resident_memory_bytes", return_value=None)
+    return retriever
+
+
+def get_weight_loads(retriever):
+    return [call for call in retriever.load_model.call_args_list if not call.args[1].model_kwargs.get("vocab_only")]
+
+
+def test_use_loads_a_model_once_on_first_use(mock_retriever):
+    # Arrange
+    registry = ModelRegistry(mock_retriever)
+    registry.register("small", get_model_config("small")).result(timeout=5)
+
+    # Act
+    with registry.use("small") as first:
+        pass
+    with registry.use("small") as second:
+        pass
+
+    # Assert
+    assert first is second
+    assert len(get_weight_loads(mock_retriever)) == 1
+    assert registry.get_stats()["models"]["small"]["memory_bytes"] == 100
+
+
+def test_use_unloads_the_least_recently_used_idle_model_to_stay_within_the_budget(mocker, mock_retriever):
+    # Arrange
+    on_unload = mocker.Mock()
+    registry = ModelRegistry(mock_retriever, memory_budget_bytes=250, on_unload=on_unload)
+    registry.pin("default", 50)
+    for name in ("a", "b", "c"):
+        registry.register(name, get_model_config(name)).result(timeout=5)
+    with registry.use("a") as model_a:
+        pass
+    with registry.use("b"):
+        pass
+    with registry.use("a"):
+        pass
+
+    # Act
+    with registry.use("c"):
+        pass
+
+    # Assert
+    on_unload.assert_called_once()
+    stats = registry.get_stats()
+    assert {name for name, model in stats["models"].items() if model["loaded"]} == {"default", "a", "c"}
+    assert on_unload.call_args.args[0] is not model_a
+    assert stats["memory_used_bytes"] == 250
+
+
+def test_use_rejects_a_model_larger_than_the_budget_and_unknown_models(mock_retriever):
+    # Arrange
+    registry = ModelRegistry(mock_retriever, memory_budget_bytes=120)
+    registry.pin("default", 50)
+    registry.register("large", get_model_config("large")).result(timeout=5)
+
+    # Act & Assert
+    with pytest.raises(ModelMemoryBudgetError):
+        with registry.use("large"):
+            pass
+    with pytest.raises(UnknownModelError):
+        with registry.use("missing"):
+            pass
+
+
+def test_register_swaps_a_model_once_its_running_generation_finishes(mocker, mock_retriever):
+    # Arrange
+    on_unload = mocker.Mock()
+    registry = ModelRegistry(mock_retriever, on_unload=on_unload)
+    old_config = get_model_config("chat", "https://huggingface.co/org/model/resolve/main/v1.bin")
+    registry.register("chat", old_config).result(timeout=5)
+
+    # Act
+    with registry.use("chat") as old_model:
+        new_config = get_model_config("chat", "https://huggingface.co/org/model/resolve/main/v2.bin")
+        registry.register("chat", new_config).result(timeout=5)
+        unloaded_while_running = on_unload.called
+    with registry.use("chat") as new_model:
+        pass
+
+    # Assert
+    assert not unloaded_while_running
+    on_unload.assert_called_once_with(old_model)
+    assert new_model is not old_model
+    assert get_weight_loads(mock_retriever)[-1].args[1].download_link.endswith("v2.bin")
+
+
+@pytest.mark.parametrize("field_name, value", [
+    ("folder_name", "../../.."), ("folder_name", ".."), ("quantization_model", "/etc/passwd"),
+    ("quantization_model", "..\\model.bin"),
+])
+def test_register_rejects_models_stored_outside_their_folder(mock_retriever, field_name, value):
+    # Arrange
+    registry = ModelRegistry(mock_retriever)
+    config = get_model_config("unsafe")
+    setattr(config, field_name, value)
+
+    # Act & Assert
+    with pytest.raises(InvalidModelConfigurationError):
+        registry.register("unsafe", config)
+    assert not registry.has_model("unsafe")
+
+
+def test_register_downloads_off_the_calling_thread_and_rejects_requests_until_installed(mocker, mock_retriever):
+    # Arrange
+    downloaded = threading.Event()
+    install_model = mock_retriever.install_model.side_effect
+    mock_retriever.install_model.side_effect = lambda config: downloaded.wait(5) and install_model(config)
+    registry = ModelRegistry(mock_retriever)
+
+    # Act
+    download = registry.register("slow", get_model_config("slow"))
+    downloading_stats = registry.get_stats()["models"]["slow"]
+    with pytest.raises(ModelDownloadingError):
+        with registry.use("slow"):
+            pass
+    downloaded.set()
+    download.result(timeout=5)
+    tokenizer, config = registry.get_tokenizer("slow")
+
+    # Assert
+    assert registry.has_model("slow")
+    assert downloading_stats["downloading"]
+    assert not registry.get_stats()["models"]["slow"]["downloading"]
+    assert mock_retriever.load_model.call_args.args[1].model_kwargs == {"vocab_only": True}
+    assert config.folder_name == "slow"
+    assert get_weight_loads(mock_retriever) == []
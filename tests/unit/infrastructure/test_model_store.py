@@ -0,0 +1,87 @@
+import json
+
+from src.model.model_store import MODEL_STORE_MANIFEST_FILE_NAME, ModelStore
+
+SOURCE_URL = "https://huggingface.co/vicuna/ggml-vicuna-13b-1.1/resolve/main/ggml-vic13b-q4_0.bin"
+
+
+def _write_download(model_store, content):
+    temporary_path = model_store.get_temporary_path("folder_name", "model.bin")
+    temporary_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path.write_bytes(content)
+    return temporary_path
+
+
+def test_install_moves_the_download_into_place_and_records_it_in_the_manifest(tmp_path):
+    # Arrange
+    model_store = ModelStore(str(tmp_path))
+    temporary_path = _write_download(model_store, b"model weights")
+
+    # Act
+    stored = model_store.install("folder_name", "model.bin", SOURCE_URL)
+
+    # Assert
+    assert not temporary_path.exists()
+    assert model_store.get_path("folder_name", "model.bin").read_bytes() == b"model weights"
+    manifest = json.loads((tmp_path / MODEL_STORE_MANIFEST_FILE_NAME).read_text())
+    assert manifest["folder_name/model.bin"]["size"] == len(b"model weights")
+    assert manifest["folder_name/model.bin"]["sha256"] == stored.sha256
+    assert manifest["folder_name/model.bin"]["source_url"] == SOURCE_URL
+
+
+def test_is_installed_detects_a_truncated_model_file_without_hashing_it(tmp_path, mocker):
+    # Arrange
+    model_store = ModelStore(str(tmp_path))
+    _write_download(model_store, b"model weights")
+    model_store.install("folder_name", "model.bin", SOURCE_URL)
+    mock_hash_file = mocker.patch("src.model.model_store.HuggingFaceDownloader.hash_file")
+
+    # Act
+    complete = model_store.is_installed("folder_name", "model.bin")
+    model_store.get_path("folder_name", "model.bin").write_bytes(b"model")
+    truncated = model_store.is_installed("folder_name", "model.bin")
+
+    # Assert
+    assert complete
+    assert not truncated
+    mock_hash_file.assert_not_called()
+
+
+def test_is_installed_ignores_an_incomplete_download(tmp_path):
+    # Arrange
+    model_store = ModelStore(str(tmp_path))
+    _write_download(model_store, b"model wei")
+
+    # Act & Assert
+    assert not model_store.is_installed("folder_name", "model.bin")
+
+
+def test_adopt_records_a_model_file_missing_from_the_manifest_only_if_it_is_complete(tmp_path):
+    # Arrange
+    model_store = ModelStore(str(tmp_path))
+    path = model_store.get_path("folder_name", "model.bin")
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"model wei")
+
+    # Act
+    unrecorded = model_store.has_unrecorded_file("folder_name", "model.bin")
+    truncated = model_store.adopt("folder_name", "model.bin", SOURCE_URL, len(b"model weights"))
+    path.write_bytes(b"model weights")
+    complete = model_store.adopt("folder_name", "model.bin", SOURCE_URL, len(b"model weights"))
+
+    # Assert
+    assert unrecorded
+    assert not truncated
+    assert complete
+    assert model_store.is_installed("folder_name", "model.bin", source_url=SOURCE_URL)
+
+
+def test_is_installed_rejects_a_model_file_installed_from_another_url(tmp_path):
+    # Arrange
+    model_store = ModelStore(str(tmp_path))
+    _write_download(model_store, b"model weights")
+    model_store.install("folder_name", "model.bin", SOURCE_URL)
+
+    # Act & Assert
+    assert not model_store.is_installed("folder_name", "model.bin", source_url=SOURCE_URL.replace("vicuna", "other"))
+    assert not model_store.has_unrecorded_file("folder_name", "model.bin")
@@ -0,0 +1,34 @@
+from src.model.prefix_state_cache import PrefixStateCache
+
+
+def test_warm_evaluates_the_prefix_and_saves_its_state(mocker):
+    # Arrange
+    mock_model = mocker.Mock()
+    mock_model.tokenize.return_value = [1, 2, 3]
+    cache = PrefixStateCache("static prefix\n")
+
+    # Act
+    cache.warm(mock_model)
+
+    # Assert
+    mock_model.tokenize.assert_called_once_with(b"static prefix\n")
+    mock_model.reset.assert_called_once()
+    mock_model.eval.assert_called_once_with([1, 2, 3])
+    mock_model.save_state.assert_called_once()
+
+
+def test_restore_loads_the_saved_state_only_when_the_prefix_was_evicted(mocker):
+    # Arrange
+    mock_model = mocker.Mock()
+    mock_model.tokenize.return_value = [1, 2, 3]
+    cache = PrefixStateCache("static prefix\n")
+    cache.warm(mock_model)
+
+    # Act
+    mock_model.eval_tokens = [1, 2, 3, 7, 8]
+    cache.restore(mock_model)
+    mock_model.eval_tokens = [1, 9, 9]
+    cache.restore(mock_model)
+
+    # Assert
+    mock_model.load_state.assert_called_once_with(mock_model.save_state.return_value)
@@ -0,0 +1,62 @@
+from src.prompt.prompt_builder import STATIC_PROMPT_PREFIX, PromptBuilder
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_build_prompt_starts_with_the_static_prefix_and_joins_chunks():
+    # Arrange
+    prompt_builder = PromptBuilder()
+
+    # Act
+    prompt = prompt_builder._build_prompt_with_context(["first chunk", "second chunk"], "Who was Grace Hopper?")
+
+    # Assert
+    assert prompt == f"{STATIC_PROMPT_PREFIX}first chunk\n\nsecond chunk\n Q: Who was Grace Hopper? A: "
+
+
+def test_build_prompt_packs_chunks_in_relevance_order_up_to_the_token_budget():
+    # Arrange
+    base_tokens = count_words(PromptBuilder()._format_prompt("", "query"))
+    prompt_builder = PromptBuilder(count_tokens=count_words, max_prompt_tokens=base_tokens + 5)
+    chunks = ["most relevant chunk", "a chunk that is far too long to fit", "short one"]
+
+    # Act
+    prompt = prompt_builder._build_prompt_with_context(chunks, "query")
+
+    # Assert
+    assert "most relevant chunk\n\nshort one" in prompt
+    assert "far too long" not in prompt
+
+
+def test_build_prompt_removes_text_overlapping_between_neighbouring_chunks():
+    # Arrange
+    prompt_builder = PromptBuilder()
+    chunks = [
+        "Grace Hopper invented the first compiler for a language.",
+        "for a language. She later helped create COBOL.",
+        "Grace Hopper invented the first compiler",
+    ]
+
+    # Act
+    prompt = prompt_builder._build_prompt_with_context(chunks, "query")
+
+    # Assert
+    assert prompt.count("for a language.") == 1
+    assert "She later helped create COBOL." in prompt
+    assert prompt.count("Grace Hopper invented") == 1
+
+
+def test_complete_prompt_includes_the_retrieved_chunks(mocker):
+    # Arrange
+    mock_retrieval_service = mocker.Mock()
+    mock_retrieval_service.retrieve.return_value = ["Grace Hopper wrote the first compiler."]
+    prompt_builder = PromptBuilder(mock_retrieval_service)
+
+    # Act
+    prompt = prompt_builder.get_complete_prompt("Who wrote the first compiler?")
+
+    # Assert
+    mock_retrieval_service.retrieve.assert_called_once_with("Who wrote the first compiler?")
+    assert "Grace Hopper wrote the first compiler.\n Q: Who wrote the first compiler? A: " in prompt
@@ -0,0 +1,20 @@
+from src.prompt.rank_fusion import reciprocal_rank_fusion
+
+
+def test_fusion_favours_ids_ranked_by_both_rankings():
+    # Act
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], [1.0, 1.0])
+
+    # Assert
+    assert fused[0] == "c"
+    assert set(fused) == {"a", "b", "c", "d"}
+
+
+def test_fusion_weights_shift_the_ranking_towards_one_retriever():
+    # Act
+    vector_first = reciprocal_rank_fusion([["a"], ["b"]], [2.0, 1.0], k=1)
+    lexical_first = reciprocal_rank_fusion([["a"], ["b"]], [1.0, 2.0], k=1)
+
+    # Assert
+    assert vector_first == ["a", "b"]
+    assert lexical_first == ["b", "a"]
@@ -0,0 +1,61 @@
+from src.cache.query_embedding_cache import QueryEmbeddingCache
+from src.document.bm25_index import BM25Index
+from src.document.chroma_documents import DocumentChunk
+from src.prompt.retrieval_service import MAX_RETRIEVED_CHUNKS, RetrievalService
+
+
+def _query_results(ids, documents):
+    return {"ids": [ids], "documents": [documents]}
+
+
+def test_retrieve_queries_the_held_collection_with_cached_query_embeddings(mocker):
+    # Arrange
+    mock_embedding_function = mocker.Mock(side_effect=lambda texts: [[float(len(text))] for text in texts])
+    mock_collection = mocker.Mock()
+    mock_collection.query.return_value = _query_results(["id"], ["a chunk"])
+    retrieval_service = RetrievalService(mock_collection, QueryEmbeddingCache(mock_embedding_function))
+
+    # Act
+    first = retrieval_service.retrieve("who was grace hopper")
+    second = retrieval_service.retrieve("who was grace hopper")
+
+    # Assert
+    assert first == second == ["a chunk"]
+    mock_embedding_function.assert_called_once_with(["who was grace hopper"])
+    assert mock_collection.query.call_args.kwargs == {"query_embeddings": [[20.0]], "n_results": MAX_RETRIEVED_CHUNKS}
+    assert retrieval_service.get_stats()["query_embeddings"]["hits"] == 1
+
+
+def test_retrieve_fuses_vector_results_with_keyword_matches(mocker):
+    # Arrange
+    lexical_index = BM25Index()
+    lexical_index.add([DocumentChunk("error XJ-900 means out of memory", {"source_file": "codes.txt"}, "code")])
+    mock_collection = mocker.Mock()
+    mock_collection.query.return_value = _query_results(
+        ["intro", "code"], ["an introduction", "error XJ-900 means out of memory"]
+    )
+    retrieval_service = RetrievalService(
+        mock_collection, QueryEmbeddingCache(lambda texts: [[0.0] for _ in texts]), lexical_index=lexical_index
+    )
+
+    # Act
+    documents = retrieval_service.retrieve("XJ-900")
+
+    # Assert
+    assert documents == ["error XJ-900 means out of memory", "an introduction"]
+
+
+def test_retrieve_many_embeds_and_queries_all_queries_at_once(mocker):
+    # Arrange
+    mock_embedding_function = mocker.Mock(side_effect=lambda texts: [[float(len(text))] for text in texts])
+    mock_collection = mocker.Mock()
+    mock_collection.query.return_value = {"ids": [["a"], ["b"]], "documents": [["first"], ["second"]]}
+    retrieval_service = RetrievalService(mock_collection, QueryEmbeddingCache(mock_embedding_function))
+
+    # Act
+    documents = retrieval_service.retrieve_many(["one", "three"])
+
+    # Assert
+    assert documents == [["first"], ["second"]]
+    mock_embedding_function.assert_called_once_with(["one", "three"])
+    mock_collection.query.assert_called_once_with(query_embeddings=[[3.0], [5.0]], n_results=MAX_RETRIEVED_CHUNKS)
@@ -0,0 +1,49 @@
+import threading
+
+from src.startup.component_loader import STATUS_FAILED, STATUS_LOADING, STATUS_READY, ComponentLoader
+
+
+def test_components_load_concurrently_and_report_their_progress():
+    # Arrange
+    loader = ComponentLoader()
+    both_started = threading.Barrier(3, timeout=5)
+    release = threading.Event()
+
+    def load(report_step):
+        report_step("waiting for the other component")
+        both_started.wait()
+        release.wait(5)
+
+    # Act
+    loader.start("model", load)
+    loader.start("documents", load)
+    both_started.wait()
+    while_loading = loader.get_stats()
+    ready_while_loading = loader.is_ready
+    release.set()
+    loader.join(5)
+
+    # Assert
+    assert while_loading["model"]["status"] == STATUS_LOADING
+    assert while_loading["documents"]["step"] == "waiting for the other component"
+    assert not ready_while_loading
+    assert loader.is_ready
+    assert loader.get_status("documents") == STATUS_READY
+
+
+def test_a_component_that_fails_to_load_is_reported_as_failed():
+    # Arrange
+    loader = ComponentLoader()
+
+    def load(report_step):
+        raise RuntimeError("model file is corrupted")
+
+    # Act
+    loader.start("model", load)
+    loader.join(5)
+
+    # Assert
+    assert loader.get_status("model") == STATUS_FAILED
+    assert loader.get_stats()["model"]["error"] == "model file is corrupted"
+    assert loader.has_failed
+    assert not loader.is_ready
@@ -0,0 +1,34 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.startup.import_profile import get_import_time_us, profile_imports
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+# dependencies that are only needed once the model or the documents are loaded
+DEFERRED_MODULES = [
+    "chromadb", "httpx", "langchain", "llama_cpp", "requests", "sentence_transformers", "tqdm", "transformers",
+]
+REPO_ROOT = Path(__file__).parents[3]
+
+
+@pytest.fixture(scope="module")
+def import_timings():
+    return profile_imports("src.main", cwd=str(REPO_ROOT))
+
+
+def test_importing_the_app_stays_within_the_import_time_budget(import_timings):
+    # Act
+    import_time_ms = get_import_time_us(import_timings, "src.main") / 1000
+
+    # Assert
+    assert import_time_ms <= IMPORT_TIME_BUDGET_MS, f"Importing src.main took {import_time_ms:.1f}ms"
+
+
+def test_importing_the_app_defers_the_heavy_dependencies(import_timings):
+    # Act
+    imported_packages = {timing.module.split(".")[0] for timing in import_timings}
+
+    # Assert
+    assert imported_packages.isdisjoint(DEFERRED_MODULES)
@@ -0,0 +1,83 @@
+import hashlib
+from pathlib import Path
+
+from src.config import ModelDownloadConfiguration
+from src.dependencies import get_response_cache_on_app_start
+from src.startup.snapshot import CURRENT_SNAPSHOT_LINK, Snapshot, build_snapshot
+
+MODEL_CONTENT = b"model weights"
+
+
+def _model_config():
+    return ModelDownloadConfiguration(
+        model_name="vicuna/ggml-vicuna-13b-1.1",
+        folder_name="vicuna_ggml-vicuna-13b-1.1",
+        download_link="https://huggingface.co/vicuna/ggml-vicuna-13b-1.1/resolve/main/ggml-vic13b-q4_0.bin",
+        quantization_model="ggml-vic13b-q4_0.bin",
+        model_kwargs={},
+    )
+
+
+def _mock_dependencies(mocker):
+    mock_huggingface_downloader = mocker.Mock()
+    mock_huggingface_downloader.get_single_file.side_effect = (
+        lambda url, output_folder, filename, segments: (Path(output_folder) / filename).write_bytes(MODEL_CONTENT)
+    )
+    mock_document_sourcer = mocker.patch("src.document.document_sourcer.DocumentSourcer").return_value
+    mock_document_sourcer.get_corpus_version.return_value = "corpus-version"
+    mocker.patch("src.document.embedding_pipeline.get_default_embedding_function")
+    return mock_huggingface_downloader, mock_document_sourcer
+
+
+def test_build_snapshot_installs_the_model_and_vector_db_into_a_versioned_directory(tmp_path, mocker):
+    # Arrange
+    mock_huggingface_downloader, mock_document_sourcer = _mock_dependencies(mocker)
+
+    # Act
+    snapshot = build_snapshot(str(tmp_path), _model_config(), hugging_face_downloader=mock_huggingface_downloader)
+
+    # Assert
+    info = Snapshot(str(tmp_path / CURRENT_SNAPSHOT_LINK)).load_info()
+    assert snapshot.path == tmp_path / info.version
+    assert info.model_sha256 == hashlib.sha256(MODEL_CONTENT).hexdigest()
+    assert info.corpus_version == "corpus-version"
+    model_path = snapshot.models_path / "vicuna_ggml-vicuna-13b-1.1" / "ggml-vic13b-q4_0.bin"
+    assert model_path.read_bytes() == MODEL_CONTENT
+    mock_document_sourcer.get_preloaded_vector_database.assert_called_once_with()
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith(".building")] == []
+
+
+def test_build_snapshot_keeps_the_existing_snapshot_of_the_same_model_and_corpus(tmp_path, mocker):
+    # Arrange
+    mock_huggingface_downloader, _ = _mock_dependencies(mocker)
+    first = build_snapshot(str(tmp_path), _model_config(), hugging_face_downloader=mock_huggingface_downloader)
+
+    # Act
+    second = build_snapshot(str(tmp_path), _model_config(), hugging_face_downloader=mock_huggingface_downloader)
+
+    # Assert
+    assert second.path == first.path
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted([CURRENT_SNAPSHOT_LINK, first.path.name])
+
+
+def test_response_cache_keeps_semantic_cache_entries_out_of_the_snapshot(tmp_path, mocker, monkeypatch):
+    # Arrange
+    snapshot_path = tmp_path / "snapshot"
+    snapshot_path.mkdir()
+    (snapshot_path / "chroma.sqlite3").write_bytes(b"vector db")
+    before = {path: path.stat().st_mtime_ns for path in snapshot_path.rglob("*")}
+    monkeypatch.setenv("SNAPSHOT_PATH", str(snapshot_path))
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "true")
+    mock_memory_client = mocker.patch("chromadb.Client").return_value
+    mock_memory_client.get_collection.side_effect = ValueError("Collection does not exist")
+    mock_memory_client.create_collection.return_value.count.return_value = 0
+    mock_snapshot_client = mocker.Mock()
+
+    # Act
+    cache = get_response_cache_on_app_start(mock_snapshot_client, "corpus-version")
+    cache.store("query", "answer")
+
+    # Assert
+    assert mock_snapshot_client.mock_calls == []
+    mock_memory_client.create_collection.return_value.upsert.assert_called_once()
+    assert {path: path.stat().st_mtime_ns for path in snapshot_path.rglob("*")} == before